@@ -0,0 +1,213 @@
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import asyncio
+import logging
+import random
+from models import Invoice, StockMovement, StockMovementType
+from transactions import run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_ALLOCATION_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.02  # seconds
+
+class AllocationConflict(Exception):
+    """A stock row changed between planning and applying an allocation."""
+
+class Deduction(NamedTuple):
+    stock_id: str
+    item_id: str
+    location_id: str
+    quantity: int
+    batch_id: Optional[str] = None
+
+def _fefo_key(batch: dict):
+    # Earliest expiry first; batches without an expiry date go last
+    expiry = batch.get("expiry_date")
+    return (expiry is None, expiry or datetime.max, batch["_id"])
+
+def plan_fefo(batches: List[dict], stock_rows: List[dict], remaining: Dict[str, int], available: Dict[str, int]) -> List[Deduction]:
+    """Consume batches by expiry date, drawing the same quantity from the stock rows at each batch's location."""
+    rows_by_location: Dict[Tuple[str, str], List[dict]] = {}
+    for row in stock_rows:
+        rows_by_location.setdefault((row["item_id"], row["location_id"]), []).append(row)
+
+    plan = []
+    for batch in sorted(batches, key=_fefo_key):
+        item_id = batch["item_id"]
+        take = min(remaining.get(item_id, 0), batch["quantity_available"])
+        for row in rows_by_location.get((item_id, batch["location_id"]), []):
+            if take <= 0:
+                break
+            deduct_qty = min(take, available[row["stock_id"]])
+            if deduct_qty <= 0:
+                continue
+            plan.append(Deduction(row["stock_id"], item_id, row["location_id"], deduct_qty, batch["batch_id"]))
+            available[row["stock_id"]] -= deduct_qty
+            remaining[item_id] -= deduct_qty
+            take -= deduct_qty
+    return plan
+
+def _sum_by(plan: List[Deduction], field: str) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for d in plan:
+        key = getattr(d, field)
+        if key is not None:
+            totals[key] = totals.get(key, 0) + d.quantity
+    return totals
+
+def hold_back_batched_stock(batches: List[dict], plan: List[Deduction], stock_rows: List[dict], available: Dict[str, int]):
+    # Stock still held in a batch (including expired ones) must not be sold again by the FIFO fallback
+    consumed = _sum_by(plan, "batch_id")
+    for batch in batches:
+        held = batch["quantity_available"] - consumed.get(batch["batch_id"], 0)
+        for row in stock_rows:
+            if held <= 0:
+                break
+            if row["item_id"] == batch["item_id"] and row["location_id"] == batch["location_id"]:
+                taken = min(held, available[row["stock_id"]])
+                available[row["stock_id"]] -= taken
+                held -= taken
+
+def plan_fifo(stock_rows: List[dict], remaining: Dict[str, int], available: Dict[str, int]) -> List[Deduction]:
+    # Oldest stock first; rows must already be ordered by last_updated within each item
+    plan = []
+    for row in stock_rows:
+        needed = remaining.get(row["item_id"], 0)
+        if needed <= 0 or available[row["stock_id"]] <= 0:
+            continue
+        deduct_qty = min(needed, available[row["stock_id"]])
+        plan.append(Deduction(row["stock_id"], row["item_id"], row["location_id"], deduct_qty))
+        available[row["stock_id"]] -= deduct_qty
+        remaining[row["item_id"]] = needed - deduct_qty
+    return plan
+
+async def _apply_deductions(db, plan: List[Deduction], session=None):
+    # Each update only matches while the row still holds enough stock, so
+    # quantities can never go below zero even when invoices race
+    updates = [
+        (db.stock, {"stock_id": stock_id, "quantity": {"$gte": qty}}, {"$inc": {"quantity": -qty}},
+         {"stock_id": stock_id}, {"$inc": {"quantity": qty}})
+        for stock_id, qty in _sum_by(plan, "stock_id").items()
+    ] + [
+        (db.batches, {"batch_id": batch_id, "quantity_available": {"$gte": qty}}, {"$inc": {"quantity_available": -qty}},
+         {"batch_id": batch_id}, {"$inc": {"quantity_available": qty}})
+        for batch_id, qty in _sum_by(plan, "batch_id").items()
+    ]
+
+    if session is not None:
+        for collection in (db.stock, db.batches):
+            ops = [UpdateOne(f, u) for c, f, u, _, _ in updates if c is collection]
+            if not ops:
+                continue
+            result = await collection.bulk_write(ops, ordered=True, session=session)
+            if result.modified_count != len(ops):
+                # Raising aborts the transaction, which undoes the updates that did match
+                raise AllocationConflict()
+        return
+
+    # Without a transaction, apply one by one and compensate on the first miss
+    applied = []
+    for collection, match, update, undo_match, undo in updates:
+        result = await collection.update_one(match, update)
+        if result.modified_count != 1:
+            for done_collection, done_match, done_undo in applied:
+                await done_collection.update_one(done_match, done_undo)
+            raise AllocationConflict()
+        applied.append((collection, undo_match, undo))
+
+async def allocate_invoice_stock(db, invoice_data: Invoice, user_id: str, session=None) -> List[Deduction]:
+    demand: Dict[str, int] = {}
+    for item in invoice_data.items:
+        demand[item.item_id] = demand.get(item.item_id, 0) + item.quantity
+    if not demand:
+        return []
+    company_id = invoice_data.company_id
+    item_ids = list(demand)
+
+    # Single prefetch per collection for every invoice line
+    item_docs = await db.items.find(
+        {"item_id": {"$in": item_ids}}, {"item_id": 1, "is_batch_tracked": 1}, session=session
+    ).to_list(length=None)
+    batch_tracked = [doc["item_id"] for doc in item_docs if doc.get("is_batch_tracked", False)]
+
+    stock_rows = await db.stock.find(
+        {
+            "company_id": company_id,
+            "item_id": {"$in": item_ids},
+            "quantity": {"$gt": 0}
+        },
+        {"stock_id": 1, "item_id": 1, "location_id": 1, "quantity": 1, "last_updated": 1},
+        session=session,
+    ).sort([("item_id", 1), ("last_updated", 1), ("_id", 1)]).to_list(length=None)
+
+    batches = []
+    if batch_tracked:
+        batches = await db.batches.find(
+            {
+                "company_id": company_id,
+                "item_id": {"$in": batch_tracked},
+                "quantity_available": {"$gt": 0},
+                "is_active": True
+            },
+            {"batch_id": 1, "item_id": 1, "location_id": 1, "quantity_available": 1, "expiry_date": 1},
+            session=session,
+        ).sort([("item_id", 1), ("expiry_date", 1), ("_id", 1)]).to_list(length=None)
+
+    # Expired batches are never sold
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    sellable = [b for b in batches if b.get("expiry_date") is None or b["expiry_date"] >= today]
+
+    remaining = dict(demand)
+    available = {row["stock_id"]: row["quantity"] for row in stock_rows}
+    # FEFO over batches for batch-tracked items, then FIFO for whatever stock is not in a batch
+    plan = plan_fefo(sellable, stock_rows, remaining, available)
+    hold_back_batched_stock(batches, plan, stock_rows, available)
+    plan += plan_fifo(stock_rows, remaining, available)
+
+    for item_id, short in remaining.items():
+        if short > 0:
+            logger.warning("Insufficient stock for item %s: %d units not allocated", item_id, short)
+    if not plan:
+        return plan
+    await _apply_deductions(db, plan, session=session)
+
+    movements = [
+        StockMovement(
+            company_id=company_id,
+            item_id=d.item_id,
+            batch_id=d.batch_id,
+            location_id=d.location_id,
+            movement_type=StockMovementType.SALE,
+            quantity=-d.quantity,
+            reference_id=invoice_data.invoice_id,
+            reference_type="invoice",
+            created_by=user_id
+        ).dict(by_alias=True)
+        for d in plan
+    ]
+    await db.stock_movements.insert_many(movements, session=session)
+    return plan
+
+# Called as hook(db, invoice, deductions=..., session=...) inside the posting transaction
+InvoiceHook = Callable[..., Awaitable[None]]
+
+async def post_invoice(client, db, invoice_data: Invoice, user_id: str, hooks: Sequence[InvoiceHook] = ()) -> Invoice:
+    """Allocate stock for an invoice and store it, retrying when another invoice wins a race."""
+    async def post(session):
+        deductions = await allocate_invoice_stock(db, invoice_data, user_id, session=session)
+        await db.invoices.insert_one(invoice_data.dict(by_alias=True), session=session)
+        for hook in hooks:
+            await hook(db, invoice_data, deductions=deductions, session=session)
+
+    for attempt in range(MAX_ALLOCATION_ATTEMPTS):
+        try:
+            await run_in_transaction(client, post)
+            return invoice_data
+        except AllocationConflict:
+            # Re-plan from fresh stock after a short jittered backoff
+            await asyncio.sleep(RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    raise HTTPException(status_code=409, detail="Stock changed while allocating the invoice, please retry")
@@ -0,0 +1,289 @@
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from allocation import Deduction
+from gst import month_bounds, month_instants, rollup_day
+from models import GRN, Invoice, Payment
+import asyncio
+import numpy as np
+import pandas as pd
+
+# Daily rollups, one document per (company, day, dimension...) with summed measures
+SALES_ITEM_DAILY = "sales_item_daily"
+SALES_CUSTOMER_DAILY = "sales_customer_daily"
+PURCHASE_SUPPLIER_DAILY = "purchase_supplier_daily"
+PAYMENT_DAILY = "payment_daily"
+ROLLUP_COLLECTIONS = (SALES_ITEM_DAILY, SALES_CUSTOMER_DAILY, PURCHASE_SUPPLIER_DAILY, PAYMENT_DAILY)
+
+# Sales whose stock was not allocated to a location (should not happen for posted invoices)
+UNALLOCATED_LOCATION = "unallocated"
+DEFAULT_WINDOW_DAYS = 30
+REBUILD_CHUNK_SIZE = 500
+SALES_MEASURES = ("quantity", "revenue", "cost", "tax", "total_amount")
+
+# pandas resample rules; weeks start on Monday and are labelled by their first day
+INTERVALS: Dict[str, Tuple[str, Dict[str, str]]] = {
+    "day": ("D", {}),
+    "week": ("W-MON", {"closed": "left", "label": "left"}),
+    "month": ("MS", {}),
+}
+TOP_METRICS = {
+    "items": ("revenue", "margin", "quantity"),
+    "customers": ("revenue", "margin", "invoices"),
+    "suppliers": ("amount", "quantity", "grns"),
+}
+
+# Rollup rows keyed by collection, then by the row's key fields
+Rows = Dict[str, Dict[Tuple[Tuple[str, Any], ...], Dict[str, float]]]
+
+def _add(rows: Rows, collection: str, key_fields: Dict[str, Any], measures: Dict[str, float]):
+    row = rows.setdefault(collection, {}).setdefault(tuple(key_fields.items()), {})
+    for field, value in measures.items():
+        row[field] = row.get(field, 0) + value
+
+async def _write_rows(db, rows: Rows, update: Callable[[Dict[str, float]], Dict[str, Any]], session=None):
+    for collection, keyed in rows.items():
+        ops = [UpdateOne(dict(key), update(measures), upsert=True) for key, measures in keyed.items()]
+        for i in range(0, len(ops), REBUILD_CHUNK_SIZE):
+            await db[collection].bulk_write(ops[i:i + REBUILD_CHUNK_SIZE], ordered=False, session=session)
+
+async def _inc_rows(db, rows: Rows, session=None):
+    # updated_at marks the row as live for a rebuild running at the same time
+    now = datetime.utcnow()
+    await _write_rows(db, rows, lambda measures: {"$inc": measures, "$set": {"updated_at": now}}, session=session)
+
+async def _invoice_rows(db, invoice: Invoice, deductions: Sequence[Deduction], rows: Rows, session=None):
+    """Revenue and batch-level cost of an invoice, added to the daily sales rows.
+
+    A line's revenue is split across locations in proportion to the stock
+    deducted from each; its cost is the deducted quantity at the batch
+    purchase_price, or the item's purchase_price for untracked stock.
+    """
+    lines: Dict[str, Dict[str, float]] = {}
+    for line in invoice.items:
+        totals = lines.setdefault(line.item_id, {"quantity": 0, "revenue": 0.0, "tax": 0.0, "total_amount": 0.0})
+        totals["quantity"] += line.quantity
+        totals["revenue"] += line.quantity * line.unit_price
+        totals["tax"] += line.cgst_amount + line.sgst_amount + line.igst_amount
+        totals["total_amount"] += line.total_amount
+    if not lines:
+        return
+
+    item_docs = await db.items.find(
+        {"item_id": {"$in": list(lines)}}, {"item_id": 1, "purchase_price": 1}, session=session
+    ).to_list(length=None)
+    item_cost = {doc["item_id"]: doc.get("purchase_price") or 0.0 for doc in item_docs}
+    batch_ids = list({d.batch_id for d in deductions if d.batch_id})
+    batch_cost: Dict[str, float] = {}
+    if batch_ids:
+        batch_docs = await db.batches.find(
+            {"batch_id": {"$in": batch_ids}}, {"batch_id": 1, "purchase_price": 1}, session=session
+        ).to_list(length=None)
+        batch_cost = {doc["batch_id"]: doc.get("purchase_price") or 0.0 for doc in batch_docs}
+
+    by_item: Dict[str, List[Deduction]] = {}
+    for d in deductions:
+        by_item.setdefault(d.item_id, []).append(d)
+
+    item_rows: Dict[Tuple[str, str], Dict[str, float]] = {}
+    customer_rows: Dict[str, Dict[str, float]] = {}
+    for item_id, totals in lines.items():
+        taken = by_item.get(item_id) or [Deduction("", item_id, UNALLOCATED_LOCATION, totals["quantity"])]
+        taken_quantity = sum(d.quantity for d in taken) or 1
+        for d in taken:
+            share = d.quantity / taken_quantity
+            unit_cost = batch_cost.get(d.batch_id, item_cost.get(item_id, 0.0)) if d.batch_id else item_cost.get(item_id, 0.0)
+            row = item_rows.setdefault((d.location_id, item_id), {field: 0.0 for field in SALES_MEASURES} | {"lines": 0})
+            row["quantity"] += d.quantity
+            row["revenue"] += totals["revenue"] * share
+            row["tax"] += totals["tax"] * share
+            row["total_amount"] += totals["total_amount"] * share
+            row["cost"] += d.quantity * unit_cost
+            row["lines"] += 1
+
+    for (location_id, _), row in item_rows.items():
+        customer = customer_rows.setdefault(location_id, {"revenue": 0.0, "cost": 0.0, "tax": 0.0, "total_amount": 0.0})
+        for field in customer:
+            customer[field] += row[field]
+
+    base = {"company_id": invoice.company_id, "day": rollup_day(invoice.invoice_date)}
+    for (location_id, item_id), row in item_rows.items():
+        _add(rows, SALES_ITEM_DAILY, {**base, "location_id": location_id, "item_id": item_id}, row)
+    for location_id, row in customer_rows.items():
+        # An invoice drawn from two locations counts once at each
+        _add(rows, SALES_CUSTOMER_DAILY, {**base, "location_id": location_id, "customer_id": invoice.customer_id}, {**row, "invoices": 1})
+
+def _grn_rows(grn: GRN, rows: Rows):
+    """Received value per supplier and location."""
+    _add(rows, PURCHASE_SUPPLIER_DAILY,
+         {"company_id": grn.company_id, "day": rollup_day(grn.grn_date), "location_id": grn.location_id, "supplier_id": grn.supplier_id},
+         {"amount": sum(line.received_quantity * line.unit_price for line in grn.items),
+          "quantity": sum(line.received_quantity for line in grn.items), "grns": 1})
+
+def _payment_rows(payments: Sequence[Payment], rows: Rows):
+    """Collections per day and payment mode."""
+    for payment in payments:
+        _add(rows, PAYMENT_DAILY,
+             {"company_id": payment.company_id, "day": rollup_day(payment.payment_date), "payment_mode": payment.payment_mode.value},
+             {"amount": payment.amount, "payments": 1})
+
+async def record_invoice_analytics(db, invoice: Invoice, deductions: Sequence[Deduction] = (), session=None, **_):
+    """Invoice posting hook: fold revenue and cost into the daily sales rollups."""
+    rows: Rows = {}
+    await _invoice_rows(db, invoice, deductions, rows, session=session)
+    await _inc_rows(db, rows, session=session)
+
+async def record_grn_analytics(db, grn: GRN, session=None, **_):
+    """GRN posting hook: received value per supplier and location."""
+    rows: Rows = {}
+    _grn_rows(grn, rows)
+    await _inc_rows(db, rows, session=session)
+
+async def record_payment_analytics(db, payments: List[Payment], session=None, **_):
+    """Payment posting hook: collections per day and payment mode."""
+    rows: Rows = {}
+    _payment_rows(payments, rows)
+    await _inc_rows(db, rows, session=session)
+
+async def rebuild_analytics(db, company_id: str, year: int, month: int) -> Dict[str, Any]:
+    """Recompute one month of rollups from invoices, their stock movements, GRNs and payments.
+
+    The month is totalled in memory, written over the existing rows and only
+    then are keys older than the run removed, so readers never see it empty
+    or half-built. A posting landing mid-rebuild may be overwritten or missed;
+    the next rebuild picks it up.
+    """
+    start, end = month_bounds(year, month)
+    date_from, date_to = month_instants(year, month)
+    started = datetime.utcnow()
+    rows: Rows = {}
+
+    counts = {"invoices": 0, "grns": 0, "payments": 0}
+    invoices = db.invoices.find({"company_id": company_id, "invoice_date": {"$gte": date_from, "$lt": date_to}, "status": {"$ne": "cancelled"}})
+    while True:
+        chunk = await invoices.to_list(length=REBUILD_CHUNK_SIZE)
+        if not chunk:
+            break
+        deductions: Dict[str, List[Deduction]] = {}
+        async for movement in db.stock_movements.find(
+            {"reference_id": {"$in": [doc["invoice_id"] for doc in chunk]}, "reference_type": "invoice"},
+            {"reference_id": 1, "item_id": 1, "location_id": 1, "quantity": 1, "batch_id": 1}
+        ):
+            deductions.setdefault(movement["reference_id"], []).append(
+                Deduction("", movement["item_id"], movement["location_id"], -movement["quantity"], movement.get("batch_id"))
+            )
+        for doc in chunk:
+            await _invoice_rows(db, Invoice(**doc), deductions.get(doc["invoice_id"], ()), rows)
+        counts["invoices"] += len(chunk)
+
+    async for doc in db.grn.find({"company_id": company_id, "grn_date": {"$gte": date_from, "$lt": date_to}}):
+        _grn_rows(GRN(**doc), rows)
+        counts["grns"] += 1
+
+    payments = db.payments.find({"company_id": company_id, "payment_date": {"$gte": date_from, "$lt": date_to}})
+    while True:
+        chunk = await payments.to_list(length=REBUILD_CHUNK_SIZE)
+        if not chunk:
+            break
+        _payment_rows([Payment(**doc) for doc in chunk], rows)
+        counts["payments"] += len(chunk)
+
+    await _write_rows(db, rows, lambda measures: {"$set": {**measures, "updated_at": started}})
+    removed = 0
+    for collection in ROLLUP_COLLECTIONS:
+        # Keys nothing produces any more (nor any posting since the run started)
+        stale = await db[collection].delete_many(
+            {"company_id": company_id, "day": {"$gte": start, "$lt": end}, "updated_at": {"$lt": started}}
+        )
+        removed += stale.deleted_count
+    return {"company_id": company_id, "year": year, "month": month, **counts, "removed": removed}
+
+def analytics_window(date_from: Optional[datetime], date_to: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Whole rollup days [from, to] (see gst.ROLLUP_TIMEZONE); defaults to the last DEFAULT_WINDOW_DAYS days."""
+    end = rollup_day(date_to or datetime.utcnow())
+    start = rollup_day(date_from) if date_from else end - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    return start, end
+
+def _match(company_id: str, start: datetime, end: datetime, location_id: Optional[str] = None) -> Dict[str, Any]:
+    match: Dict[str, Any] = {"company_id": company_id, "day": {"$gte": start, "$lte": end}}
+    if location_id:
+        match["location_id"] = location_id
+    return match
+
+def _with_margin(frame: pd.DataFrame) -> pd.DataFrame:
+    frame["margin"] = frame["revenue"] - frame["cost"]
+    revenue = frame["revenue"].to_numpy(dtype=float)
+    frame["margin_pct"] = np.divide(frame["margin"].to_numpy(dtype=float) * 100, revenue,
+                                    out=np.zeros_like(revenue), where=revenue != 0)
+    return frame
+
+async def _daily_totals(collection, match: Dict[str, Any], fields: Sequence[str]) -> pd.DataFrame:
+    # Collapse every dimension in Mongo so pandas only ever sees one row per day
+    rows = await collection.aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$day", **{field: {"$sum": f"${field}"} for field in fields}}},
+    ]).to_list(length=None)
+    frame = pd.DataFrame(rows, columns=["_id", *fields])
+    return frame.set_index(pd.DatetimeIndex(frame.pop("_id"), name="day")).sort_index()
+
+async def sales_series(db, company_id: str, start: datetime, end: datetime, interval: str, location_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Revenue, cost and margin per day/week/month, with empty periods filled with zeros."""
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval, use one of: {', '.join(INTERVALS)}")
+    daily = await _daily_totals(db[SALES_ITEM_DAILY], _match(company_id, start, end, location_id), SALES_MEASURES)
+    daily = daily.reindex(pd.date_range(start, end, freq="D", name="day"), fill_value=0)
+    rule, options = INTERVALS[interval]
+    series = _with_margin(daily.resample(rule, **options).sum()).round(2)
+    return [{"period": period.to_pydatetime(), **row} for period, row in zip(series.index, series.to_dict("records"))]
+
+async def analytics_summary(db, company_id: str, start: datetime, end: datetime, location_id: Optional[str] = None) -> Dict[str, Any]:
+    sales, purchases, collections = await asyncio.gather(
+        _daily_totals(db[SALES_ITEM_DAILY], _match(company_id, start, end, location_id), SALES_MEASURES),
+        _daily_totals(db[PURCHASE_SUPPLIER_DAILY], _match(company_id, start, end, location_id), ("amount", "grns")),
+        # Payments are not tied to a location
+        _daily_totals(db[PAYMENT_DAILY], _match(company_id, start, end), ("amount", "payments")),
+    )
+    totals = _with_margin(sales.sum().to_frame().T).round(2).to_dict("records")[0]
+    days = (end - start).days + 1
+    return {
+        "company_id": company_id,
+        "location_id": location_id,
+        "date_from": start,
+        "date_to": end,
+        **totals,
+        "average_daily_revenue": round(totals["revenue"] / days, 2),
+        "purchases": round(float(purchases["amount"].sum()), 2),
+        "grns": int(purchases["grns"].sum()),
+        "collections": round(float(collections["amount"].sum()), 2),
+        "payments": int(collections["payments"].sum()),
+    }
+
+async def top_entities(db, kind: str, company_id: str, start: datetime, end: datetime, metric: str,
+                       limit: int, location_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Top items, customers or suppliers over the window, ranked by `metric`."""
+    if metric not in TOP_METRICS[kind]:
+        raise HTTPException(status_code=400, detail=f"Unsupported metric, use one of: {', '.join(TOP_METRICS[kind])}")
+    collection, key, names, fields = {
+        "items": (SALES_ITEM_DAILY, "item_id", "items", ("revenue", "cost", "quantity", "tax")),
+        "customers": (SALES_CUSTOMER_DAILY, "customer_id", "customers", ("revenue", "cost", "tax", "invoices")),
+        "suppliers": (PURCHASE_SUPPLIER_DAILY, "supplier_id", "suppliers", ("amount", "quantity", "grns")),
+    }[kind]
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": _match(company_id, start, end, location_id)},
+        {"$group": {"_id": f"${key}", **{field: {"$sum": f"${field}"} for field in fields}}},
+    ]
+    if "cost" in fields:
+        pipeline.append({"$set": {"margin": {"$subtract": ["$revenue", "$cost"]}}})
+    pipeline += [{"$sort": {metric: -1, "_id": 1}}, {"$limit": limit}]
+    rows = await db[collection].aggregate(pipeline).to_list(length=limit)
+
+    name_docs = await db[names].find({key: {"$in": [row["_id"] for row in rows]}}, {key: 1, "name": 1}).to_list(length=None)
+    name_by_id = {doc[key]: doc.get("name") for doc in name_docs}
+    return [
+        {key: row["_id"], "name": name_by_id.get(row["_id"]),
+         **{field: round(value, 2) if isinstance(value, float) else value for field, value in row.items() if field != "_id"}}
+        for row in rows
+    ]
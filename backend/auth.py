@@ -1,32 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple
+import asyncio
 import os
+import time
 from models import User, UserRole
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from cache import TTLCache
+from sessions import ACCESS_TOKEN_EXPIRE_MINUTES, SESSION_CLAIM, revoke_user_sessions, revoked_sessions
 
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Authenticated users are cached by user_id to skip a DB round trip per request.
+# Entries older than the user's last change are ignored (see UserChangeList).
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+# When enabled, tokens carry the user's profile and it is trusted until the token expires
+# or the user is changed (profiles carry updated_at for that check)
+TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+USER_CLAIM = "usr"
+# How stale each worker's view of recently changed users may get
+USER_CHANGE_REFRESH_SECONDS = float(os.environ.get("USER_CHANGE_REFRESH_SECONDS", "10"))
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def _utc(value: datetime) -> datetime:
+    # Dates read back from MongoDB are naive UTC; models default to aware ones
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+class UserChangeList:
+    """When each user was last changed, for changes within `window`, kept in memory.
+
+    A cached user or token profile older than the change is not used. The
+    window covers both the cache TTL and the access-token lifetime, after
+    which neither can hold the old profile. Each worker reloads the list from
+    MongoDB at most every USER_CHANGE_REFRESH_SECONDS, so an update made on
+    one worker takes that long to reach the others.
+    """
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.changed: Dict[str, datetime] = {}
+        self.loaded_at = 0.0
+
+    def add(self, user_id: str, changed_at: datetime):
+        self.changed[user_id] = max(_utc(changed_at), self.changed.get(user_id, datetime.min))
+
+    async def reload(self, db):
+        # Claim the reload first so concurrent requests keep using the current list
+        self.loaded_at = time.monotonic()
+        since = datetime.utcnow() - self.window
+        docs = await db.users.find({"updated_at": {"$gte": since}}, {"user_id": 1, "updated_at": 1}).to_list(length=None)
+        self.changed = {doc["user_id"]: _utc(doc["updated_at"]) for doc in docs}
+
+    async def changed_at(self, db, user_id: str) -> Optional[datetime]:
+        if time.monotonic() - self.loaded_at > USER_CHANGE_REFRESH_SECONDS:
+            await self.reload(db)
+        return self.changed.get(user_id)
+
+def _is_current(user: User, changed_at: Optional[datetime]) -> bool:
+    return changed_at is None or _utc(user.updated_at) >= changed_at
+
+user_changes = UserChangeList(timedelta(seconds=max(USER_CACHE_TTL_SECONDS, ACCESS_TOKEN_EXPIRE_MINUTES * 60)))
+
+async def user_changed(db, user: User):
+    """Call after writing a user: drops cached copies everywhere and ends a deactivated user's sessions."""
+    user_cache.delete(user.user_id)
+    user_changes.add(user.user_id, user.updated_at)
+    if not user.is_active:
+        await revoke_user_sessions(db, user.user_id, reason="inactive_user")
+
+# pbkdf2 cost; hashes made with other rounds are upgraded on the user's next login
+PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", "29000"))
+# Hashing runs on this many threads (hashlib releases the GIL) so it never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Login attempts allowed per window, per email and per client address (0 disables)
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = float(os.environ.get("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "60"))
+LOGIN_RATE_LIMIT_ATTEMPTS = int(os.environ.get("LOGIN_RATE_LIMIT_ATTEMPTS", "10"))
+LOGIN_RATE_LIMIT_PER_CLIENT = int(os.environ.get("LOGIN_RATE_LIMIT_PER_CLIENT", "100"))
 
 # Use pbkdf2_sha256 instead of bcrypt to avoid 72-byte limit issues
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    # Any other cost, higher or lower, makes needs_update() true
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS,
+)
 security = HTTPBearer()
 
-def verify_password(plain_password, hashed_password):
-    # Truncate password to 72 bytes for bcrypt compatibility
-    if isinstance(plain_password, str):
-        plain_password = plain_password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
-    return pwd_context.verify(plain_password, hashed_password)
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
-def get_password_hash(password):
+def _truncate(password):
     # Truncate password to 72 bytes for bcrypt compatibility
     if isinstance(password, str):
         password = password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
-    return pwd_context.hash(password)
+    return password
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(_truncate(plain_password), hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(_truncate(password))
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a new hash when the stored one uses outdated parameters."""
+    if not hashed_password:
+        return False, None
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, _truncate(plain_password), hashed_password
+    )
+
+class LoginRateLimiter:
+    """Fixed-window attempt counters, so repeated logins cannot queue unbounded hash work.
+
+    Counters are per process; with several workers the effective limit is
+    multiplied by the worker count.
+    """
+
+    def __init__(self, window: float, maxsize: int = 100000):
+        self.window = window
+        self.counters = TTLCache(maxsize=maxsize, ttl=window)
+
+    def hit(self, key: str, limit: int):
+        if limit <= 0:
+            return
+        now = time.monotonic()
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = [now + self.window, 0]
+            self.counters.set(key, counter)
+        counter[1] += 1
+        if counter[1] > limit:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(max(1, int(counter[0] - now) + 1))},
+            )
+
+login_rate_limiter = LoginRateLimiter(LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+
+def check_login_rate(email: str, client_host: Optional[str]):
+    login_rate_limiter.hit(f"email:{email.lower()}", LOGIN_RATE_LIMIT_ATTEMPTS)
+    if client_host:
+        login_rate_limiter.hit(f"client:{client_host}", LOGIN_RATE_LIMIT_PER_CLIENT)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -38,6 +164,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: User, session_id: Optional[str] = None) -> dict:
+    data = {"sub": user.user_id}
+    if session_id:
+        data[SESSION_CLAIM] = session_id
+    if TRUST_TOKEN_CLAIMS:
+        data[USER_CLAIM] = {
+            "email": user.email,
+            "name": user.name,
+            "phone": user.phone,
+            "role": user.role.value,
+            "company_id": user.company_id,
+            "location_ids": user.location_ids,
+            "is_active": user.is_active,
+            "updated_at": _utc(user.updated_at).isoformat(),
+        }
+    return data
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncIOMotorDatabase = None):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,10 +195,31 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user_data = await db.users.find_one({"user_id": user_id})
-    if user_data is None:
+    # Tokens of a logged-out or compromised session stop working before they expire
+    session_id = payload.get(SESSION_CLAIM)
+    if session_id and await revoked_sessions.contains(db, session_id):
+        raise credentials_exception
+    
+    changed_at = await user_changes.changed_at(db, user_id)
+    user = user_cache.get(user_id)
+    if user is not None and _is_current(user, changed_at):
+        return user
+    
+    user = None
+    claims = payload.get(USER_CLAIM)
+    if TRUST_TOKEN_CLAIMS and claims and "updated_at" in claims:
+        user = User(id=None, user_id=user_id, **claims)
+        if not _is_current(user, changed_at):
+            user = None
+    if user is None:
+        user_data = await db.users.find_one({"user_id": user_id})
+        if user_data is None:
+            raise credentials_exception
+        user = User(**user_data)
+    if not user.is_active:
         raise credentials_exception
-    return User(**user_data)
+    user_cache.set(user_id, user)
+    return user
 
 def require_roles(allowed_roles: list[UserRole]):
     def role_checker(current_user: User = Depends(get_current_user)):
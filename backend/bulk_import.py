@@ -0,0 +1,118 @@
+from fastapi import HTTPException, UploadFile
+from pydantic import BaseModel, ValidationError
+from pymongo.errors import BulkWriteError
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
+import asyncio
+import csv
+import io
+import itertools
+import json
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_FORMATS = ("csv", "ndjson")
+
+def detect_format(upload: UploadFile, requested: Optional[str]) -> str:
+    if requested:
+        if requested not in IMPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported import format, use one of: {', '.join(IMPORT_FORMATS)}")
+        return requested
+    name = (upload.filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or upload.content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return "csv"
+
+def iter_rows(upload: UploadFile, import_format: str) -> Iterator[Tuple[int, Any]]:
+    # Rows are read lazily so the upload is never parsed into memory all at once
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    if import_format == "ndjson":
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+    else:
+        # Row 1 is the header
+        for row_no, row in enumerate(csv.DictReader(text), start=2):
+            # Empty CSV cells mean "not provided" so model defaults apply
+            yield row_no, {key: value for key, value in row.items() if key and value not in ("", None)}
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+def validate_chunk(rows: List[Tuple[int, Any]], model: Type[BaseModel], defaults: Dict[str, Any],
+                   prepare: Optional[Callable[[dict], dict]] = None):
+    docs, row_numbers, errors = [], [], []
+    for row_no, row in rows:
+        if isinstance(row, Exception):
+            errors.append({"row": row_no, "error": f"Invalid JSON: {row}"})
+            continue
+        if not isinstance(row, dict):
+            errors.append({"row": row_no, "error": "Row must be an object"})
+            continue
+        try:
+            doc = model(**{**defaults, **row}).dict(by_alias=True)
+            docs.append(prepare(doc) if prepare else doc)
+            row_numbers.append(row_no)
+        except ValidationError as e:
+            errors.append({"row": row_no, "error": _format_validation_error(e)})
+    return docs, row_numbers, errors
+
+def _next_chunk(rows: Iterator[Tuple[int, Any]], model: Type[BaseModel], defaults: Dict[str, Any],
+                prepare: Optional[Callable[[dict], dict]] = None):
+    # Reading the upload and running the models are both blocking, so they happen together on a thread
+    chunk = list(itertools.islice(rows, IMPORT_CHUNK_SIZE))
+    return (len(chunk),) + validate_chunk(chunk, model, defaults, prepare)
+
+async def _insert_chunk(collection, docs: List[dict], row_numbers: List[int]) -> Tuple[int, List[dict]]:
+    if not docs:
+        return 0, []
+    try:
+        result = await collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids), []
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        errors = [{"row": row_numbers[w["index"]], "error": w.get("errmsg", "write failed")} for w in write_errors]
+        return e.details.get("nInserted", len(docs) - len(write_errors)), errors
+
+async def import_rows(collection, upload: UploadFile, model: Type[BaseModel], import_format: str, defaults: Dict[str, Any],
+                      prepare: Optional[Callable[[dict], dict]] = None) -> Dict[str, Any]:
+    """Validate and insert an uploaded file chunk by chunk, returning a per-row error report."""
+    report: Dict[str, Any] = {"total_rows": 0, "inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+    companies: Set[str] = set()
+
+    def add_errors(errors: List[dict]):
+        report["failed"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(report["errors"])
+        if len(errors) > room:
+            report["errors_truncated"] = True
+        report["errors"].extend(errors[:max(room, 0)])
+
+    loop = asyncio.get_running_loop()
+    pending: Optional[asyncio.Task] = None
+    rows = iter_rows(upload, import_format)
+    while True:
+        # Validate the next chunk on a thread while the previous chunk's insert is still in flight
+        count, docs, row_numbers, errors = await loop.run_in_executor(None, _next_chunk, rows, model, defaults, prepare)
+        if not count:
+            break
+        report["total_rows"] += count
+        add_errors(errors)
+        companies.update(doc["company_id"] for doc in docs)
+
+        if pending is not None:
+            inserted, write_errors = await pending
+            report["inserted"] += inserted
+            add_errors(write_errors)
+        pending = asyncio.create_task(_insert_chunk(collection, docs, row_numbers))
+
+    if pending is not None:
+        inserted, write_errors = await pending
+        report["inserted"] += inserted
+        add_errors(write_errors)
+
+    report["errors"].sort(key=lambda e: e["row"])
+    report["company_ids"] = sorted(companies)
+    return report
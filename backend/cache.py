@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Hashable, Optional
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "local").lower()
+SHARED_CACHE_COLLECTION = "cache_entries"
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class CacheBackend(ABC):
+    """Async cache interface so a cache can live in-process or be shared by every worker."""
+
+    @abstractmethod
+    async def get(self, key: str, default: Any = None) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+class LocalCache(CacheBackend):
+    """Per-process backend; fine for one worker and as a stand-in in tests."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return self._cache.get(key, default)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._cache.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+class MongoCache(CacheBackend):
+    """Cache shared by all workers through one collection.
+
+    Entries are removed by a TTL index on `expires_at`; reads also check the
+    expiry because the TTL monitor only runs about once a minute.
+    """
+
+    def __init__(self, collection, namespace: str, ttl: float = 60.0):
+        self._collection = collection
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _id(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        entry = await self._collection.find_one(
+            {"_id": self._id(key), "expires_at": {"$gt": datetime.utcnow()}}, {"value": 1}
+        )
+        return default if entry is None else entry["value"]
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl if ttl is None else ttl)
+        await self._collection.replace_one(
+            {"_id": self._id(key)}, {"value": value, "expires_at": expires_at}, upsert=True
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._collection.delete_one({"_id": self._id(key)})
+
+def build_cache(db, namespace: str, maxsize: int = 1024, ttl: float = 60.0) -> CacheBackend:
+    """Pick the backend from CACHE_BACKEND: `local` (default) or `mongo` for multi-worker deployments."""
+    if CACHE_BACKEND == "mongo":
+        return MongoCache(db[SHARED_CACHE_COLLECTION], namespace, ttl)
+    if CACHE_BACKEND != "local":
+        logger.warning("Unknown CACHE_BACKEND %r, using the in-process cache", CACHE_BACKEND)
+    return LocalCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import Any, Dict
+import asyncio
+import os
+from cache import CacheBackend
+from reorder import REORDER_COLLECTION
+
+LOW_STOCK_LIMIT = 10
+
+# The dashboard is polled by every open browser, so serve it from a short-lived cache
+DASHBOARD_CACHE_TTL_SECONDS = float(os.environ.get("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+
+async def invalidate_dashboard(cache: CacheBackend, company_id: str) -> None:
+    await cache.delete(company_id)
+
+async def _low_stock_items(db, company_id: str):
+    # Maintained incrementally by GRN and invoice posting, most depleted first
+    cursor = db[REORDER_COLLECTION].find(
+        {"company_id": company_id},
+        {"_id": 0, "item_id": 1, "location_id": 1, "item_name": 1, "current_stock": "$quantity", "min_level": "$min_stock_level"}
+    ).sort([("quantity", 1), ("_id", 1)]).limit(LOW_STOCK_LIMIT)
+    return await cursor.to_list(length=LOW_STOCK_LIMIT)
+
+async def build_dashboard_summary(db, company_id: str) -> Dict[str, Any]:
+    current_date = datetime.now(timezone.utc)
+    pending = {"$in": ["pending", "approved"]}
+    (
+        total_customers,
+        total_suppliers,
+        total_items,
+        pending_sales_orders,
+        pending_purchase_orders,
+        overdue_invoices,
+        low_stock_items,
+        low_stock_count,
+    ) = await asyncio.gather(
+        db.customers.count_documents({"company_id": company_id}),
+        db.suppliers.count_documents({"company_id": company_id}),
+        db.items.count_documents({"company_id": company_id}),
+        db.sales_orders.count_documents({"company_id": company_id, "status": pending}),
+        db.purchase_orders.count_documents({"company_id": company_id, "status": pending}),
+        db.invoices.count_documents({
+            "company_id": company_id,
+            "due_date": {"$lt": current_date},
+            "status": {"$in": ["pending", "partially_paid"]}
+        }),
+        _low_stock_items(db, company_id),
+        db[REORDER_COLLECTION].count_documents({"company_id": company_id}),
+    )
+
+    return {
+        "total_customers": total_customers,
+        "total_suppliers": total_suppliers,
+        "total_items": total_items,
+        "pending_sales_orders": pending_sales_orders,
+        "pending_purchase_orders": pending_purchase_orders,
+        "overdue_invoices": overdue_invoices,
+        "low_stock_items": low_stock_items,
+        "low_stock_count": low_stock_count
+    }
+
+async def get_dashboard_summary_cached(db, cache: CacheBackend, company_id: str) -> Dict[str, Any]:
+    summary = await cache.get(company_id)
+    if summary is None:
+        summary = await build_dashboard_summary(db, company_id)
+        await cache.set(company_id, summary)
+    return summary
@@ -0,0 +1,72 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from typing import Any, Dict, Optional
+from metrics import command_listener, pool_listener
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+# MongoDB rejects a maxStalenessSeconds below 90
+MIN_MAX_STALENESS_SECONDS = 90
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def client_options() -> Dict[str, Any]:
+    """Pool, timeout and compression settings from the environment; unset values keep the driver defaults."""
+    options: Dict[str, Any] = {}
+    for option, env in (
+        ("maxPoolSize", "MONGO_MAX_POOL_SIZE"),
+        ("minPoolSize", "MONGO_MIN_POOL_SIZE"),
+        ("maxConnecting", "MONGO_MAX_CONNECTING"),
+        ("maxIdleTimeMS", "MONGO_MAX_IDLE_TIME_MS"),
+        ("waitQueueTimeoutMS", "MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        ("serverSelectionTimeoutMS", "MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        ("connectTimeoutMS", "MONGO_CONNECT_TIMEOUT_MS"),
+        ("socketTimeoutMS", "MONGO_SOCKET_TIMEOUT_MS"),
+    ):
+        value = _env_int(env)
+        if value is not None:
+            options[option] = value
+    # e.g. "zstd,snappy,zlib"; zstd and snappy need the zstandard / python-snappy packages
+    compressors = os.environ.get("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+def build_client(mongo_url: str) -> AsyncIOMotorClient:
+    options = client_options()
+    logger.info("MongoDB client options: %s", options or "driver defaults")
+    return AsyncIOMotorClient(mongo_url, event_listeners=[command_listener, pool_listener], **options)
+
+def read_preference():
+    """Read preference for read-only endpoints (MONGO_READ_PREFERENCE, MONGO_MAX_STALENESS_SECONDS)."""
+    name = os.environ.get("MONGO_READ_PREFERENCE", "primary").replace("_", "").lower()
+    mode = READ_PREFERENCES.get(name)
+    if mode is None:
+        logger.warning("Unknown MONGO_READ_PREFERENCE %r, reading from the primary", name)
+        return Primary()
+    if mode is Primary:
+        return Primary()
+    max_staleness = _env_int("MONGO_MAX_STALENESS_SECONDS") or -1
+    if 0 < max_staleness < MIN_MAX_STALENESS_SECONDS:
+        logger.warning("MONGO_MAX_STALENESS_SECONDS raised to the server minimum of %ds", MIN_MAX_STALENESS_SECONDS)
+        max_staleness = MIN_MAX_STALENESS_SECONDS
+    return mode(max_staleness=max_staleness)
+
+def read_database(db):
+    """Handle on `db` for lists, exports and reports that may be served by a secondary.
+
+    Writes, and reads that must see the caller's own write (get-by-id after a
+    create, allocation, payments), stay on `db` and therefore the primary.
+    """
+    return db.with_options(read_preference=read_preference())
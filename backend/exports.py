@@ -0,0 +1,89 @@
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional, Type
+from pydantic import BaseModel
+import csv
+import io
+import json
+from serialization import dumps
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ("ndjson", "csv")
+
+def _json_default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _csv_value(value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        # Nested documents such as invoice lines are kept as JSON in one cell
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, (ObjectId, datetime, Enum)):
+        return _json_default(value)
+    return value
+
+def date_range(field: str, date_from: Optional[datetime], date_to: Optional[datetime]) -> Dict[str, Any]:
+    bounds = {}
+    if date_from:
+        bounds["$gte"] = date_from
+    if date_to:
+        bounds["$lte"] = date_to
+    return {field: bounds} if bounds else {}
+
+def model_columns(model: Type[BaseModel]) -> List[str]:
+    return [field.alias or name for name, field in model.model_fields.items()]
+
+async def iter_ndjson(cursor) -> AsyncIterator[bytes]:
+    lines = []
+    async for doc in cursor:
+        lines.append(dumps(doc))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+async def iter_csv(cursor, columns: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # Send the header straight away so the first byte goes out before any query results
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc.get(column)) for column in columns])
+        rows += 1
+        if rows >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if rows:
+        yield buffer.getvalue().encode("utf-8")
+
+def stream_export(collection, query: Dict[str, Any], model: Type[BaseModel], export_format: str, filename: str) -> StreamingResponse:
+    """Stream every document matching `query` without holding the result set in memory."""
+    cursor = collection.find(query).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    if export_format == "csv":
+        body = iter_csv(cursor, model_columns(model))
+        media_type = "text/csv"
+    else:
+        body = iter_ndjson(cursor)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
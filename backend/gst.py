@@ -0,0 +1,196 @@
+from pymongo import UpdateOne
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+from models import GSTReturn, Invoice, InvoiceStatus
+import os
+
+ROLLUP_COLLECTION = "gst_daily_rollups"
+AMOUNT_FIELDS = ("taxable_value", "cgst_amount", "sgst_amount", "igst_amount", "total_amount")
+# Every other invoice, drafts included, counts towards GST; shared by the posting hook and the rebuild
+GST_EXCLUDED_STATUSES = (InvoiceStatus.CANCELLED.value,)
+# Rollup key for lines whose item is missing or has no HSN code; $merge cannot match on null
+UNKNOWN_HSN = "UNKNOWN"
+# GST and analytics rollups are bucketed by calendar day in this zone, so an invoice
+# issued at 01:00 IST on the 1st lands in that month's return, not the previous one
+ROLLUP_TIMEZONE_NAME = os.environ.get("ROLLUP_TIMEZONE", "Asia/Kolkata")
+ROLLUP_TIMEZONE = ZoneInfo(ROLLUP_TIMEZONE_NAME)
+
+def rollup_day(value: datetime) -> datetime:
+    # Stored dates are UTC (naive ones included); the day key is the local calendar date, stored naive
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(ROLLUP_TIMEZONE)
+    return datetime(value.year, value.month, value.day)
+
+def month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    """First day of the month and of the next one, as rollup day keys."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def local_day_start(day: datetime) -> datetime:
+    """The naive UTC instant at which a rollup day key begins, for matching stored dates."""
+    return day.replace(tzinfo=ROLLUP_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+
+def month_instants(year: int, month: int) -> Tuple[datetime, datetime]:
+    """UTC bounds of the month in ROLLUP_TIMEZONE, for matching invoice, GRN and payment dates."""
+    start, end = month_bounds(year, month)
+    return local_day_start(start), local_day_start(end)
+
+async def record_invoice_gst(db, invoice: Invoice, session=None, **_):
+    """Fold an invoice's lines into the per-day, per-HSN/rate rollups."""
+    if InvoiceStatus(invoice.status).value in GST_EXCLUDED_STATUSES:
+        return
+    item_ids = list({line.item_id for line in invoice.items})
+    if not item_ids:
+        return
+    item_docs = await db.items.find(
+        {"item_id": {"$in": item_ids}}, {"item_id": 1, "hsn_code": 1}, session=session
+    ).to_list(length=None)
+    hsn_by_item = {doc["item_id"]: doc["hsn_code"] for doc in item_docs if doc.get("hsn_code") is not None}
+
+    totals: Dict[Tuple[Any, float], Dict[str, float]] = {}
+    for line in invoice.items:
+        key = (hsn_by_item.get(line.item_id, UNKNOWN_HSN), line.gst_rate)
+        bucket = totals.setdefault(key, {field: 0.0 for field in AMOUNT_FIELDS} | {"quantity": 0, "line_count": 0})
+        bucket["taxable_value"] += line.quantity * line.unit_price
+        bucket["cgst_amount"] += line.cgst_amount
+        bucket["sgst_amount"] += line.sgst_amount
+        bucket["igst_amount"] += line.igst_amount
+        bucket["total_amount"] += line.total_amount
+        bucket["quantity"] += line.quantity
+        bucket["line_count"] += 1
+
+    day = rollup_day(invoice.invoice_date)
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"company_id": invoice.company_id, "day": day, "hsn_code": hsn_code, "gst_rate": gst_rate},
+            {"$inc": increments, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for (hsn_code, gst_rate), increments in totals.items()
+    ]
+    await db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False, session=session)
+
+async def rebuild_gst_rollups(db, company_id: str, year: int, month: int):
+    """Recompute one month of rollups from the invoices themselves (backfill / repair).
+
+    Rows are replaced in place and stale keys removed afterwards, so readers
+    never see the month empty or half-built.
+    """
+    start, end = month_bounds(year, month)
+    date_from, date_to = month_instants(year, month)
+    started = datetime.utcnow()
+    day_part = {"date": "$invoice_date", "timezone": ROLLUP_TIMEZONE_NAME}
+    pipeline = [
+        {"$match": {
+            "company_id": company_id,
+            "invoice_date": {"$gte": date_from, "$lt": date_to},
+            "status": {"$nin": list(GST_EXCLUDED_STATUSES)}
+        }},
+        {"$unwind": "$items"},
+        {"$lookup": {
+            "from": "items",
+            "localField": "items.item_id",
+            "foreignField": "item_id",
+            "as": "item"
+        }},
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromParts": {
+                    "year": {"$year": day_part},
+                    "month": {"$month": day_part},
+                    "day": {"$dayOfMonth": day_part}
+                }},
+                "hsn_code": {"$first": "$item.hsn_code"},
+                "gst_rate": "$items.gst_rate"
+            },
+            "taxable_value": {"$sum": {"$multiply": ["$items.quantity", "$items.unit_price"]}},
+            "cgst_amount": {"$sum": "$items.cgst_amount"},
+            "sgst_amount": {"$sum": "$items.sgst_amount"},
+            "igst_amount": {"$sum": "$items.igst_amount"},
+            "total_amount": {"$sum": "$items.total_amount"},
+            "quantity": {"$sum": "$items.quantity"},
+            "line_count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "company_id": {"$literal": company_id},
+            "day": "$_id.day",
+            "hsn_code": {"$ifNull": ["$_id.hsn_code", UNKNOWN_HSN]},
+            "gst_rate": "$_id.gst_rate",
+            "taxable_value": 1, "cgst_amount": 1, "sgst_amount": 1, "igst_amount": 1,
+            "total_amount": 1, "quantity": 1, "line_count": 1,
+            "updated_at": {"$literal": started}
+        }},
+        {"$merge": {
+            "into": ROLLUP_COLLECTION,
+            "on": ["company_id", "day", "hsn_code", "gst_rate"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }},
+    ]
+    await db.invoices.aggregate(pipeline).to_list(length=None)
+    # Keys no invoice produces any more (nor any posting since the run started)
+    await db[ROLLUP_COLLECTION].delete_many(
+        {"company_id": company_id, "day": {"$gte": start, "$lt": end}, "updated_at": {"$lt": started}}
+    )
+
+async def compute_gst_return(db, company_id: str, year: int, month: int) -> GSTReturn:
+    """Build GSTR-1 and GSTR-3B summaries from at most ~31 days of pre-aggregated rows per HSN/rate."""
+    start, end = month_bounds(year, month)
+    pipeline = [
+        {"$match": {"company_id": company_id, "day": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"hsn_code": "$hsn_code", "gst_rate": "$gst_rate"},
+            **{field: {"$sum": f"${field}"} for field in AMOUNT_FIELDS + ("quantity",)}
+        }},
+        {"$sort": {"_id.hsn_code": 1, "_id.gst_rate": 1}},
+    ]
+    rows = await db[ROLLUP_COLLECTION].aggregate(pipeline).to_list(length=None)
+
+    hsn_summary: List[Dict[str, Any]] = []
+    totals = {field: 0.0 for field in AMOUNT_FIELDS}
+    for row in rows:
+        entry = {"hsn_code": row["_id"]["hsn_code"], "gst_rate": row["_id"]["gst_rate"], "quantity": row["quantity"]}
+        for field in AMOUNT_FIELDS:
+            entry[field] = round(row[field], 2)
+            totals[field] += row[field]
+        hsn_summary.append(entry)
+    totals = {field: round(value, 2) for field, value in totals.items()}
+
+    gst_return = GSTReturn(
+        company_id=company_id,
+        month=month,
+        year=year,
+        gstr1_data={
+            "period": f"{month:02d}{year}",
+            "hsn_summary": hsn_summary,
+            "totals": totals
+        },
+        gstr3b_data={
+            "period": f"{month:02d}{year}",
+            "outward_taxable_supplies": {
+                "taxable_value": totals["taxable_value"],
+                "integrated_tax": totals["igst_amount"],
+                "central_tax": totals["cgst_amount"],
+                "state_tax": totals["sgst_amount"]
+            }
+        }
+    )
+
+    # Keep one return per period; a filed return is never overwritten
+    existing = await db.gst_returns.find_one({"company_id": company_id, "year": year, "month": month})
+    if existing and existing.get("is_filed"):
+        return GSTReturn(**existing)
+    if existing:
+        gst_return.id = existing["_id"]
+        gst_return.return_id = existing["return_id"]
+    await db.gst_returns.replace_one(
+        {"company_id": company_id, "year": year, "month": month},
+        gst_return.dict(by_alias=True),
+        upsert=True
+    )
+    return gst_return
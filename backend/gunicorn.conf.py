@@ -0,0 +1,36 @@
+# Multi-process deployment profile:
+#
+#   gunicorn -c gunicorn.conf.py server:app
+#
+# Every worker is a separate process with its own event loop and Motor client.
+# State that must be consistent across workers (the dashboard cache, background
+# jobs) lives in MongoDB; the in-process caches that remain (authenticated users,
+# index/transaction probes) are safe to keep per worker.
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+# Async workers each handle many connections, so one per core is the starting point
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app must be imported after the fork: a Motor client or event loop created in
+# the master would be shared by every worker
+preload_app = False
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Workers inherit these defaults unless the environment already sets them:
+# share the dashboard cache through MongoDB, and keep running background jobs
+# inside the web workers unless dedicated `python worker.py` processes are deployed
+os.environ.setdefault("CACHE_BACKEND", "mongo")
+os.environ.setdefault("RUN_JOBS_IN_PROCESS", "true")
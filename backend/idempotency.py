@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from fastapi import Header, HTTPException, Request, Response
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Awaitable, Callable, Optional, Sequence
+from pydantic import BaseModel
+from cache import TTLCache
+from serialization import dumps
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+# How long a key is remembered, and how long a reservation outlives its last heartbeat
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_LOCK_SECONDS = float(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "60"))
+
+# Record states: reserved -> committed (in the posting transaction) -> done (response stored)
+IN_PROGRESS = "in_progress"
+COMMITTED = "committed"
+DONE = "done"
+
+# Posting hooks, called as hook(db, document, session=...) inside the posting transaction
+Hook = Callable[..., Awaitable[None]]
+
+class IdempotentRequest:
+    def __init__(self, key: str, fingerprint: str):
+        self.key = key
+        self.fingerprint = fingerprint
+
+async def idempotency_params(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Optional[IdempotentRequest]:
+    if idempotency_key is None:
+        return None
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+    # The raw body, not the parsed model: parsing fills in fresh ids on every attempt
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}\n".encode("utf-8"))
+    digest.update(await request.body())
+    return IdempotentRequest(idempotency_key, digest.hexdigest())
+
+def _check_fingerprint(record: dict, request: IdempotentRequest):
+    if record["fingerprint"] != request.fingerprint:
+        raise HTTPException(status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+
+def _json(content: Any) -> bytes:
+    if isinstance(content, BaseModel):
+        content = content.dict(by_alias=True)
+    return dumps(content)
+
+class IdempotencyStore:
+    """Replays the stored response of a document-creating POST retried with the same Idempotency-Key.
+
+    The first request reserves the key in a TTL-indexed collection before doing
+    any work, so a concurrent retry is turned away instead of posting twice.
+    The handler gets a posting hook that marks the key committed inside its
+    transaction: a failed request releases the key only if nothing was
+    committed, and a reservation taken over from a dead worker can never
+    commit a second time. Completed responses are also kept in a small
+    in-process cache so most retries never reach MongoDB.
+    """
+
+    def __init__(self, collection, cache_size: int = 10000, cache_ttl: float = 300.0):
+        self.collection = collection
+        self.cache = TTLCache(maxsize=cache_size, ttl=min(cache_ttl, IDEMPOTENCY_TTL_SECONDS))
+
+    def _replay(self, record: dict, request: IdempotentRequest) -> Response:
+        _check_fingerprint(record, request)
+        return Response(content=record["body"], status_code=record["status_code"], media_type="application/json",
+                        headers={REPLAYED_HEADER: "true"})
+
+    async def _reserve(self, record_id: str, holder: str, request: IdempotentRequest) -> Optional[dict]:
+        """Reserve the key; returns the existing record when another request already holds it."""
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        try:
+            await self.collection.insert_one({
+                "_id": record_id,
+                "fingerprint": request.fingerprint,
+                "state": IN_PROGRESS,
+                "holder": holder,
+                "locked_until": locked_until,
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        # Take over a reservation whose worker stopped heartbeating. Nothing of it was
+        # committed, and changing the holder makes its commit hook fail if it ever resumes.
+        taken = await self.collection.find_one_and_update(
+            {"_id": record_id, "state": IN_PROGRESS, "fingerprint": request.fingerprint, "locked_until": {"$lt": now}},
+            {"$set": {"holder": holder, "locked_until": locked_until}}
+        )
+        if taken:
+            logger.warning("Idempotency key %s: previous attempt stopped before committing, running it again", record_id)
+            return None
+        existing = await self.collection.find_one({"_id": record_id})
+        # Expired between the insert and the read: treat it as a fresh key
+        return existing or await self._reserve(record_id, holder, request)
+
+    async def _heartbeat(self, record_id: str, holder: str):
+        # Keep the reservation while the handler runs, however long that takes
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_LOCK_SECONDS / 3)
+            try:
+                await self.collection.update_one(
+                    {"_id": record_id, "holder": holder, "state": IN_PROGRESS},
+                    {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}}
+                )
+            except Exception:
+                logger.warning("Could not renew idempotency key %s", record_id, exc_info=True)
+
+    def _commit_hook(self, record_id: str, holder: str) -> Hook:
+        async def mark_committed(db, document, session=None, **_):
+            result = await self.collection.update_one(
+                {"_id": record_id, "holder": holder, "state": IN_PROGRESS},
+                {"$set": {"state": COMMITTED}},
+                session=session
+            )
+            if result.modified_count != 1:
+                # Another request took the key over; abort so the work is not posted twice
+                raise HTTPException(status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed")
+        return mark_committed
+
+    async def run(self, request: Optional[IdempotentRequest], user_id: str,
+                  handler: Callable[[Sequence[Hook]], Awaitable[Any]]) -> Any:
+        """Run `handler(hooks)`, which must pass `hooks` to the posting transaction it commits."""
+        if request is None:
+            return await handler(())
+        record_id = f"{user_id}:{request.key}"
+
+        cached = self.cache.get(record_id)
+        if cached is not None:
+            return self._replay(cached, request)
+
+        holder = uuid.uuid4().hex
+        existing = await self._reserve(record_id, holder, request)
+        if existing is not None:
+            _check_fingerprint(existing, request)
+            if existing["state"] == COMMITTED and existing.get("locked_until", datetime.min) < datetime.utcnow():
+                # Committed by a request that died (or failed after committing) before storing its response
+                raise HTTPException(status_code=409, detail=f"The request with this {IDEMPOTENCY_HEADER} was already applied")
+            if existing["state"] != DONE:
+                raise HTTPException(status_code=409, detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed")
+            self.cache.set(record_id, existing)
+            return self._replay(existing, request)
+
+        heartbeat = asyncio.create_task(self._heartbeat(record_id, holder))
+        try:
+            content = await handler([self._commit_hook(record_id, holder)])
+        except BaseException:
+            # Released only if the posting transaction did not commit; a committed key stays taken
+            released = await self.collection.delete_one({"_id": record_id, "holder": holder, "state": IN_PROGRESS})
+            if not released.deleted_count:
+                await self.collection.update_one(
+                    {"_id": record_id, "holder": holder, "state": COMMITTED},
+                    {"$set": {"locked_until": datetime.utcnow()}}
+                )
+            raise
+        finally:
+            heartbeat.cancel()
+
+        record = {"fingerprint": request.fingerprint, "status_code": 200, "body": _json(content)}
+        await self.collection.update_one(
+            {"_id": record_id, "holder": holder},
+            {"$set": {**record, "state": DONE}, "$unset": {"locked_until": ""}}
+        )
+        self.cache.set(record_id, record)
+        return Response(content=record["body"], status_code=200, media_type="application/json")
@@ -0,0 +1,337 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from typing import Dict, List, NamedTuple, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class QueryShape(NamedTuple):
+    collection: str
+    name: str
+    equality: Tuple[str, ...] = ()
+    sort: Tuple[Tuple[str, int], ...] = ()
+
+def _unique(field: str) -> IndexModel:
+    return IndexModel([(field, ASCENDING)], unique=True, name=f"{field}_unique")
+
+def _index(*keys: Tuple[str, int]) -> IndexModel:
+    return IndexModel(list(keys), name="_".join(f"{field}_{direction}" for field, direction in keys))
+
+# Index declarations per collection. Keys follow equality -> sort -> range order.
+INDEXES: Dict[str, List[IndexModel]] = {
+    # updated_at serves each worker's reload of recently changed users
+    "users": [
+        _unique("email"),
+        _unique("user_id"),
+        _index(("updated_at", ASCENDING)),
+    ],
+    "companies": [
+        _unique("company_id"),
+    ],
+    "locations": [
+        _unique("location_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "categories": [
+        _unique("category_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "items": [
+        _unique("item_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("category_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("search_terms", ASCENDING)),
+        _index(("company_id", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("sku", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "customers": [
+        _unique("customer_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("search_terms", ASCENDING)),
+        _index(("company_id", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "suppliers": [
+        _unique("supplier_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("search_terms", ASCENDING)),
+        _index(("company_id", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "purchase_orders": [
+        _unique("po_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("status", ASCENDING)),
+    ],
+    "grn": [
+        _unique("grn_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "sales_orders": [
+        _unique("so_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("status", ASCENDING)),
+    ],
+    "invoices": [
+        _unique("invoice_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING)),
+    ],
+    "stock": [
+        _unique("stock_id"),
+        # One stock row per item and location
+        IndexModel([("company_id", ASCENDING), ("item_id", ASCENDING), ("location_id", ASCENDING)],
+                   unique=True, name="company_id_item_id_location_id_unique"),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("last_updated", ASCENDING), ("quantity", ASCENDING)),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "batches": [
+        _unique("batch_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("expiry_date", ASCENDING), ("_id", ASCENDING)),
+        # Only batches that still hold stock can expire on a shelf, which keeps these indexes small
+        IndexModel([("company_id", ASCENDING), ("location_id", ASCENDING), ("expiry_date", ASCENDING), ("_id", ASCENDING)],
+                   partialFilterExpression={"quantity_available": {"$gt": 0}}, name="near_expiry_by_location"),
+        IndexModel([("company_id", ASCENDING), ("expiry_date", ASCENDING), ("_id", ASCENDING)],
+                   partialFilterExpression={"quantity_available": {"$gt": 0}}, name="near_expiry"),
+    ],
+    "stock_movements": [
+        _unique("movement_id"),
+        _index(("company_id", ASCENDING), ("movement_date", DESCENDING), ("_id", DESCENDING)),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("movement_date", DESCENDING), ("_id", DESCENDING)),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("item_id", ASCENDING), ("location_id", ASCENDING), ("movement_date", ASCENDING)),
+        _index(("reference_id", ASCENDING)),
+    ],
+    "payments": [
+        _unique("payment_id"),
+        _index(("company_id", ASCENDING), ("_id", ASCENDING)),
+        _index(("invoice_id", ASCENDING)),
+    ],
+    "payment_orders": [
+        # Reservations have no order_id until the gateway returns one
+        IndexModel([("order_id", ASCENDING)], unique=True, name="order_id_unique_if_set",
+                   partialFilterExpression={"order_id": {"$type": "string"}}),
+        IndexModel([("idempotency_key", ASCENDING)], unique=True, name="idempotency_key_unique",
+                   partialFilterExpression={"idempotency_key": {"$type": "string"}}),
+    ],
+    "stock_snapshot_runs": [
+        _unique("run_id"),
+        _index(("company_id", ASCENDING), ("snapshot_at", DESCENDING)),
+    ],
+    "stock_snapshots": [
+        _index(("run_id", ASCENDING), ("item_id", ASCENDING), ("location_id", ASCENDING)),
+    ],
+    "stock_consistency_reports": [
+        _index(("company_id", ASCENDING), ("checked_at", DESCENDING)),
+    ],
+    "gst_daily_rollups": [
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING), ("hsn_code", ASCENDING), ("gst_rate", ASCENDING)],
+                   unique=True, name="company_day_hsn_rate_unique"),
+    ],
+    "gst_returns": [
+        IndexModel([("company_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)],
+                   unique=True, name="company_period_unique"),
+    ],
+    "reorder_alerts": [
+        IndexModel([("company_id", ASCENDING), ("item_id", ASCENDING), ("location_id", ASCENDING)],
+                   unique=True, name="company_item_location_unique"),
+        _index(("company_id", ASCENDING), ("quantity", ASCENDING), ("_id", ASCENDING)),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("quantity", ASCENDING), ("_id", ASCENDING)),
+    ],
+    "sales_item_daily": [
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING), ("location_id", ASCENDING), ("item_id", ASCENDING)],
+                   unique=True, name="company_day_location_item_unique"),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("day", ASCENDING)),
+    ],
+    "sales_customer_daily": [
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING), ("location_id", ASCENDING), ("customer_id", ASCENDING)],
+                   unique=True, name="company_day_location_customer_unique"),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("day", ASCENDING)),
+    ],
+    "purchase_supplier_daily": [
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING), ("location_id", ASCENDING), ("supplier_id", ASCENDING)],
+                   unique=True, name="company_day_location_supplier_unique"),
+        _index(("company_id", ASCENDING), ("location_id", ASCENDING), ("day", ASCENDING)),
+    ],
+    "payment_daily": [
+        IndexModel([("company_id", ASCENDING), ("day", ASCENDING), ("payment_mode", ASCENDING)],
+                   unique=True, name="company_day_mode_unique"),
+    ],
+    "customer_balances": [
+        IndexModel([("company_id", ASCENDING), ("customer_id", ASCENDING)],
+                   unique=True, name="company_customer_unique"),
+    ],
+    "jobs": [
+        _unique("job_id"),
+        IndexModel([("active_key", ASCENDING)], unique=True, name="active_key_unique",
+                   partialFilterExpression={"active_key": {"$exists": True}}),
+        _index(("status", ASCENDING), ("run_after", ASCENDING)),
+        _index(("status", ASCENDING), ("locked_until", ASCENDING)),
+        # Finished jobs are kept for a week
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600, name="finished_at_ttl"),
+    ],
+    "cache_entries": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    # Sessions are looked up by _id; revoked_at serves the revocation-list reload
+    "sessions": [
+        _index(("revoked_at", ASCENDING)),
+        _index(("user_id", ASCENDING), ("revoked_at", ASCENDING)),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    # Idempotency keys are looked up by _id; the TTL index only expires them
+    "idempotency_keys": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+}
+
+# Every query the API issues. Each one must be served by a prefix of a declared index.
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("users", "login / register", equality=("email",)),
+    QueryShape("users", "current user", equality=("user_id",)),
+    QueryShape("users", "recently changed users", sort=(("updated_at", ASCENDING),)),
+    QueryShape("companies", "list companies", sort=(("_id", ASCENDING),)),
+    QueryShape("locations", "list locations", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("categories", "list categories", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("items", "get item", equality=("item_id",)),
+    QueryShape("items", "list items", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("items", "list items by category", equality=("company_id", "category_id"), sort=(("_id", ASCENDING),)),
+    QueryShape("items", "dashboard item count", equality=("company_id",)),
+    QueryShape("customers", "list customers", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("suppliers", "list suppliers", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("purchase_orders", "get purchase order", equality=("po_id",)),
+    QueryShape("purchase_orders", "list purchase orders", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("purchase_orders", "dashboard pending purchase orders", equality=("company_id", "status")),
+    QueryShape("grn", "list grns", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("sales_orders", "get sales order", equality=("so_id",)),
+    QueryShape("sales_orders", "list sales orders", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("sales_orders", "dashboard pending sales orders", equality=("company_id", "status")),
+    QueryShape("invoices", "get invoice", equality=("invoice_id",)),
+    QueryShape("invoices", "list invoices", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("invoices", "dashboard overdue invoices", equality=("company_id", "status"), sort=(("due_date", ASCENDING),)),
+    QueryShape("stock", "grn stock lookup", equality=("company_id", "item_id", "location_id")),
+    QueryShape("stock", "invoice fifo allocation", equality=("company_id", "item_id"), sort=(("last_updated", ASCENDING),)),
+    QueryShape("stock", "list stock", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("stock", "list stock by location", equality=("company_id", "location_id"), sort=(("_id", ASCENDING),)),
+    QueryShape("stock", "list stock by item", equality=("company_id", "item_id"), sort=(("_id", ASCENDING),)),
+    QueryShape("batches", "list batches", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("batches", "list batches by item", equality=("company_id", "item_id"), sort=(("_id", ASCENDING),)),
+    QueryShape("batches", "list batches by location", equality=("company_id", "location_id"), sort=(("_id", ASCENDING),)),
+    QueryShape("stock_movements", "list movements", equality=("company_id",), sort=(("movement_date", DESCENDING), ("_id", DESCENDING))),
+    QueryShape("stock_movements", "list movements by item", equality=("company_id", "item_id"), sort=(("movement_date", DESCENDING), ("_id", DESCENDING))),
+    QueryShape("payments", "list payments", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("invoices", "payment invoice lookup", equality=("invoice_id",)),
+    QueryShape("invoices", "export invoices", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("stock_movements", "export movements", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("batches", "invoice fefo allocation", equality=("company_id", "item_id"), sort=(("expiry_date", ASCENDING),)),
+    QueryShape("batches", "expiring batches by location", equality=("company_id", "location_id"), sort=(("expiry_date", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("batches", "expiring batches", equality=("company_id",), sort=(("expiry_date", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("batches", "export batches", equality=("company_id",), sort=(("_id", ASCENDING),)),
+    QueryShape("payment_orders", "payment order idempotency lookup", equality=("idempotency_key",)),
+    QueryShape("stock_snapshot_runs", "latest snapshot", equality=("company_id",), sort=(("snapshot_at", DESCENDING),)),
+    QueryShape("stock_snapshots", "snapshot rows by run", equality=("run_id",)),
+    QueryShape("stock_snapshots", "snapshot rows by item", equality=("run_id", "item_id")),
+    QueryShape("stock_movements", "movements since snapshot", equality=("company_id",), sort=(("movement_date", DESCENDING),)),
+    QueryShape("stock_movements", "item movements since snapshot", equality=("company_id", "item_id", "location_id"), sort=(("movement_date", ASCENDING),)),
+    QueryShape("stock_consistency_reports", "latest consistency report", equality=("company_id",), sort=(("checked_at", DESCENDING),)),
+    QueryShape("gst_daily_rollups", "invoice gst rollup upsert", equality=("company_id", "day", "hsn_code", "gst_rate")),
+    QueryShape("gst_daily_rollups", "monthly gst return", equality=("company_id",), sort=(("day", ASCENDING),)),
+    QueryShape("gst_returns", "gst return by period", equality=("company_id", "year", "month")),
+    QueryShape("items", "item search", equality=("company_id",), sort=(("search_terms", ASCENDING),)),
+    QueryShape("items", "list items by name", equality=("company_id",), sort=(("name", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("items", "list items by sku", equality=("company_id",), sort=(("sku", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("items", "list items by creation", equality=("company_id",), sort=(("created_at", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("customers", "customer search", equality=("company_id",), sort=(("search_terms", ASCENDING),)),
+    QueryShape("customers", "list customers by name", equality=("company_id",), sort=(("name", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("customers", "list customers by creation", equality=("company_id",), sort=(("created_at", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("suppliers", "supplier search", equality=("company_id",), sort=(("search_terms", ASCENDING),)),
+    QueryShape("suppliers", "list suppliers by name", equality=("company_id",), sort=(("name", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("suppliers", "list suppliers by creation", equality=("company_id",), sort=(("created_at", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("reorder_alerts", "reorder alert upsert", equality=("company_id", "item_id", "location_id")),
+    QueryShape("reorder_alerts", "reorder list", equality=("company_id",), sort=(("quantity", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("reorder_alerts", "reorder list by location", equality=("company_id", "location_id"), sort=(("quantity", ASCENDING), ("_id", ASCENDING))),
+    QueryShape("reorder_alerts", "rebuild stale alerts", equality=("company_id",)),
+    QueryShape("sales_item_daily", "rollup upsert", equality=("company_id", "day", "location_id", "item_id")),
+    QueryShape("sales_item_daily", "analytics window", equality=("company_id",), sort=(("day", ASCENDING),)),
+    QueryShape("sales_item_daily", "analytics window by location", equality=("company_id", "location_id"), sort=(("day", ASCENDING),)),
+    QueryShape("sales_customer_daily", "rollup upsert", equality=("company_id", "day", "location_id", "customer_id")),
+    QueryShape("sales_customer_daily", "analytics window", equality=("company_id",), sort=(("day", ASCENDING),)),
+    QueryShape("sales_customer_daily", "analytics window by location", equality=("company_id", "location_id"), sort=(("day", ASCENDING),)),
+    QueryShape("purchase_supplier_daily", "rollup upsert", equality=("company_id", "day", "location_id", "supplier_id")),
+    QueryShape("purchase_supplier_daily", "analytics window", equality=("company_id",), sort=(("day", ASCENDING),)),
+    QueryShape("purchase_supplier_daily", "analytics window by location", equality=("company_id", "location_id"), sort=(("day", ASCENDING),)),
+    QueryShape("payment_daily", "rollup upsert", equality=("company_id", "day", "payment_mode")),
+    QueryShape("payment_daily", "analytics window", equality=("company_id",), sort=(("day", ASCENDING),)),
+    QueryShape("stock_movements", "analytics rebuild movements by invoice", equality=("reference_id",)),
+    QueryShape("invoices", "receivables ageing", equality=("company_id", "status"), sort=(("due_date", ASCENDING),)),
+    QueryShape("invoices", "customer balance rebuild", equality=("company_id",)),
+    QueryShape("customer_balances", "balance upsert / credit check", equality=("company_id", "customer_id")),
+    QueryShape("customers", "credit check customer", equality=("customer_id",)),
+    QueryShape("sessions", "recently revoked sessions", sort=(("revoked_at", ASCENDING),)),
+    QueryShape("sessions", "revoke a user's sessions", equality=("user_id", "revoked_at")),
+    QueryShape("jobs", "get job", equality=("job_id",)),
+    QueryShape("jobs", "job dedupe lookup", equality=("active_key",)),
+    QueryShape("jobs", "claim due job", equality=("status",), sort=(("run_after", ASCENDING),)),
+    QueryShape("jobs", "reclaim expired lease", equality=("status",), sort=(("locked_until", ASCENDING),)),
+    QueryShape("gst_returns", "list gst returns", equality=("company_id",), sort=(("year", DESCENDING), ("month", DESCENDING))),
+]
+
+def _index_keys(index: IndexModel) -> List[Tuple[str, int]]:
+    return list(index.document["key"].items())
+
+def covers(keys: List[Tuple[str, int]], shape: QueryShape) -> bool:
+    # Equality fields may appear in any order, but must form the index prefix
+    n_eq = len(shape.equality)
+    if len(keys) < n_eq + len(shape.sort):
+        return False
+    if {field for field, _ in keys[:n_eq]} != set(shape.equality):
+        return False
+    if not shape.sort:
+        return True
+    # An index can be walked backwards, so the sort may match in either direction
+    index_sort = keys[n_eq:n_eq + len(shape.sort)]
+    if [field for field, _ in index_sort] != [field for field, _ in shape.sort]:
+        return False
+    same = all(a == b for (_, a), (_, b) in zip(index_sort, shape.sort))
+    reversed_ = all(a == -b for (_, a), (_, b) in zip(index_sort, shape.sort))
+    return same or reversed_
+
+def uncovered_query_shapes() -> List[QueryShape]:
+    uncovered = []
+    for shape in QUERY_SHAPES:
+        keys = [_index_keys(index) for index in INDEXES.get(shape.collection, [])]
+        # A bare _id sort is always served by the default _id index
+        if not shape.equality and shape.sort in ((("_id", ASCENDING),), (("_id", DESCENDING),)):
+            continue
+        if not any(covers(k, shape) for k in keys):
+            uncovered.append(shape)
+    return uncovered
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every declared index. Safe to run on each startup; existing indexes are left alone."""
+    report = {"ensured": [], "failed": [], "uncovered": []}
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            name = index.document["name"]
+            try:
+                await db[collection].create_indexes([index])
+                report["ensured"].append(f"{collection}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicate data blocking a unique index, or a conflicting definition
+                logger.error("Could not create index %s.%s: %s", collection, name, e)
+                report["failed"].append(f"{collection}.{name}")
+
+    for shape in uncovered_query_shapes():
+        logger.warning("No index covers query shape %s (%s): equality=%s sort=%s",
+                       shape.collection, shape.name, shape.equality, shape.sort)
+        report["uncovered"].append(f"{shape.collection}: {shape.name}")
+
+    logger.info("Index bootstrap finished: %d ensured, %d failed, %d uncovered query shapes",
+                len(report["ensured"]), len(report["failed"]), len(report["uncovered"]))
+    return report
@@ -0,0 +1,114 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import Awaitable, Callable, Dict, List, Sequence
+from models import GRN, Batch, Stock, StockMovement, StockMovementType
+from transactions import run_in_transaction, supports_transactions
+
+# Called as hook(db, grn, session=...) inside the posting transaction
+GRNHook = Callable[..., Awaitable[None]]
+
+def _is_duplicate_key(error: Exception) -> bool:
+    if isinstance(error, BulkWriteError):
+        return any(e.get("code") == 11000 for e in error.details.get("writeErrors", []))
+    return isinstance(error, DuplicateKeyError)
+
+async def post_grn(client, db, grn_data: GRN, user_id: str, hooks: Sequence[GRNHook] = ()) -> GRN:
+    """Write a GRN atomically, retrying once when a concurrent GRN creates the same new stock row."""
+    async def post(session):
+        return await write_grn(db, grn_data, user_id, session=session, hooks=hooks)
+
+    try:
+        return await run_in_transaction(client, post)
+    except (BulkWriteError, DuplicateKeyError) as e:
+        # Without a transaction part of the GRN may already be written, so it is not safe to rerun
+        if not _is_duplicate_key(e) or not await supports_transactions(client):
+            raise
+    # The other GRN's row now exists, so this attempt increments it instead of inserting
+    return await run_in_transaction(client, post)
+
+async def write_grn(db, grn_data: GRN, user_id: str, session=None, hooks: Sequence[GRNHook] = ()) -> GRN:
+    """Write a GRN with its stock, batch and movement records in a fixed number of round trips."""
+    company_id = grn_data.company_id
+    location_id = grn_data.location_id
+    item_ids = list({item.item_id for item in grn_data.items})
+
+    # Prefetch every referenced item and stock row
+    item_docs = await db.items.find(
+        {"item_id": {"$in": item_ids}},
+        {"item_id": 1, "is_batch_tracked": 1},
+        session=session,
+    ).to_list(length=None)
+    batch_tracked = {doc["item_id"] for doc in item_docs if doc.get("is_batch_tracked", False)}
+
+    stock_docs = await db.stock.find(
+        {"company_id": company_id, "location_id": location_id, "item_id": {"$in": item_ids}},
+        {"item_id": 1, "stock_id": 1},
+        session=session,
+    ).to_list(length=None)
+    existing_stock: Dict[str, str] = {}
+    for doc in stock_docs:
+        existing_stock.setdefault(doc["item_id"], doc["stock_id"])
+
+    received: Dict[str, int] = {}
+    batches: List[dict] = []
+    movements: List[dict] = []
+    for item in grn_data.items:
+        received[item.item_id] = received.get(item.item_id, 0) + item.received_quantity
+
+        # Create batch if item is batch-tracked
+        if item.item_id in batch_tracked and item.batch_number:
+            batch = Batch(
+                company_id=company_id,
+                item_id=item.item_id,
+                batch_number=item.batch_number,
+                manufacturing_date=item.manufacturing_date,
+                expiry_date=item.expiry_date,
+                purchase_date=grn_data.grn_date,
+                purchase_price=item.unit_price,
+                quantity_received=item.received_quantity,
+                quantity_available=item.received_quantity,
+                location_id=location_id
+            )
+            batches.append(batch.dict(by_alias=True))
+
+        movement = StockMovement(
+            company_id=company_id,
+            item_id=item.item_id,
+            location_id=location_id,
+            movement_type=StockMovementType.PURCHASE,
+            quantity=item.received_quantity,
+            reference_id=grn_data.po_id,
+            reference_type="purchase_order",
+            created_by=user_id
+        )
+        movements.append(movement.dict(by_alias=True))
+
+    stock_ops = []
+    for item_id, quantity in received.items():
+        if item_id in existing_stock:
+            stock_ops.append(UpdateOne(
+                {"stock_id": existing_stock[item_id]},
+                {"$inc": {"quantity": quantity}}
+            ))
+        else:
+            # Upsert on the natural key; its unique index turns a concurrent GRN for the
+            # same new item into a duplicate-key error, which post_grn retries
+            new_stock = Stock(company_id=company_id, item_id=item_id, location_id=location_id, quantity=0)
+            on_insert = new_stock.dict(by_alias=True)
+            del on_insert["quantity"]
+            stock_ops.append(UpdateOne(
+                {"company_id": company_id, "item_id": item_id, "location_id": location_id},
+                {"$inc": {"quantity": quantity}, "$setOnInsert": on_insert},
+                upsert=True
+            ))
+
+    if stock_ops:
+        await db.stock.bulk_write(stock_ops, ordered=True, session=session)
+    if batches:
+        await db.batches.insert_many(batches, session=session)
+    if movements:
+        await db.stock_movements.insert_many(movements, session=session)
+    await db.grn.insert_one(grn_data.dict(by_alias=True), session=session)
+    for hook in hooks:
+        await hook(db, grn_data, session=session)
+    return grn_data
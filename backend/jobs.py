@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+from models import Job, JobStatus
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+SCHEDULES_COLLECTION = "job_schedules"
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "120"))
+JOB_RETRY_BACKOFF_SECONDS = 30.0
+
+JobHandler = Callable[..., Awaitable[Optional[Dict[str, Any]]]]
+
+class PeriodicJob(NamedTuple):
+    name: str
+    kind: str
+    interval: float
+    payload: Dict[str, Any] = {}
+
+class JobQueue:
+    """Mongo-backed job queue shared by every web and worker process.
+
+    A job is claimed atomically with find_one_and_update and held under a lease
+    that the runner keeps extending; a job whose worker died is picked up again
+    once its lease lapses. `dedupe_key` keeps at most one queued or running job
+    per key (a unique partial index on `active_key`).
+    """
+
+    def __init__(self, db, handlers: Optional[Dict[str, JobHandler]] = None):
+        self.db = db
+        self.jobs = db[JOBS_COLLECTION]
+        self.schedules = db[SCHEDULES_COLLECTION]
+        self.handlers: Dict[str, JobHandler] = dict(handlers or {})
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self.handlers[kind] = handler
+
+    async def enqueue(self, kind: str, payload: Optional[Dict[str, Any]] = None, dedupe_key: Optional[str] = None,
+                      max_attempts: int = 3) -> Job:
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job = Job(kind=kind, payload=payload or {}, dedupe_key=dedupe_key, max_attempts=max_attempts)
+        doc = job.dict(by_alias=True)
+        if dedupe_key:
+            doc["active_key"] = dedupe_key
+        try:
+            await self.jobs.insert_one(doc)
+        except DuplicateKeyError:
+            existing = await self.jobs.find_one({"active_key": dedupe_key})
+            if existing:
+                return Job(**existing)
+            raise
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        doc = await self.jobs.find_one({"job_id": job_id})
+        return Job(**doc) if doc else None
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        update = {
+            "$set": {"status": JobStatus.RUNNING.value, "worker_id": self.worker_id, "started_at": now,
+                     "locked_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+            "$inc": {"attempts": 1},
+        }
+        # Jobs abandoned by a dead worker first, then the oldest due job
+        for query, sort in (
+            ({"status": JobStatus.RUNNING.value, "locked_until": {"$lt": now}}, [("locked_until", 1)]),
+            ({"status": JobStatus.QUEUED.value, "run_after": {"$lte": now}}, [("run_after", 1)]),
+        ):
+            job = await self.jobs.find_one_and_update(query, update, sort=sort, return_document=ReturnDocument.AFTER)
+            if job:
+                return job
+        return None
+
+    async def _keep_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await self.jobs.update_one(
+                {"job_id": job_id, "worker_id": self.worker_id},
+                {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+
+    async def execute(self, job: dict) -> None:
+        handler = self.handlers.get(job["kind"])
+        owned = {"job_id": job["job_id"], "worker_id": self.worker_id, "status": JobStatus.RUNNING.value}
+        heartbeat = asyncio.create_task(self._keep_lease(job["job_id"]))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind '{job['kind']}'")
+            result = await handler(self.db, **job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight back instead of waiting for the lease to lapse
+            await self.jobs.update_one(owned, {
+                "$set": {"status": JobStatus.QUEUED.value, "run_after": datetime.utcnow(), "locked_until": None},
+                "$inc": {"attempts": -1},
+            })
+            raise
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", job["job_id"], job["kind"], job["attempts"])
+            if job["attempts"] < job["max_attempts"]:
+                retry_at = datetime.utcnow() + timedelta(seconds=JOB_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+                await self.jobs.update_one(owned, {"$set": {
+                    "status": JobStatus.QUEUED.value, "run_after": retry_at, "locked_until": None, "error": str(e)
+                }})
+            else:
+                await self.jobs.update_one(owned, {
+                    "$set": {"status": JobStatus.FAILED.value, "finished_at": datetime.utcnow(), "error": str(e)},
+                    "$unset": {"active_key": ""},
+                })
+        else:
+            await self.jobs.update_one(owned, {
+                "$set": {"status": JobStatus.DONE.value, "finished_at": datetime.utcnow(), "result": result, "error": None},
+                "$unset": {"active_key": ""},
+            })
+        finally:
+            heartbeat.cancel()
+
+    async def enqueue_due_schedules(self, schedules: List[PeriodicJob]) -> None:
+        """Enqueue periodic jobs that are due; exactly one process wins each tick."""
+        now = datetime.utcnow()
+        for schedule in schedules:
+            if not schedule.interval:
+                continue
+            await self.schedules.update_one({"_id": schedule.name}, {"$setOnInsert": {"next_run_at": now}}, upsert=True)
+            won = await self.schedules.find_one_and_update(
+                {"_id": schedule.name, "next_run_at": {"$lte": now}},
+                {"$set": {"next_run_at": now + timedelta(seconds=schedule.interval), "last_run_at": now}}
+            )
+            if won:
+                await self.enqueue(schedule.kind, schedule.payload, dedupe_key=schedule.name)
+
+    async def run(self, concurrency: int = 2, poll_interval: float = 1.0, schedules: List[PeriodicJob] = ()):
+        """Claim and execute jobs until cancelled, `concurrency` at a time."""
+
+        async def consume():
+            while True:
+                try:
+                    job = await self.claim()
+                    if job is None:
+                        await asyncio.sleep(poll_interval)
+                        continue
+                    await self.execute(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Job runner error")
+                    await asyncio.sleep(poll_interval)
+
+        async def schedule():
+            while True:
+                try:
+                    await self.enqueue_due_schedules(list(schedules))
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Could not enqueue periodic jobs")
+                await asyncio.sleep(max(poll_interval, 10.0))
+
+        logger.info("Job runner %s started with %d consumers", self.worker_id, concurrency)
+        await asyncio.gather(schedule(), *(consume() for _ in range(concurrency)))
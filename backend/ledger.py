@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+LEDGER_CHUNK_SIZE = 500
+SNAPSHOT_WRITE_CHUNK = 5000
+# movement_date is set before the posting transaction commits, so a snapshot only
+# covers movements at least this old; it must exceed the longest transaction
+# (MongoDB aborts them after 60 s by default) or a late commit is in no snapshot
+SNAPSHOT_SAFETY_MARGIN_SECONDS = float(os.environ.get("SNAPSHOT_SAFETY_MARGIN_SECONDS", "300"))
+
+Key = Tuple[str, str]  # (item_id, location_id)
+
+async def latest_snapshot_run(db, company_id: str, at: Optional[datetime] = None) -> Optional[dict]:
+    query: Dict[str, Any] = {"company_id": company_id}
+    if at is not None:
+        query["snapshot_at"] = {"$lte": at}
+    return await db.stock_snapshot_runs.find_one(query, sort=[("snapshot_at", -1)])
+
+async def _movement_deltas(db, company_id: str, since: Optional[datetime], until: datetime, match: Optional[dict] = None) -> Dict[Key, int]:
+    window: Dict[str, Any] = {"$lte": until}
+    if since is not None:
+        window["$gt"] = since
+    stage = {"company_id": company_id, "movement_date": window}
+    stage.update(match or {})
+    pipeline = [
+        {"$match": stage},
+        {"$group": {"_id": {"item_id": "$item_id", "location_id": "$location_id"}, "quantity": {"$sum": "$quantity"}}},
+    ]
+    deltas: Dict[Key, int] = {}
+    async for row in db.stock_movements.aggregate(pipeline):
+        deltas[(row["_id"]["item_id"], row["_id"]["location_id"])] = row["quantity"]
+    return deltas
+
+async def take_snapshot(db, company_id: str, at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Write a per-item/location stock snapshot: the previous snapshot plus the movements since.
+
+    `at` is moved back to SNAPSHOT_SAFETY_MARGIN_SECONDS ago if it is later than that.
+    """
+    settled = datetime.utcnow() - timedelta(seconds=SNAPSHOT_SAFETY_MARGIN_SECONDS)
+    at = min(at, settled) if at else settled
+    previous = await latest_snapshot_run(db, company_id, at)
+    since = previous["snapshot_at"] if previous else None
+    deltas = await _movement_deltas(db, company_id, since, at)
+
+    run_id = str(uuid.uuid4())
+    rows, written = [], 0
+
+    async def flush():
+        nonlocal rows, written
+        if rows:
+            await db.stock_snapshots.insert_many(rows, ordered=False)
+            written += len(rows)
+            rows = []
+
+    if previous:
+        async for snap in db.stock_snapshots.find({"run_id": previous["run_id"]}, {"item_id": 1, "location_id": 1, "quantity": 1}):
+            key = (snap["item_id"], snap["location_id"])
+            quantity = snap["quantity"] + deltas.pop(key, 0)
+            rows.append({"run_id": run_id, "company_id": company_id, "item_id": key[0], "location_id": key[1],
+                         "quantity": quantity, "snapshot_at": at})
+            if len(rows) >= SNAPSHOT_WRITE_CHUNK:
+                await flush()
+    for (item_id, location_id), quantity in deltas.items():
+        rows.append({"run_id": run_id, "company_id": company_id, "item_id": item_id, "location_id": location_id,
+                     "quantity": quantity, "snapshot_at": at})
+        if len(rows) >= SNAPSHOT_WRITE_CHUNK:
+            await flush()
+    await flush()
+
+    # The run document is written last so readers never see a half-written snapshot
+    run = {"run_id": run_id, "company_id": company_id, "snapshot_at": at, "rows": written,
+           "previous_run_id": previous["run_id"] if previous else None, "created_at": datetime.utcnow()}
+    await db.stock_snapshot_runs.insert_one(run)
+    run.pop("_id", None)
+    return run
+
+async def stock_at(db, company_id: str, item_id: str, location_id: Optional[str], at: datetime) -> Dict[str, Any]:
+    """Rebuild stock of an item (at one or all locations) as of `at` from the nearest snapshot and later movements."""
+    run = await latest_snapshot_run(db, company_id, at)
+    base = 0
+    snapshot_query: Dict[str, Any] = {"item_id": item_id}
+    match: Dict[str, Any] = {"item_id": item_id}
+    if location_id:
+        snapshot_query["location_id"] = location_id
+        match["location_id"] = location_id
+    if run:
+        snapshot_query["run_id"] = run["run_id"]
+        async for snap in db.stock_snapshots.find(snapshot_query, {"quantity": 1}):
+            base += snap["quantity"]
+    deltas = await _movement_deltas(db, company_id, run["snapshot_at"] if run else None, at, match)
+    return {
+        "company_id": company_id,
+        "item_id": item_id,
+        "location_id": location_id,
+        "at": at,
+        "quantity": base + sum(deltas.values()),
+        "snapshot_at": run["snapshot_at"] if run else None,
+        "movement_quantity": sum(deltas.values())
+    }
+
+async def check_consistency(db, company_id: str, max_reported: int = 1000) -> Dict[str, Any]:
+    """Compare `stock` with snapshot + movements, a chunk of items at a time."""
+    now = datetime.utcnow()
+    run = await latest_snapshot_run(db, company_id, now)
+    since = run["snapshot_at"] if run else None
+    report: Dict[str, Any] = {"company_id": company_id, "checked_at": now, "items_checked": 0,
+                              "keys_checked": 0, "mismatches": 0, "details": []}
+
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"company_id": company_id}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        items = await db.items.find(query, {"item_id": 1}).sort([("_id", 1)]).limit(LEDGER_CHUNK_SIZE).to_list(length=LEDGER_CHUNK_SIZE)
+        if not items:
+            break
+        last_id = items[-1]["_id"]
+        item_ids = [item["item_id"] for item in items]
+
+        actual: Dict[Key, int] = {}
+        async for row in db.stock.find({"company_id": company_id, "item_id": {"$in": item_ids}}, {"item_id": 1, "location_id": 1, "quantity": 1}):
+            key = (row["item_id"], row["location_id"])
+            actual[key] = actual.get(key, 0) + row["quantity"]
+
+        expected: Dict[Key, int] = {}
+        if run:
+            async for snap in db.stock_snapshots.find({"run_id": run["run_id"], "item_id": {"$in": item_ids}}, {"item_id": 1, "location_id": 1, "quantity": 1}):
+                expected[(snap["item_id"], snap["location_id"])] = snap["quantity"]
+        for key, delta in (await _movement_deltas(db, company_id, since, now, {"item_id": {"$in": item_ids}})).items():
+            expected[key] = expected.get(key, 0) + delta
+
+        report["items_checked"] += len(item_ids)
+        for key in actual.keys() | expected.keys():
+            report["keys_checked"] += 1
+            if actual.get(key, 0) != expected.get(key, 0):
+                report["mismatches"] += 1
+                if len(report["details"]) < max_reported:
+                    report["details"].append({"item_id": key[0], "location_id": key[1],
+                                              "stock_quantity": actual.get(key, 0), "ledger_quantity": expected.get(key, 0)})
+        # Yield between chunks so a long check never monopolises the event loop
+        await asyncio.sleep(0)
+
+    await db.stock_consistency_reports.insert_one(dict(report))
+    if report["mismatches"]:
+        logger.warning("Stock ledger mismatch for company %s: %d of %d item/locations differ",
+                       company_id, report["mismatches"], report["keys_checked"])
+    return report
@@ -0,0 +1,294 @@
+from contextvars import ContextVar
+from pymongo import monitoring
+from pymongo.common import MAX_POOL_SIZE
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+MAX_SHAPES_PER_REQUEST = 50
+
+class RequestStats:
+    __slots__ = ("commands", "documents", "db_seconds", "shapes", "lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.documents = 0
+        self.db_seconds = 0.0
+        self.shapes: List[str] = []
+        self.lock = threading.Lock()
+
+# Motor runs pymongo on executor threads with a copy of the caller's context,
+# so the listener can find the stats object of the request that issued a command
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_commands: Dict[Tuple[str, str], Histogram] = {}
+        self.requests_total: Dict[Tuple[str, str, str], int] = {}
+        self.documents_returned: Dict[Tuple[str, str], int] = {}
+        self.response_bytes: Dict[Tuple[str, str], int] = {}
+        self.db_commands_total: Dict[str, int] = {}
+        self.db_command_seconds: Dict[str, float] = {}
+        # Extra gauges, e.g. connection pool state: name -> callable returning
+        # {(("label", "value"), ...): number}
+        self.gauges: Dict[str, Callable[[], Dict[Tuple[Tuple[str, Any], ...], float]]] = {}
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats, body_bytes: int):
+        key = (method, route)
+        with self.lock:
+            self.request_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.request_db_commands.setdefault(key, Histogram(COUNT_BUCKETS)).observe(stats.commands)
+            status_key = (method, route, str(status))
+            self.requests_total[status_key] = self.requests_total.get(status_key, 0) + 1
+            self.documents_returned[key] = self.documents_returned.get(key, 0) + stats.documents
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + body_bytes
+
+    def record_command(self, command: str, seconds: float):
+        with self.lock:
+            self.db_commands_total[command] = self.db_commands_total.get(command, 0) + 1
+            self.db_command_seconds[command] = self.db_command_seconds.get(command, 0.0) + seconds
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def labels(**kv):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), h in sorted(series.items()):
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f"{name}_bucket{labels(method=method, route=route, le=bound)} {count}")
+                lines.append(f"{name}_bucket{labels(method=method, route=route, le='+Inf')} {h.total}")
+                lines.append(f"{name}_sum{labels(method=method, route=route)} {h.sum}")
+                lines.append(f"{name}_count{labels(method=method, route=route)} {h.total}")
+
+        def counter(name, help_text, series, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(series.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f"{name}{labels(**dict(zip(label_names, key)))} {value}")
+
+        with self.lock:
+            histogram("http_request_duration_seconds", "Request latency by route", self.request_latency)
+            histogram("http_request_db_commands", "MongoDB commands issued per request", self.request_db_commands)
+            counter("http_requests_total", "Requests by route and status", self.requests_total, ("method", "route", "status"))
+            counter("http_request_db_documents_total", "Documents returned by MongoDB per route", self.documents_returned, ("method", "route"))
+            counter("http_response_bytes_total", "Response body bytes serialized per route", self.response_bytes, ("method", "route"))
+            counter("mongodb_commands_total", "MongoDB commands by name", self.db_commands_total, ("command",))
+            counter("mongodb_command_seconds_total", "Time spent in MongoDB commands by name", self.db_command_seconds, ("command",))
+            gauges = dict(self.gauges)
+
+        for name, collect in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in sorted(collect().items()):
+                lines.append(f"{name}{labels(**dict(key))} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+def _query_shape(event: monitoring.CommandStartedEvent) -> str:
+    # Field names only, never values, so shapes are safe to log
+    command = event.command
+    collection = command.get(event.command_name)
+    spec = command.get("filter") or command.get("query") or {}
+    if event.command_name == "aggregate":
+        stages = [next(iter(stage)) for stage in command.get("pipeline", []) if stage]
+        return f"{collection}.aggregate{stages}"
+    if event.command_name in ("update", "delete"):
+        ops = command.get("updates") or command.get("deletes") or []
+        spec = ops[0].get("q", {}) if ops else {}
+    if not isinstance(spec, dict):
+        spec = {}
+    return f"{collection}.{event.command_name}{sorted(spec)}"
+
+def _documents_in_reply(reply) -> int:
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    return 0
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = _request_stats.get()
+        if stats is not None:
+            shape = _query_shape(event)
+            with stats.lock:
+                stats.commands += 1
+                if len(stats.shapes) < MAX_SHAPES_PER_REQUEST:
+                    stats.shapes.append(shape)
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        metrics.record_command(event.command_name, seconds)
+        stats = _request_stats.get()
+        if stats is not None:
+            with stats.lock:
+                stats.db_seconds += seconds
+                stats.documents += _documents_in_reply(event.reply)
+
+    def failed(self, event):
+        metrics.record_command(event.command_name, event.duration_micros / 1e6)
+
+command_listener = CommandMetricsListener()
+
+class PoolStats:
+    __slots__ = ("max_size", "connections", "checked_out", "waiting", "checkout_failures")
+
+    def __init__(self, max_size: int = 0):
+        self.max_size = max_size
+        self.connections = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures: Dict[str, int] = {}
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Tracks open, checked-out and waiting connections per server for the /metrics gauges."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools: Dict[str, PoolStats] = {}
+
+    def _pool(self, address) -> PoolStats:
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = PoolStats()
+        return pool
+
+    def pool_created(self, event):
+        with self.lock:
+            # Only non-default options are reported
+            self._pool(event.address).max_size = event.options.get("maxPoolSize", MAX_POOL_SIZE)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self.lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self.lock:
+            self._pool(event.address).connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            pool = self._pool(event.address)
+            pool.connections = max(pool.connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self.lock:
+            self._pool(event.address).waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(pool.waiting - 1, 0)
+            pool.checkout_failures[event.reason] = pool.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(pool.waiting - 1, 0)
+            pool.checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            pool = self._pool(event.address)
+            pool.checked_out = max(pool.checked_out - 1, 0)
+
+    def gauge(self, field: str):
+        def collect():
+            with self.lock:
+                return {(("address", address),): getattr(pool, field) for address, pool in self.pools.items()}
+        return collect
+
+    def checkout_failures(self):
+        with self.lock:
+            return {
+                (("address", address), ("reason", reason)): count
+                for address, pool in self.pools.items()
+                for reason, count in pool.checkout_failures.items()
+            }
+
+pool_listener = PoolMetricsListener()
+metrics.gauges["mongodb_pool_max_size"] = pool_listener.gauge("max_size")
+metrics.gauges["mongodb_pool_connections"] = pool_listener.gauge("connections")
+metrics.gauges["mongodb_pool_checked_out"] = pool_listener.gauge("checked_out")
+# Requests queued for a connection; a sustained non-zero value means the pool is too small
+metrics.gauges["mongodb_pool_wait_queue"] = pool_listener.gauge("waiting")
+metrics.gauges["mongodb_pool_checkout_failures"] = pool_listener.checkout_failures
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, DB commands, documents and bytes per route."""
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        body_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status, body_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - started
+            _request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            metrics.record_request(method, route, status, seconds, stats, body_bytes)
+            if seconds * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s: %.0fms, status %s, %d db commands (%.0fms), %d documents, %d bytes, query shapes: %s",
+                    method, route, seconds * 1000, status, stats.commands, stats.db_seconds * 1000,
+                    stats.documents, body_bytes, stats.shapes
+                )
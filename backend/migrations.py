@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple
+from indexes import ensure_indexes
+from search import backfill_search_terms
+from transactions import run_in_transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "migrations"
+MIGRATION_JOB = "migrations.run"
+
+class Migration(NamedTuple):
+    name: str
+    apply: Callable[[Any], Awaitable[Dict[str, Any]]]
+
+# One-off data changes, applied once per database in this order. Each must be safe
+# to re-run: a migration job that dies part-way is retried from the start.
+async def merge_duplicate_stock_rows(db) -> Dict[str, Any]:
+    """Fold stock rows duplicated by concurrent GRNs into the oldest row per item and location."""
+    merged = 0
+    async for group in db.stock.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"company_id": "$company_id", "item_id": "$item_id", "location_id": "$location_id"},
+            "ids": {"$push": "$_id"},
+            "quantity": {"$sum": "$quantity"},
+            "reserved_quantity": {"$sum": {"$ifNull": ["$reserved_quantity", 0]}},
+            "last_updated": {"$max": "$last_updated"},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True):
+        keep, duplicates = group["ids"][0], group["ids"][1:]
+
+        # Both writes or neither, so a retried migration never counts a row twice
+        async def fold(session, group=group, keep=keep, duplicates=duplicates):
+            await db.stock.update_one({"_id": keep}, {"$set": {
+                "quantity": group["quantity"],
+                "reserved_quantity": group["reserved_quantity"],
+                "last_updated": group["last_updated"],
+            }}, session=session)
+            await db.stock.delete_many({"_id": {"$in": duplicates}}, session=session)
+
+        await run_in_transaction(db.client, fold)
+        merged += len(duplicates)
+    return {"merged": merged}
+
+MIGRATIONS: List[Migration] = [
+    Migration("search_terms_backfill", backfill_search_terms),
+    Migration("stock_unique_item_location", merge_duplicate_stock_rows),
+]
+
+async def pending_migrations(db) -> List[str]:
+    applied = set(await db[MIGRATIONS_COLLECTION].distinct("_id"))
+    return [migration.name for migration in MIGRATIONS if migration.name not in applied]
+
+async def run_migrations(db) -> Dict[str, Any]:
+    pending = set(await pending_migrations(db))
+    results = {}
+    for migration in MIGRATIONS:
+        if migration.name not in pending:
+            continue
+        result = await migration.apply(db)
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": migration.name},
+            {"$set": {"applied_at": datetime.utcnow(), "result": result}},
+            upsert=True
+        )
+        logger.info("Applied migration %s: %s", migration.name, result)
+        results[migration.name] = result
+    if results:
+        # Indexes blocked at startup by data a migration has now fixed
+        await ensure_indexes(db)
+    return {"applied": results}
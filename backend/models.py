@@ -57,6 +57,13 @@ class UserCreate(BaseModel):
     location_ids: List[str] = []
     password: str
 
+class UserUpdate(BaseModel):
+    name: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[UserRole] = None
+    location_ids: Optional[List[str]] = None
+    is_active: Optional[bool] = None
+
 # Company & Location Management
 class Company(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
@@ -176,6 +183,25 @@ class Stock(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+class ReorderAlert(BaseModel):
+    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
+    company_id: str
+    item_id: str
+    location_id: str
+    item_name: str
+    sku: Optional[str] = None
+    quantity: int
+    min_stock_level: int
+    max_stock_level: Optional[int] = None
+    suggested_quantity: int  # Brings stock back up to max_stock_level (or min_stock_level)
+    below_since: datetime
+    updated_at: datetime
+    
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
 # Customer & Supplier Management
 class Customer(BaseModel):
     id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
@@ -466,3 +492,33 @@ class StockMovement(BaseModel):
         allow_population_by_field_name = True
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
+
+# Background Jobs
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class Job(BaseModel):
+    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
+    job_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str
+    payload: Dict[str, Any] = {}
+    status: JobStatus = JobStatus.QUEUED
+    dedupe_key: Optional[str] = None
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    locked_until: Optional[datetime] = None
+    worker_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
@@ -0,0 +1,113 @@
+from datetime import datetime
+from fastapi import HTTPException, Query, Response
+from pymongo import ASCENDING
+from bson import ObjectId, json_util
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Cursors come back from clients, so their values are checked before they reach a query:
+# a forged {"$ne": null} or $regex would otherwise be an operator, not a position
+SORT_VALUE_TYPES: Dict[str, Tuple[type, ...]] = {
+    "name": (str,),
+    "sku": (str,),
+    "created_at": (datetime,),
+    "expiry_date": (datetime,),
+    "movement_date": (datetime,),
+    "quantity": (int, float),
+}
+SCALAR_TYPES = (str, int, float, datetime, ObjectId)
+
+class PageParams:
+    def __init__(self, limit: int, after: Optional[str]):
+        self.limit = limit
+        self.after = after
+
+def page_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+) -> PageParams:
+    return PageParams(limit, after)
+
+def encode_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    # bson json_util keeps ObjectId and datetime values round-trippable
+    payload = {"id": doc["_id"]}
+    if sort_field != "_id":
+        payload["v"] = doc.get(sort_field)
+    raw = json_util.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _valid_sort_value(value: Any, sort_field: str) -> bool:
+    # Documents missing the sort field sort as null
+    if value is None:
+        return True
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, SORT_VALUE_TYPES.get(sort_field, SCALAR_TYPES))
+
+def decode_cursor(cursor: str, sort_field: str = "_id") -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict) or "id" not in payload:
+            raise ValueError("cursor is missing its position")
+        if set(payload) - {"id", "v"} or not isinstance(payload["id"], ObjectId):
+            raise ValueError("cursor has an unexpected shape")
+        if sort_field != "_id" and not _valid_sort_value(payload.get("v"), sort_field):
+            raise ValueError("cursor value does not match the sort field")
+        return payload
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def cursor_filter(cursor: str, sort_field: str, direction: int) -> Dict[str, Any]:
+    position = decode_cursor(cursor, sort_field)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: position["id"]}}
+    # Ties on the sort field are broken by _id so the order is total
+    value = position.get("v")
+    tie = {sort_field: value, "_id": {op: position["id"]}}
+    # Null (or missing) sorts before every value, and $gt/$lt never match across types
+    if value is None:
+        return {"$or": [{sort_field: {"$ne": None}}, tie]} if direction == ASCENDING else tie
+    after = [{sort_field: {op: value}}, tie]
+    if direction != ASCENDING:
+        after.append({sort_field: None})
+    return {"$or": after}
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    page: PageParams,
+    response: Response,
+    sort_field: str = "_id",
+    direction: int = ASCENDING,
+    projection: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch one keyset page of `collection` and put the next cursor in the response headers."""
+    if page.after:
+        position = cursor_filter(page.after, sort_field, direction)
+        query = {"$and": [query, position]} if query else position
+
+    sort = [(sort_field, direction)]
+    extra_field = None
+    if sort_field != "_id":
+        sort.append(("_id", direction))
+        # The cursor needs the sort value even when the caller did not ask for it
+        if projection and sort_field not in projection:
+            projection = {**projection, sort_field: 1}
+            extra_field = sort_field
+
+    # Read one extra document to learn whether another page exists
+    docs = await collection.find(query, projection).sort(sort).limit(page.limit + 1).to_list(length=page.limit + 1)
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    if extra_field:
+        for doc in docs:
+            doc.pop(extra_field, None)
+    return docs
@@ -0,0 +1,171 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+from requests.adapters import HTTPAdapter
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import uuid
+import razorpay
+import requests
+from razorpay.errors import BadRequestError, GatewayError, ServerError
+
+logger = logging.getLogger(__name__)
+
+class PaymentGatewayError(Exception):
+    pass
+
+class PaymentGateway(ABC):
+    @abstractmethod
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def find_order(self, receipt: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def close(self):
+        pass
+
+class RazorpayGateway(PaymentGateway):
+    """Razorpay client whose blocking `requests` calls run on a bounded thread pool."""
+
+    RETRYABLE = (
+        requests.ConnectionError,
+        requests.Timeout,
+        asyncio.TimeoutError,
+        ServerError,
+        GatewayError,
+    )
+    # Failures where the request provably never reached Razorpay
+    NOT_SENT = (requests.ConnectTimeout,)
+
+    def __init__(self, key_id: str, key_secret: str, max_workers: int = 8, timeout: float = 10.0,
+                 max_retries: int = 2, backoff: float = 0.25):
+        # One pooled HTTP session shared by all worker threads
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+        self._client = razorpay.Client(session=session, auth=(key_id, key_secret))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="razorpay")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        data = {
+            "amount": amount,
+            "currency": currency,
+            "payment_capture": 1,
+            "receipt": receipt,
+            "notes": notes or {}
+        }
+        ambiguous = False
+        for attempt in range(self.max_retries + 1):
+            if ambiguous:
+                # Order creation is not idempotent and Razorpay does not dedupe receipts:
+                # a timed-out or 5xx create may still have made the order
+                existing = await self.find_order(receipt)
+                if existing:
+                    return existing
+            try:
+                return await self._call(self._client.order.create, data)
+            except self.RETRYABLE as e:
+                if attempt == self.max_retries:
+                    raise PaymentGatewayError(f"Razorpay unavailable after {attempt + 1} attempts: {e}") from e
+                ambiguous = ambiguous or not isinstance(e, self.NOT_SENT)
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning("Razorpay order create failed (%s), retrying in %.2fs", e, delay)
+                await asyncio.sleep(delay)
+            except BadRequestError as e:
+                raise PaymentGatewayError(str(e)) from e
+
+    async def find_order(self, receipt: str) -> Optional[Dict[str, Any]]:
+        """The order created with this receipt, if any. Raises PaymentGatewayError when Razorpay cannot say."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self._call(self._client.order.all, {"receipt": receipt})
+                items = result.get("items", [])
+                return items[0] if items else None
+            except self.RETRYABLE as e:
+                if attempt == self.max_retries:
+                    raise PaymentGatewayError(f"Could not look up order {receipt}: {e}") from e
+                await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            except BadRequestError as e:
+                raise PaymentGatewayError(str(e)) from e
+
+    async def _call(self, method: Callable[..., Any], data: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        call = partial(method, data, timeout=self.timeout)
+        return await asyncio.wait_for(loop.run_in_executor(self._executor, call), self.timeout + 1)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+class StubGateway(PaymentGateway):
+    """Offline stand-in for load tests: returns Razorpay-shaped orders after a fixed delay."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.orders: Dict[str, Dict[str, Any]] = {}
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        order = {
+            "id": f"order_stub_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": amount,
+            "amount_paid": 0,
+            "amount_due": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "status": "created",
+            "attempts": 0,
+            "notes": notes or {}
+        }
+        self.orders[receipt] = order
+        return order
+
+    async def find_order(self, receipt: str) -> Optional[Dict[str, Any]]:
+        await asyncio.sleep(self.latency)
+        return self.orders.get(receipt)
+
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+async def single_flight(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    # Concurrent callers with the same key share one gateway call instead of each creating an order
+    if key in _inflight:
+        return await asyncio.shield(_inflight[key])
+    future = asyncio.ensure_future(factory())
+    _inflight[key] = future
+    try:
+        return await asyncio.shield(future)
+    finally:
+        if future.done():
+            _inflight.pop(key, None)
+        else:
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+
+def order_idempotency_key(invoice_id: str, amount: float, currency: str, client_key: str) -> str:
+    # The client's key tells a retry apart from a second instalment of the same amount.
+    # Razorpay receipts are capped at 40 characters.
+    digest = hashlib.sha256(f"{invoice_id}|{amount:.2f}|{currency}|{client_key}".encode("utf-8")).hexdigest()
+    return digest[:40]
+
+def build_gateway() -> Optional[PaymentGateway]:
+    kind = os.environ.get("PAYMENT_GATEWAY", "razorpay").lower()
+    if kind == "stub":
+        return StubGateway(latency=float(os.environ.get("PAYMENT_GATEWAY_STUB_LATENCY_SECONDS", "0.05")))
+    try:
+        return RazorpayGateway(
+            os.environ.get("RAZORPAY_KEY_ID", ""),
+            os.environ.get("RAZORPAY_KEY_SECRET", ""),
+            max_workers=int(os.environ.get("RAZORPAY_MAX_WORKERS", "8")),
+            timeout=float(os.environ.get("RAZORPAY_TIMEOUT_SECONDS", "10")),
+            max_retries=int(os.environ.get("RAZORPAY_MAX_RETRIES", "2")),
+        )
+    except Exception:
+        logger.exception("Could not initialise the Razorpay client")
+        return None
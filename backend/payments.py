@@ -0,0 +1,96 @@
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from typing import Awaitable, Callable, Dict, List, Sequence
+from models import Payment
+from transactions import run_in_transaction
+import orjson
+import os
+
+# A batch is posted in a single transaction; a bank statement of a few thousand
+# payments fits comfortably, the cap only keeps one call from pinning the primary
+MAX_PAYMENT_BATCH = int(os.environ.get("MAX_PAYMENT_BATCH", "10000"))
+# A payment is well under 1 KiB of JSON; larger bodies are refused before they are parsed
+MAX_PAYMENT_BATCH_BYTES = int(os.environ.get("MAX_PAYMENT_BATCH_BYTES", str(MAX_PAYMENT_BATCH * 2048)))
+
+_payment_list = TypeAdapter(List[Payment])
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"At most {MAX_PAYMENT_BATCH} payments can be posted at once; split the batch"
+    )
+
+async def payment_batch_body(request: Request) -> List[Payment]:
+    """Request body of a payment batch, size-checked before any Payment model is built."""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_PAYMENT_BATCH_BYTES:
+        raise _too_large()
+    body = await request.body()
+    if len(body) > MAX_PAYMENT_BATCH_BYTES:
+        raise _too_large()
+    try:
+        raw = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array of payments")
+    if not isinstance(raw, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array of payments")
+    if len(raw) > MAX_PAYMENT_BATCH:
+        raise _too_large()
+    try:
+        return _payment_list.validate_python(raw)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+# Called as hook(db, payments, session=...) inside the posting transaction
+PaymentHook = Callable[..., Awaitable[None]]
+
+def invoice_payment_update(amount: float) -> List[dict]:
+    # Pipeline update: the new totals are derived server-side from the stored values,
+    # so concurrent payments on one invoice cannot overwrite each other
+    return [
+        {"$set": {"paid_amount": {"$add": [{"$ifNull": ["$paid_amount", 0]}, amount]}}},
+        {"$set": {"balance_amount": {"$subtract": ["$total_amount", "$paid_amount"]}}},
+        {"$set": {"status": {"$cond": [{"$lte": ["$balance_amount", 0]}, "paid", "partially_paid"]}}},
+    ]
+
+async def apply_payments(db, payments: List[Payment], session=None, hooks: Sequence[PaymentHook] = ()) -> int:
+    """Apply payments to their invoices and store them. Returns the number of invoices updated."""
+    totals: Dict[str, float] = {}
+    for payment in payments:
+        totals[payment.invoice_id] = totals.get(payment.invoice_id, 0.0) + payment.amount
+
+    if len(totals) == 1:
+        invoice_id, amount = next(iter(totals.items()))
+        result = await db.invoices.update_one({"invoice_id": invoice_id}, invoice_payment_update(amount), session=session)
+        updated = result.modified_count
+    else:
+        result = await db.invoices.bulk_write(
+            [UpdateOne({"invoice_id": invoice_id}, invoice_payment_update(amount)) for invoice_id, amount in totals.items()],
+            ordered=False,
+            session=session
+        )
+        updated = result.modified_count
+
+    docs = [payment.dict(by_alias=True) for payment in payments]
+    if len(docs) == 1:
+        await db.payments.insert_one(docs[0], session=session)
+    else:
+        await db.payments.insert_many(docs, ordered=True, session=session)
+    for hook in hooks:
+        await hook(db, payments, session=session)
+    return updated
+
+async def post_payments(client, db, payments: List[Payment], hooks: Sequence[PaymentHook] = ()) -> Dict[str, int]:
+    """Post payments, e.g. a whole bank statement, all-or-nothing in one transaction."""
+    if not payments:
+        return {"posted": 0, "invoices_updated": 0}
+    if len(payments) > MAX_PAYMENT_BATCH:
+        raise _too_large()
+
+    async def post(session):
+        return await apply_payments(db, payments, session=session, hooks=hooks)
+
+    invoices_updated = await run_in_transaction(client, post)
+    return {"posted": len(payments), "invoices_updated": invoices_updated}
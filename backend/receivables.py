@@ -0,0 +1,181 @@
+from datetime import datetime
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from typing import Any, Dict, List, Optional, Tuple
+from models import Invoice, Payment
+
+BALANCES_COLLECTION = "customer_balances"
+# Invoices that may still carry a balance; the (company_id, status, due_date) index serves the filter
+OPEN_INVOICE_STATUSES = ("draft", "pending", "partially_paid", "overdue")
+DAY_MS = 24 * 3600 * 1000
+
+# Days past due -> bucket. Not-yet-due invoices are "current".
+AGEING_BOUNDARIES = [-10 ** 6, 0, 31, 61, 91, 10 ** 6]
+AGEING_LABELS = {-10 ** 6: "current", 0: "0-30", 31: "31-60", 61: "61-90", 91: "90+"}
+
+async def record_invoice_balance(db, invoice: Invoice, session=None, **_):
+    """Invoice posting hook: add the new invoice's balance to its customer's outstanding."""
+    await db[BALANCES_COLLECTION].update_one(
+        {"company_id": invoice.company_id, "customer_id": invoice.customer_id},
+        {"$inc": {"outstanding": invoice.balance_amount, "invoices": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        session=session
+    )
+
+async def record_payment_balances(db, payments: List[Payment], session=None, **_):
+    """Payment posting hook: payments reduce outstanding exactly as they reduce invoice balances."""
+    totals: Dict[Tuple[str, str], float] = {}
+    for payment in payments:
+        key = (payment.company_id, payment.customer_id)
+        totals[key] = totals.get(key, 0.0) + payment.amount
+    now = datetime.utcnow()
+    await db[BALANCES_COLLECTION].bulk_write([
+        UpdateOne(
+            {"company_id": company_id, "customer_id": customer_id},
+            {"$inc": {"outstanding": -amount}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for (company_id, customer_id), amount in totals.items()
+    ], ordered=False, session=session)
+
+async def rebuild_customer_balances(db, company_id: str) -> Dict[str, Any]:
+    """Recompute every customer's outstanding from the invoices (backfill / repair)."""
+    started = datetime.utcnow()
+    pipeline = [
+        {"$match": {"company_id": company_id, "status": {"$ne": "cancelled"}}},
+        {"$group": {"_id": "$customer_id", "outstanding": {"$sum": "$balance_amount"}, "invoices": {"$sum": 1}}},
+        {"$project": {
+            "_id": 0,
+            "company_id": {"$literal": company_id},
+            "customer_id": "$_id",
+            "outstanding": 1,
+            "invoices": 1,
+            "updated_at": {"$literal": started},
+        }},
+        {"$merge": {
+            "into": BALANCES_COLLECTION,
+            "on": ["company_id", "customer_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }},
+    ]
+    await db.invoices.aggregate(pipeline).to_list(length=None)
+    stale = await db[BALANCES_COLLECTION].delete_many({"company_id": company_id, "updated_at": {"$lt": started}})
+    return {"company_id": company_id, "removed": stale.deleted_count}
+
+async def credit_check(db, customer_id: str, amount: float = 0.0) -> Dict[str, Any]:
+    """Would `amount` more keep the customer within their credit limit? A limit of 0 means no limit."""
+    customer = await db.customers.find_one(
+        {"customer_id": customer_id}, {"company_id": 1, "name": 1, "credit_limit": 1, "credit_days": 1}
+    )
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    balance = await db[BALANCES_COLLECTION].find_one(
+        {"company_id": customer["company_id"], "customer_id": customer_id}, {"outstanding": 1}
+    )
+    outstanding = round(balance["outstanding"], 2) if balance else 0.0
+    credit_limit = customer.get("credit_limit") or 0.0
+    return {
+        "customer_id": customer_id,
+        "name": customer.get("name"),
+        "credit_limit": credit_limit,
+        "credit_days": customer.get("credit_days", 0),
+        "outstanding": outstanding,
+        "available": round(credit_limit - outstanding, 2) if credit_limit else None,
+        "amount": amount,
+        "approved": not credit_limit or outstanding + amount <= credit_limit,
+    }
+
+def _bucket_label_expression() -> Dict[str, Any]:
+    bounds = AGEING_BOUNDARIES[1:-1]
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$days_overdue", upper]}, "then": AGEING_LABELS[lower]}
+            for lower, upper in zip(AGEING_BOUNDARIES, bounds)
+        ],
+        "default": AGEING_LABELS[bounds[-1]]
+    }}
+
+async def ageing_report(db, company_id: str, as_of: Optional[datetime] = None, customer_id: Optional[str] = None,
+                        limit: int = 100) -> Dict[str, Any]:
+    """Receivables by days past due, company-wide and for the `limit` customers owing the most."""
+    as_of = as_of or datetime.utcnow()
+    match: Dict[str, Any] = {
+        "company_id": company_id,
+        "status": {"$in": list(OPEN_INVOICE_STATUSES)},
+        "balance_amount": {"$gt": 0},
+    }
+    if customer_id:
+        match["customer_id"] = customer_id
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "customer_id": 1,
+            "balance_amount": 1,
+            # Invoices without a due date age from their invoice date
+            "days_overdue": {"$floor": {"$divide": [
+                {"$subtract": [as_of, {"$ifNull": ["$due_date", "$invoice_date"]}]}, DAY_MS
+            ]}},
+        }},
+        {"$facet": {
+            "buckets": [
+                {"$bucket": {
+                    "groupBy": "$days_overdue",
+                    "boundaries": AGEING_BOUNDARIES,
+                    "output": {"amount": {"$sum": "$balance_amount"}, "invoices": {"$sum": 1}}
+                }},
+            ],
+            "customers": [
+                {"$group": {
+                    "_id": {"customer_id": "$customer_id", "bucket": _bucket_label_expression()},
+                    "amount": {"$sum": "$balance_amount"},
+                    "invoices": {"$sum": 1},
+                }},
+                {"$group": {
+                    "_id": "$_id.customer_id",
+                    "total": {"$sum": "$amount"},
+                    "invoices": {"$sum": "$invoices"},
+                    "buckets": {"$push": {"k": "$_id.bucket", "v": "$amount"}},
+                }},
+                {"$sort": {"total": -1, "_id": 1}},
+                {"$limit": limit},
+                {"$lookup": {
+                    "from": "customers",
+                    "localField": "_id",
+                    "foreignField": "customer_id",
+                    "as": "customer"
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "customer_id": "$_id",
+                    "name": {"$first": "$customer.name"},
+                    "credit_limit": {"$ifNull": [{"$first": "$customer.credit_limit"}, 0]},
+                    "credit_days": {"$ifNull": [{"$first": "$customer.credit_days"}, 0]},
+                    "total": 1,
+                    "invoices": 1,
+                    "buckets": {"$arrayToObject": "$buckets"},
+                }},
+            ],
+        }},
+    ]
+    result = (await db.invoices.aggregate(pipeline).to_list(length=1))[0]
+
+    labels = list(AGEING_LABELS.values())
+    totals = {label: {"amount": 0.0, "invoices": 0} for label in labels}
+    for bucket in result["buckets"]:
+        totals[AGEING_LABELS[bucket["_id"]]] = {"amount": round(bucket["amount"], 2), "invoices": bucket["invoices"]}
+
+    customers = []
+    for row in result["customers"]:
+        row["total"] = round(row["total"], 2)
+        row["buckets"] = {label: round(row["buckets"].get(label, 0.0), 2) for label in labels}
+        row["over_limit"] = bool(row["credit_limit"]) and row["total"] > row["credit_limit"]
+        customers.append(row)
+
+    return {
+        "company_id": company_id,
+        "as_of": as_of,
+        "total_outstanding": round(sum(bucket["amount"] for bucket in totals.values()), 2),
+        "buckets": totals,
+        "customers": customers,
+    }
@@ -0,0 +1,130 @@
+from datetime import datetime
+from pymongo import DeleteOne, UpdateOne
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from models import GRN, Invoice
+
+REORDER_COLLECTION = "reorder_alerts"
+
+Key = Tuple[str, str]  # (item_id, location_id)
+
+def suggested_quantity(quantity: int, min_level: int, max_level: Optional[int]) -> int:
+    target = max_level if max_level is not None and max_level > min_level else min_level
+    return max(target - quantity, 0)
+
+async def refresh_reorder_alerts(db, company_id: str, keys: Iterable[Key], session=None) -> None:
+    """Re-evaluate the reorder flag of the given item/locations from their current stock.
+
+    An alert document exists exactly while stock is at or below the item's
+    min_stock_level, so reads never scan the catalogue.
+    """
+    keys: Set[Key] = set(keys)
+    if not keys:
+        return
+    item_ids = list({item_id for item_id, _ in keys})
+    location_ids = list({location_id for _, location_id in keys})
+
+    item_docs = await db.items.find(
+        {"item_id": {"$in": item_ids}},
+        {"item_id": 1, "name": 1, "sku": 1, "min_stock_level": 1, "max_stock_level": 1},
+        session=session,
+    ).to_list(length=None)
+    items = {doc["item_id"]: doc for doc in item_docs}
+
+    quantities: Dict[Key, int] = {}
+    async for row in db.stock.find(
+        {"company_id": company_id, "item_id": {"$in": item_ids}, "location_id": {"$in": location_ids}},
+        {"item_id": 1, "location_id": 1, "quantity": 1},
+        session=session,
+    ):
+        key = (row["item_id"], row["location_id"])
+        quantities[key] = quantities.get(key, 0) + row["quantity"]
+
+    now = datetime.utcnow()
+    ops = []
+    for item_id, location_id in keys:
+        item = items.get(item_id)
+        selector = {"company_id": company_id, "item_id": item_id, "location_id": location_id}
+        quantity = quantities.get((item_id, location_id), 0)
+        min_level = (item or {}).get("min_stock_level") or 0
+        if item is None or quantity > min_level:
+            ops.append(DeleteOne(selector))
+            continue
+        max_level = item.get("max_stock_level")
+        ops.append(UpdateOne(selector, {
+            "$set": {
+                "item_name": item["name"],
+                "sku": item.get("sku"),
+                "quantity": quantity,
+                "min_stock_level": min_level,
+                "max_stock_level": max_level,
+                "suggested_quantity": suggested_quantity(quantity, min_level, max_level),
+                "updated_at": now,
+            },
+            "$setOnInsert": {"below_since": now},
+        }, upsert=True))
+    await db[REORDER_COLLECTION].bulk_write(ops, ordered=False, session=session)
+
+async def record_invoice_reorder(db, invoice: Invoice, deductions=(), session=None, **_):
+    """Invoice posting hook: stock only went down where it was deducted."""
+    await refresh_reorder_alerts(db, invoice.company_id, ((d.item_id, d.location_id) for d in deductions), session)
+
+async def record_grn_reorder(db, grn: GRN, session=None, **_):
+    """GRN posting hook: received items may have climbed back above their minimum."""
+    await refresh_reorder_alerts(db, grn.company_id, ((line.item_id, grn.location_id) for line in grn.items), session)
+
+async def rebuild_reorder_alerts(db, company_id: str) -> Dict[str, Any]:
+    """Recompute a company's alerts from stock and items (backfill / repair)."""
+    started = datetime.utcnow()
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": {"company_id": company_id}},
+        {"$group": {"_id": {"item_id": "$item_id", "location_id": "$location_id"}, "quantity": {"$sum": "$quantity"}}},
+        {"$lookup": {
+            "from": "items",
+            "localField": "_id.item_id",
+            "foreignField": "item_id",
+            "as": "item"
+        }},
+        {"$unwind": "$item"},
+        {"$set": {
+            "min_level": {"$ifNull": ["$item.min_stock_level", 0]},
+            "max_level": {"$ifNull": ["$item.max_stock_level", None]},
+        }},
+        {"$match": {"$expr": {"$lte": ["$quantity", "$min_level"]}}},
+        {"$project": {
+            "_id": 0,
+            "company_id": {"$literal": company_id},
+            "item_id": "$_id.item_id",
+            "location_id": "$_id.location_id",
+            "item_name": "$item.name",
+            "sku": "$item.sku",
+            "quantity": 1,
+            "min_stock_level": "$min_level",
+            "max_stock_level": "$max_level",
+            "suggested_quantity": {"$max": [0, {"$subtract": [
+                {"$cond": [{"$gt": [{"$ifNull": ["$max_level", 0]}, "$min_level"]}, "$max_level", "$min_level"]},
+                "$quantity"
+            ]}]},
+            "below_since": {"$literal": started},
+            "updated_at": {"$literal": started},
+        }},
+        {"$merge": {
+            "into": REORDER_COLLECTION,
+            "on": ["company_id", "item_id", "location_id"],
+            # Keep below_since of alerts that were already open
+            "whenMatched": [{"$set": {
+                "quantity": "$$new.quantity",
+                "item_name": "$$new.item_name",
+                "sku": "$$new.sku",
+                "min_stock_level": "$$new.min_stock_level",
+                "max_stock_level": "$$new.max_stock_level",
+                "suggested_quantity": "$$new.suggested_quantity",
+                "updated_at": "$$new.updated_at",
+            }}],
+            "whenNotMatched": "insert"
+        }},
+    ]
+    await db.stock.aggregate(pipeline).to_list(length=None)
+    # Anything not touched by this run (nor by a posting since) is no longer below its minimum
+    stale = await db[REORDER_COLLECTION].delete_many({"company_id": company_id, "updated_at": {"$lt": started}})
+    open_alerts = await db[REORDER_COLLECTION].count_documents({"company_id": company_id})
+    return {"company_id": company_id, "open_alerts": open_alerts, "closed_alerts": stale.deleted_count}
@@ -0,0 +1,100 @@
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+from typing import Any, Dict, List, Optional, Tuple, Type
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELD = "search_terms"
+MAX_QUERY_TERMS = 4
+
+# Fields folded into the search terms of each collection. The name is also split
+# into words so "500" finds "Paracetamol 500mg".
+SEARCHABLE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "items": ("name", "sku", "hsn_code"),
+    "customers": ("name", "phone", "gstin"),
+    "suppliers": ("name", "phone", "gstin"),
+}
+
+# Public sort names -> document field
+SORTABLE_FIELDS: Dict[str, Dict[str, str]] = {
+    "items": {"name": "name", "sku": "sku", "created_at": "created_at"},
+    "customers": {"name": "name", "created_at": "created_at"},
+    "suppliers": {"name": "name", "created_at": "created_at"},
+}
+
+def search_terms(doc: Dict[str, Any], fields: Tuple[str, ...]) -> List[str]:
+    terms = set()
+    for field in fields:
+        value = doc.get(field)
+        if not value:
+            continue
+        value = str(value).lower()
+        terms.add(value)
+        if field == "name":
+            terms.update(value.split())
+    return sorted(terms)
+
+def with_search_terms(collection: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the lower-cased prefix-search terms to a document before it is written."""
+    doc[SEARCH_FIELD] = search_terms(doc, SEARCHABLE_FIELDS[collection])
+    return doc
+
+def _terms_expression(fields: Tuple[str, ...]) -> Dict[str, Any]:
+    # Server-side twin of search_terms() for backfilling documents in place
+    values = [{"$toLower": {"$ifNull": [f"${field}", ""]}} for field in fields]
+    words = {"$split": [{"$toLower": {"$ifNull": ["$name", ""]}}, " "]} if "name" in fields else []
+    return {"$filter": {
+        "input": {"$setUnion": [values, words]},
+        "cond": {"$ne": ["$$this", ""]}
+    }}
+
+async def backfill_search_terms(db) -> Dict[str, int]:
+    """Add search terms to documents written before search existed (a one-off migration; scans each collection)."""
+    updated = {}
+    for collection, fields in SEARCHABLE_FIELDS.items():
+        result = await db[collection].update_many(
+            {SEARCH_FIELD: {"$exists": False}},
+            [{"$set": {SEARCH_FIELD: _terms_expression(fields)}}]
+        )
+        updated[collection] = result.modified_count
+        if result.modified_count:
+            logger.info("Backfilled search terms on %d %s", result.modified_count, collection)
+    return updated
+
+def search_filter(q: Optional[str]) -> Dict[str, Any]:
+    """Anchored prefix match per query word, so the (company_id, search_terms) index bounds the scan."""
+    words = (q or "").lower().split()[:MAX_QUERY_TERMS]
+    if not words:
+        return {}
+    patterns = [re.compile("^" + re.escape(word)) for word in words]
+    if len(patterns) == 1:
+        return {SEARCH_FIELD: patterns[0]}
+    return {SEARCH_FIELD: {"$all": patterns}}
+
+def parse_sort(collection: str, sort: Optional[str]) -> Tuple[str, int]:
+    if not sort:
+        return "_id", ASCENDING
+    direction = DESCENDING if sort.startswith("-") else ASCENDING
+    name = sort.lstrip("-+")
+    field = SORTABLE_FIELDS[collection].get(name)
+    if field is None:
+        allowed = ", ".join(SORTABLE_FIELDS[collection])
+        raise HTTPException(status_code=400, detail=f"Unsupported sort '{name}', use one of: {allowed}")
+    return field, direction
+
+def field_projection(model: Type[BaseModel], id_field: str, fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Projection for a comma-separated `fields` parameter; None means every model field."""
+    if not fields:
+        return None
+    allowed = {field.alias or name for name, field in model.model_fields.items()}
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {f: 1 for f in requested}
+    projection["_id"] = 1
+    projection[id_field] = 1
+    return projection
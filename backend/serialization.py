@@ -0,0 +1,38 @@
+from fastapi import Response
+from bson import ObjectId
+from pydantic import BaseModel
+from typing import Any, Dict, Type
+import orjson
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    # orjson handles datetime, enums and dataclasses natively
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+_projections: Dict[type, Dict[str, int]] = {}
+
+def model_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    # Only fetch the fields the response model exposes
+    if model not in _projections:
+        _projections[model] = {field.alias or name: 1 for name, field in model.model_fields.items()}
+    return _projections[model]
+
+def raw_response(content: Any, response: Response = None) -> FastJSONResponse:
+    """Serialize documents read from Mongo without re-validating them through Pydantic.
+
+    Headers already set on the injected `response` (e.g. the next-page cursor) are carried over.
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return FastJSONResponse(content, headers=headers)
@@ -1,37 +1,75 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.responses import PlainTextResponse
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
+from functools import partial
 from typing import List, Optional
+import asyncio
 import os
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-import razorpay
 
 # Import models
 from models import *
 from auth import *
+from allocation import post_invoice
+from analytics import (
+    analytics_summary, analytics_window, record_grn_analytics, record_invoice_analytics,
+    record_payment_analytics, sales_series, top_entities
+)
+from bulk_import import detect_format, import_rows
+from cache import build_cache
+from database import build_client, read_database
+from dashboard import DASHBOARD_CACHE_TTL_SECONDS, get_dashboard_summary_cached, invalidate_dashboard
+from exports import EXPORT_FORMATS, date_range, stream_export
+from gst import record_invoice_gst
+from idempotency import IDEMPOTENCY_COLLECTION, IdempotencyStore, IdempotentRequest, idempotency_params
+from indexes import ensure_indexes
+from inventory import post_grn
+from ledger import stock_at
+from metrics import MetricsMiddleware, metrics
+from migrations import MIGRATION_JOB, pending_migrations
+from pagination import PageParams, page_params, paginate, NEXT_CURSOR_HEADER
+from payment_gateway import PaymentGatewayError, build_gateway, order_idempotency_key, single_flight
+from payments import payment_batch_body, post_payments
+from receivables import ageing_report, credit_check, record_invoice_balance, record_payment_balances
+from reorder import REORDER_COLLECTION, record_grn_reorder, record_invoice_reorder
+from search import field_projection, parse_sort, search_filter, with_search_terms
+from serialization import model_projection, raw_response
+from sessions import ACCESS_TOKEN_EXPIRE_MINUTES, create_session, revoke_refresh_token, revoke_session, rotate_session
+from tasks import SCHEDULES, build_job_queue
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = build_client(mongo_url)
 db = client[os.environ['DB_NAME']]
+# Lists, exports and reports; may be routed to secondaries via MONGO_READ_PREFERENCE
+read_db = read_database(db)
+
+# Dashboard cache: in-process, or CACHE_BACKEND=mongo to share it between workers
+dashboard_cache = build_cache(db, "dashboard", ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+# Report generation and stock recomputation run as background jobs
+job_queue = build_job_queue(db)
+
+# Responses of invoice, GRN and payment POSTs, replayed when a client retries with the same Idempotency-Key
+idempotency = IdempotencyStore(db[IDEMPOTENCY_COLLECTION])
+# Reject sales orders that would take a customer over their credit limit
+ENFORCE_CREDIT_LIMIT = os.environ.get("ENFORCE_CREDIT_LIMIT", "true").lower() in ("1", "true", "yes")
+RUN_JOBS_IN_PROCESS = os.environ.get("RUN_JOBS_IN_PROCESS", "true").lower() in ("1", "true", "yes")
+JOB_RUNNER_CONCURRENCY = int(os.environ.get("JOB_RUNNER_CONCURRENCY", "2"))
 
-# Razorpay client (we'll need the keys from user)
-try:
-    razorpay_client = razorpay.Client(auth=(
-        os.environ.get('RAZORPAY_KEY_ID', ''), 
-        os.environ.get('RAZORPAY_KEY_SECRET', '')
-    ))
-except:
-    razorpay_client = None
+# Payment gateway (Razorpay, or PAYMENT_GATEWAY=stub for offline load tests)
+payment_gateway = build_gateway()
 
 # Create the main app
 app = FastAPI(title="Right Choice Medicare System", version="1.0.0")
@@ -57,31 +95,66 @@ class LoginResponse(BaseModel):
     access_token: str
     token_type: str
     user: User
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+def session_tokens(user: User, session_id: str, refresh_token: str) -> LoginResponse:
+    access_token = create_access_token(
+        data=user_token_claims(user, session_id), expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return LoginResponse(
+        access_token=access_token,
+        token_type="bearer",
+        user=user,
+        refresh_token=refresh_token,
+        expires_in=int(ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    )
 
 @api_router.post("/auth/login", response_model=LoginResponse)
-async def login(login_data: LoginRequest):
+async def login(login_data: LoginRequest, request: Request):
+    check_login_rate(login_data.email, request.client.host if request.client else None)
+    
     # Find user by email
     user_data = await db.users.find_one({"email": login_data.email})
-    if not user_data or not verify_password(login_data.password, user_data.get("password_hash", "")):
+    valid, new_hash = await verify_and_update_password(login_data.password, (user_data or {}).get("password_hash", ""))
+    if not user_data or not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
+    if new_hash:
+        # Stored with an older PASSWORD_HASH_ROUNDS; upgrade while the plain password is at hand
+        await db.users.update_one({"user_id": user_data["user_id"]}, {"$set": {"password_hash": new_hash}})
     
     user = User(**user_data)
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.user_id}, expires_delta=access_token_expires
-    )
-    
-    return LoginResponse(
-        access_token=access_token,
-        token_type="bearer",
-        user=user
-    )
+    session_id, refresh_token = await create_session(db, user.user_id)
+    return session_tokens(user, session_id, refresh_token)
+
+@api_router.post("/auth/refresh", response_model=LoginResponse)
+async def refresh_session(refresh_data: RefreshRequest):
+    # Renewal rotates the refresh token; no password check and no hashing
+    session, refresh_token = await rotate_session(db, refresh_data.refresh_token)
+    # Always read the user from the database so a deactivation stops renewal at once
+    user_data = await db.users.find_one({"user_id": session["user_id"]})
+    if user_data is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
+    user = User(**user_data)
+    if not user.is_active:
+        await revoke_session(db, session["_id"], reason="inactive_user")
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return session_tokens(user, session["_id"], refresh_token)
+
+@api_router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(refresh_data: RefreshRequest):
+    # Access tokens of the session are rejected from now on, not just at expiry
+    await revoke_refresh_token(db, refresh_data.refresh_token)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @api_router.post("/auth/register", response_model=User)
 async def register(user_data: UserCreate):
@@ -91,7 +164,7 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user_dict = user_data.dict()
     del user_dict["password"]
     user_dict["password_hash"] = hashed_password
@@ -100,6 +173,31 @@ async def register(user_data: UserCreate):
     await db.users.insert_one(user.dict(by_alias=True))
     return user
 
+USER_ADMIN_ROLES = (UserRole.SUPER_ADMIN, UserRole.ADMIN)
+
+async def apply_user_update(user_id: str, changes: dict, current_user: User) -> User:
+    if current_user.role not in USER_ADMIN_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+    query = {"user_id": user_id}
+    if current_user.role != UserRole.SUPER_ADMIN:
+        query["company_id"] = current_user.company_id
+    changes["updated_at"] = datetime.utcnow()
+    user_data = await db.users.find_one_and_update(query, {"$set": changes}, return_document=ReturnDocument.AFTER)
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user = User(**user_data)
+    # Every worker drops its cached copy; a deactivated user's sessions end now
+    await user_changed(db, user)
+    return user
+
+@api_router.put("/users/{user_id}", response_model=User)
+async def update_user(user_id: str, update: UserUpdate, current_user: User = Depends(get_current_user_dep)):
+    return await apply_user_update(user_id, update.dict(exclude_unset=True), current_user)
+
+@api_router.post("/users/{user_id}/deactivate", response_model=User)
+async def deactivate_user(user_id: str, current_user: User = Depends(get_current_user_dep)):
+    return await apply_user_update(user_id, {"is_active": False}, current_user)
+
 # ============ COMPANY & LOCATION ENDPOINTS ============
 
 @api_router.post("/companies", response_model=Company)
@@ -108,9 +206,9 @@ async def create_company(company_data: Company, current_user: User = Depends(get
     return company_data
 
 @api_router.get("/companies", response_model=List[Company])
-async def get_companies(current_user: User = Depends(get_current_user_dep)):
-    companies = await db.companies.find({}).to_list(length=None)
-    return [Company(**company) for company in companies]
+async def get_companies(response: Response, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    companies = await paginate(read_db.companies, {}, page, response, projection=model_projection(Company))
+    return raw_response(companies, response)
 
 @api_router.post("/locations", response_model=Location)
 async def create_location(location_data: Location, current_user: User = Depends(get_current_user_dep)):
@@ -118,12 +216,12 @@ async def create_location(location_data: Location, current_user: User = Depends(
     return location_data
 
 @api_router.get("/locations", response_model=List[Location])
-async def get_locations(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_locations(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    locations = await db.locations.find(query).to_list(length=None)
-    return [Location(**location) for location in locations]
+    locations = await paginate(read_db.locations, query, page, response, projection=model_projection(Location))
+    return raw_response(locations, response)
 
 # ============ ITEM MANAGEMENT ENDPOINTS ============
 
@@ -133,62 +231,75 @@ async def create_category(category_data: ItemCategory, current_user: User = Depe
     return category_data
 
 @api_router.get("/categories", response_model=List[ItemCategory])
-async def get_categories(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_categories(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    categories = await db.categories.find(query).to_list(length=None)
-    return [ItemCategory(**category) for category in categories]
+    categories = await paginate(read_db.categories, query, page, response, projection=model_projection(ItemCategory))
+    return raw_response(categories, response)
 
 @api_router.post("/items", response_model=Item)
 async def create_item(item_data: Item, current_user: User = Depends(get_current_user_dep)):
-    await db.items.insert_one(item_data.dict(by_alias=True))
+    await db.items.insert_one(with_search_terms("items", item_data.dict(by_alias=True)))
+    await invalidate_dashboard(dashboard_cache, item_data.company_id)
     return item_data
 
 @api_router.get("/items", response_model=List[Item])
-async def get_items(company_id: Optional[str] = None, category_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
-    query = {}
+async def get_items(response: Response, company_id: Optional[str] = None, category_id: Optional[str] = None, q: Optional[str] = None, fields: Optional[str] = None, sort: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    query = search_filter(q)
     if company_id:
         query["company_id"] = company_id
     if category_id:
         query["category_id"] = category_id
-    items = await db.items.find(query).to_list(length=None)
-    return [Item(**item) for item in items]
+    sort_field, direction = parse_sort("items", sort)
+    projection = field_projection(Item, "item_id", fields) or model_projection(Item)
+    items = await paginate(read_db.items, query, page, response, sort_field, direction, projection)
+    return raw_response(items, response)
 
 @api_router.get("/items/{item_id}", response_model=Item)
 async def get_item(item_id: str, current_user: User = Depends(get_current_user_dep)):
-    item = await db.items.find_one({"item_id": item_id})
+    item = await db.items.find_one({"item_id": item_id}, model_projection(Item))
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return Item(**item)
+    return raw_response(item)
 
 # ============ CUSTOMER & SUPPLIER ENDPOINTS ============
 
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer_data: Customer, current_user: User = Depends(get_current_user_dep)):
-    await db.customers.insert_one(customer_data.dict(by_alias=True))
+    await db.customers.insert_one(with_search_terms("customers", customer_data.dict(by_alias=True)))
+    await invalidate_dashboard(dashboard_cache, customer_data.company_id)
     return customer_data
 
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
-    query = {}
+async def get_customers(response: Response, company_id: Optional[str] = None, q: Optional[str] = None, fields: Optional[str] = None, sort: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    query = search_filter(q)
     if company_id:
         query["company_id"] = company_id
-    customers = await db.customers.find(query).to_list(length=None)
-    return [Customer(**customer) for customer in customers]
+    sort_field, direction = parse_sort("customers", sort)
+    projection = field_projection(Customer, "customer_id", fields) or model_projection(Customer)
+    customers = await paginate(read_db.customers, query, page, response, sort_field, direction, projection)
+    return raw_response(customers, response)
+
+@api_router.get("/customers/{customer_id}/credit-check")
+async def get_customer_credit_check(customer_id: str, amount: float = Query(0.0, ge=0), current_user: User = Depends(get_current_user_dep)):
+    return await credit_check(db, customer_id, amount)
 
 @api_router.post("/suppliers", response_model=Supplier)
 async def create_supplier(supplier_data: Supplier, current_user: User = Depends(get_current_user_dep)):
-    await db.suppliers.insert_one(supplier_data.dict(by_alias=True))
+    await db.suppliers.insert_one(with_search_terms("suppliers", supplier_data.dict(by_alias=True)))
+    await invalidate_dashboard(dashboard_cache, supplier_data.company_id)
     return supplier_data
 
 @api_router.get("/suppliers", response_model=List[Supplier])
-async def get_suppliers(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
-    query = {}
+async def get_suppliers(response: Response, company_id: Optional[str] = None, q: Optional[str] = None, fields: Optional[str] = None, sort: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    query = search_filter(q)
     if company_id:
         query["company_id"] = company_id
-    suppliers = await db.suppliers.find(query).to_list(length=None)
-    return [Supplier(**supplier) for supplier in suppliers]
+    sort_field, direction = parse_sort("suppliers", sort)
+    projection = field_projection(Supplier, "supplier_id", fields) or model_projection(Supplier)
+    suppliers = await paginate(read_db.suppliers, query, page, response, sort_field, direction, projection)
+    return raw_response(suppliers, response)
 
 # ============ PURCHASE MANAGEMENT ENDPOINTS ============
 
@@ -196,176 +307,114 @@ async def get_suppliers(company_id: Optional[str] = None, current_user: User = D
 async def create_purchase_order(po_data: PurchaseOrder, current_user: User = Depends(get_current_user_dep)):
     po_data.created_by = current_user.user_id
     await db.purchase_orders.insert_one(po_data.dict(by_alias=True))
+    await invalidate_dashboard(dashboard_cache, po_data.company_id)
     return po_data
 
 @api_router.get("/purchase-orders", response_model=List[PurchaseOrder])
-async def get_purchase_orders(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_purchase_orders(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    pos = await db.purchase_orders.find(query).to_list(length=None)
-    return [PurchaseOrder(**po) for po in pos]
+    pos = await paginate(read_db.purchase_orders, query, page, response, projection=model_projection(PurchaseOrder))
+    return raw_response(pos, response)
 
 @api_router.get("/purchase-orders/{po_id}", response_model=PurchaseOrder)
 async def get_purchase_order(po_id: str, current_user: User = Depends(get_current_user_dep)):
-    po = await db.purchase_orders.find_one({"po_id": po_id})
+    po = await db.purchase_orders.find_one({"po_id": po_id}, model_projection(PurchaseOrder))
     if not po:
         raise HTTPException(status_code=404, detail="Purchase Order not found")
-    return PurchaseOrder(**po)
+    return raw_response(po)
+
+# Extra writes made in the same transaction as every new GRN
+GRN_POSTING_HOOKS = [record_grn_reorder, record_grn_analytics]
 
 @api_router.post("/grn", response_model=GRN)
-async def create_grn(grn_data: GRN, current_user: User = Depends(get_current_user_dep)):
+async def create_grn(grn_data: GRN, idempotency_key: Optional[IdempotentRequest] = Depends(idempotency_params), current_user: User = Depends(get_current_user_dep)):
     grn_data.created_by = current_user.user_id
     
-    # Update stock for received items
-    for item in grn_data.items:
-        # Create or update stock
-        existing_stock = await db.stock.find_one({
-            "item_id": item.item_id,
-            "location_id": grn_data.location_id,
-            "company_id": grn_data.company_id
-        })
-        
-        if existing_stock:
-            await db.stock.update_one(
-                {"stock_id": existing_stock["stock_id"]},
-                {"$inc": {"quantity": item.received_quantity}}
-            )
-        else:
-            new_stock = Stock(
-                company_id=grn_data.company_id,
-                item_id=item.item_id,
-                location_id=grn_data.location_id,
-                quantity=item.received_quantity
-            )
-            await db.stock.insert_one(new_stock.dict(by_alias=True))
-        
-        # Create batch if item is batch-tracked
-        item_data = await db.items.find_one({"item_id": item.item_id})
-        if item_data and item_data.get("is_batch_tracked", False) and item.batch_number:
-            batch = Batch(
-                company_id=grn_data.company_id,
-                item_id=item.item_id,
-                batch_number=item.batch_number,
-                manufacturing_date=item.manufacturing_date,
-                expiry_date=item.expiry_date,
-                purchase_date=grn_data.grn_date,
-                purchase_price=item.unit_price,
-                quantity_received=item.received_quantity,
-                quantity_available=item.received_quantity,
-                location_id=grn_data.location_id
-            )
-            await db.batches.insert_one(batch.dict(by_alias=True))
-        
-        # Create stock movement
-        movement = StockMovement(
-            company_id=grn_data.company_id,
-            item_id=item.item_id,
-            location_id=grn_data.location_id,
-            movement_type=StockMovementType.PURCHASE,
-            quantity=item.received_quantity,
-            reference_id=grn_data.po_id,
-            reference_type="purchase_order",
-            created_by=current_user.user_id
-        )
-        await db.stock_movements.insert_one(movement.dict(by_alias=True))
+    async def create(idempotency_hooks):
+        # Stock, batches, movements and the GRN itself are written atomically
+        grn = await post_grn(client, db, grn_data, current_user.user_id, hooks=[*GRN_POSTING_HOOKS, *idempotency_hooks])
+        await invalidate_dashboard(dashboard_cache, grn_data.company_id)
+        return grn
     
-    await db.grn.insert_one(grn_data.dict(by_alias=True))
-    return grn_data
+    return await idempotency.run(idempotency_key, current_user.user_id, create)
 
 @api_router.get("/grn", response_model=List[GRN])
-async def get_grns(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_grns(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    grns = await db.grn.find(query).to_list(length=None)
-    return [GRN(**grn) for grn in grns]
+    grns = await paginate(read_db.grn, query, page, response, projection=model_projection(GRN))
+    return raw_response(grns, response)
 
 # ============ SALES MANAGEMENT ENDPOINTS ============
 
 @api_router.post("/sales-orders", response_model=SalesOrder)
 async def create_sales_order(so_data: SalesOrder, current_user: User = Depends(get_current_user_dep)):
     so_data.created_by = current_user.user_id
+    if ENFORCE_CREDIT_LIMIT:
+        credit = await credit_check(db, so_data.customer_id, so_data.total_amount)
+        if not credit["approved"]:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Credit limit exceeded: outstanding {credit['outstanding']:.2f} + order {so_data.total_amount:.2f} > limit {credit['credit_limit']:.2f}"
+            )
     await db.sales_orders.insert_one(so_data.dict(by_alias=True))
+    await invalidate_dashboard(dashboard_cache, so_data.company_id)
     return so_data
 
 @api_router.get("/sales-orders", response_model=List[SalesOrder])
-async def get_sales_orders(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_sales_orders(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    sos = await db.sales_orders.find(query).to_list(length=None)
-    return [SalesOrder(**so) for so in sos]
+    sos = await paginate(read_db.sales_orders, query, page, response, projection=model_projection(SalesOrder))
+    return raw_response(sos, response)
 
 @api_router.get("/sales-orders/{so_id}", response_model=SalesOrder)
 async def get_sales_order(so_id: str, current_user: User = Depends(get_current_user_dep)):
-    so = await db.sales_orders.find_one({"so_id": so_id})
+    so = await db.sales_orders.find_one({"so_id": so_id}, model_projection(SalesOrder))
     if not so:
         raise HTTPException(status_code=404, detail="Sales Order not found")
-    return SalesOrder(**so)
+    return raw_response(so)
+
+# Extra writes made in the same transaction as every new invoice
+INVOICE_POSTING_HOOKS = [record_invoice_gst, record_invoice_reorder, record_invoice_analytics, record_invoice_balance]
 
 @api_router.post("/invoices", response_model=Invoice)
-async def create_invoice(invoice_data: Invoice, current_user: User = Depends(get_current_user_dep)):
+async def create_invoice(invoice_data: Invoice, idempotency_key: Optional[IdempotentRequest] = Depends(idempotency_params), current_user: User = Depends(get_current_user_dep)):
     invoice_data.created_by = current_user.user_id
     invoice_data.balance_amount = invoice_data.total_amount - invoice_data.paid_amount
     
-    # Update stock for invoiced items (FIFO logic)
-    for item in invoice_data.items:
-        # Find available stock using FIFO
-        if invoice_data.company_id:
-            stock_records = await db.stock.find({
-                "item_id": item.item_id,
-                "company_id": invoice_data.company_id,
-                "quantity": {"$gt": 0}
-            }).sort("last_updated", 1).to_list(length=None)
-            
-            remaining_qty = item.quantity
-            for stock_record in stock_records:
-                if remaining_qty <= 0:
-                    break
-                
-                deduct_qty = min(remaining_qty, stock_record["quantity"])
-                await db.stock.update_one(
-                    {"stock_id": stock_record["stock_id"]},
-                    {"$inc": {"quantity": -deduct_qty}}
-                )
-                remaining_qty -= deduct_qty
-                
-                # Create stock movement
-                movement = StockMovement(
-                    company_id=invoice_data.company_id,
-                    item_id=item.item_id,
-                    location_id=stock_record["location_id"],
-                    movement_type=StockMovementType.SALE,
-                    quantity=-deduct_qty,
-                    reference_id=invoice_data.invoice_id,
-                    reference_type="invoice",
-                    created_by=current_user.user_id
-                )
-                await db.stock_movements.insert_one(movement.dict(by_alias=True))
+    async def create(idempotency_hooks):
+        # FIFO stock allocation and the invoice insert happen atomically
+        invoice = await post_invoice(client, db, invoice_data, current_user.user_id,
+                                     hooks=[*INVOICE_POSTING_HOOKS, *idempotency_hooks])
+        await invalidate_dashboard(dashboard_cache, invoice_data.company_id)
+        return invoice
     
-    await db.invoices.insert_one(invoice_data.dict(by_alias=True))
-    return invoice_data
+    return await idempotency.run(idempotency_key, current_user.user_id, create)
 
 @api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_invoices(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    invoices = await db.invoices.find(query).to_list(length=None)
-    return [Invoice(**invoice) for invoice in invoices]
+    invoices = await paginate(read_db.invoices, query, page, response, projection=model_projection(Invoice))
+    return raw_response(invoices, response)
 
 @api_router.get("/invoices/{invoice_id}", response_model=Invoice)
 async def get_invoice(invoice_id: str, current_user: User = Depends(get_current_user_dep)):
-    invoice = await db.invoices.find_one({"invoice_id": invoice_id})
+    invoice = await db.invoices.find_one({"invoice_id": invoice_id}, model_projection(Invoice))
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    return Invoice(**invoice)
+    return raw_response(invoice)
 
 # ============ STOCK & INVENTORY ENDPOINTS ============
 
 @api_router.get("/stock", response_model=List[Stock])
-async def get_stock(company_id: Optional[str] = None, location_id: Optional[str] = None, item_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_stock(response: Response, company_id: Optional[str] = None, location_id: Optional[str] = None, item_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
@@ -374,11 +423,11 @@ async def get_stock(company_id: Optional[str] = None, location_id: Optional[str]
     if item_id:
         query["item_id"] = item_id
     
-    stock_records = await db.stock.find(query).to_list(length=None)
-    return [Stock(**stock) for stock in stock_records]
+    stock_records = await paginate(read_db.stock, query, page, response, projection=model_projection(Stock))
+    return raw_response(stock_records, response)
 
 @api_router.get("/batches", response_model=List[Batch])
-async def get_batches(company_id: Optional[str] = None, item_id: Optional[str] = None, location_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_batches(response: Response, company_id: Optional[str] = None, item_id: Optional[str] = None, location_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
@@ -387,19 +436,70 @@ async def get_batches(company_id: Optional[str] = None, item_id: Optional[str] =
     if location_id:
         query["location_id"] = location_id
     
-    batches = await db.batches.find(query).to_list(length=None)
-    return [Batch(**batch) for batch in batches]
+    batches = await paginate(read_db.batches, query, page, response, projection=model_projection(Batch))
+    return raw_response(batches, response)
+
+@api_router.get("/batches/expiring", response_model=List[Batch])
+async def get_expiring_batches(response: Response, company_id: str, location_id: Optional[str] = None, days: int = Query(30, ge=0, le=3650), include_expired: bool = False, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    now = datetime.utcnow()
+    expiry = {"$lte": now + timedelta(days=days)}
+    if not include_expired:
+        expiry["$gte"] = now
+    # quantity_available > 0 lets the query use the partial near-expiry indexes
+    query = {"company_id": company_id, "quantity_available": {"$gt": 0}, "expiry_date": expiry}
+    if location_id:
+        query["location_id"] = location_id
+    
+    batches = await paginate(read_db.batches, query, page, response, sort_field="expiry_date", projection=model_projection(Batch))
+    return raw_response(batches, response)
 
 @api_router.get("/stock-movements", response_model=List[StockMovement])
-async def get_stock_movements(company_id: Optional[str] = None, item_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_stock_movements(response: Response, company_id: Optional[str] = None, item_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
     if item_id:
         query["item_id"] = item_id
     
-    movements = await db.stock_movements.find(query).sort("movement_date", -1).to_list(length=None)
-    return [StockMovement(**movement) for movement in movements]
+    movements = await paginate(read_db.stock_movements, query, page, response, sort_field="movement_date", direction=DESCENDING, projection=model_projection(StockMovement))
+    return raw_response(movements, response)
+
+# ============ REORDER ENDPOINTS ============
+
+@api_router.get("/reorder", response_model=List[ReorderAlert])
+async def get_reorder_alerts(response: Response, company_id: str, location_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
+    query = {"company_id": company_id}
+    if location_id:
+        query["location_id"] = location_id
+    
+    # Most depleted first; each row carries the quantity to order back up to max_stock_level
+    alerts = await paginate(read_db[REORDER_COLLECTION], query, page, response, sort_field="quantity", projection=model_projection(ReorderAlert))
+    return raw_response(alerts, response)
+
+@api_router.post("/reorder/rebuild", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_reorder_alerts_endpoint(company_id: str, current_user: User = Depends(get_current_user_dep)):
+    return await job_queue.enqueue("reorder.rebuild", {"company_id": company_id}, dedupe_key=f"reorder.rebuild:{company_id}")
+
+# ============ STOCK LEDGER ENDPOINTS ============
+
+@api_router.get("/stock/as-of")
+async def get_stock_as_of(company_id: str, item_id: str, at: datetime, location_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+    return await stock_at(read_db, company_id, item_id, location_id, at)
+
+@api_router.post("/stock/snapshots", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_stock_snapshot(company_id: str, current_user: User = Depends(get_current_user_dep)):
+    return await job_queue.enqueue("ledger.snapshot", {"company_id": company_id}, dedupe_key=f"ledger.snapshot:{company_id}")
+
+@api_router.post("/stock/consistency-check", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def run_stock_consistency_check(company_id: str, current_user: User = Depends(get_current_user_dep)):
+    return await job_queue.enqueue("ledger.consistency_check", {"company_id": company_id}, dedupe_key=f"ledger.consistency_check:{company_id}")
+
+@api_router.get("/stock/consistency")
+async def get_stock_consistency(company_id: str, current_user: User = Depends(get_current_user_dep)):
+    report = await db.stock_consistency_reports.find_one({"company_id": company_id}, {"_id": 0}, sort=[("checked_at", -1)])
+    if not report:
+        raise HTTPException(status_code=404, detail="No consistency check has run for this company")
+    return report
 
 # ============ PAYMENT ENDPOINTS ============
 
@@ -407,120 +507,279 @@ class PaymentOrderRequest(BaseModel):
     invoice_id: str
     amount: float
     currency: str = "INR"
+    # Generated by the client once per payment attempt and resent on retries
+    idempotency_key: str = Field(..., min_length=1, max_length=255)
+
+# An unfinished order reservation older than this is presumed abandoned
+PAYMENT_ORDER_RESERVATION_SECONDS = float(os.environ.get("PAYMENT_ORDER_RESERVATION_SECONDS", "60"))
 
 @api_router.post("/payments/create-order")
 async def create_payment_order(order_data: PaymentOrderRequest, current_user: User = Depends(get_current_user_dep)):
-    if not razorpay_client:
+    if not payment_gateway:
         raise HTTPException(status_code=500, detail="Payment gateway not configured")
     
-    try:
-        razor_order = razorpay_client.order.create({
-            "amount": int(order_data.amount * 100),  # Convert to paise
-            "currency": order_data.currency,
-            "payment_capture": 1
-        })
-        
-        # Store payment order in DB
-        payment_order = {
-            "order_id": razor_order["id"],
-            "invoice_id": order_data.invoice_id,
-            "amount": order_data.amount,
-            "currency": order_data.currency,
-            "status": "created",
-            "created_by": current_user.user_id,
-            "created_at": datetime.now(timezone.utc)
-        }
-        await db.payment_orders.insert_one(payment_order)
-        
+    idempotency_key = order_idempotency_key(order_data.invoice_id, order_data.amount, order_data.currency, order_data.idempotency_key)
+    
+    # A retried request gets the order that was already created
+    existing = await db.payment_orders.find_one({"idempotency_key": idempotency_key})
+    if existing and existing.get("gateway_order"):
+        return existing["gateway_order"]
+    
+    async def store(razor_order):
+        await db.payment_orders.update_one(
+            {"idempotency_key": idempotency_key},
+            {"$set": {"order_id": razor_order["id"], "status": "created", "gateway_order": razor_order}}
+        )
         return razor_order
+    
+    async def create():
+        # Reserve the key first: the unique index lets exactly one worker create the order
+        now = datetime.now(timezone.utc)
+        try:
+            await db.payment_orders.insert_one({
+                "idempotency_key": idempotency_key,
+                "invoice_id": order_data.invoice_id,
+                "amount": order_data.amount,
+                "currency": order_data.currency,
+                "status": "pending",
+                "reserved_at": now,
+                "created_by": current_user.user_id,
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            existing = await db.payment_orders.find_one({"idempotency_key": idempotency_key})
+            if existing and existing.get("gateway_order"):
+                return existing["gateway_order"]
+            # The reserving request failed or died; Razorpay knows whether it got as far as an order
+            found = await payment_gateway.find_order(idempotency_key)
+            if found:
+                return await store(found)
+            claimed = await db.payment_orders.find_one_and_update(
+                {"idempotency_key": idempotency_key, "gateway_order": {"$exists": False},
+                 "reserved_at": {"$lt": now - timedelta(seconds=PAYMENT_ORDER_RESERVATION_SECONDS)}},
+                {"$set": {"reserved_at": now}}
+            )
+            if not claimed:
+                raise HTTPException(status_code=409, detail="The payment order is still being created, retry shortly")
+        
+        try:
+            razor_order = await payment_gateway.create_order(
+                amount=int(round(order_data.amount * 100)),  # Convert to paise
+                currency=order_data.currency,
+                receipt=idempotency_key,
+                notes={"invoice_id": order_data.invoice_id}
+            )
+        except BaseException:
+            # Let the client's retry take over straight away; it checks Razorpay before creating
+            await db.payment_orders.update_one(
+                {"idempotency_key": idempotency_key, "gateway_order": {"$exists": False}},
+                {"$set": {"reserved_at": datetime(1970, 1, 1, tzinfo=timezone.utc)}}
+            )
+            raise
+        return await store(razor_order)
+    
+    try:
+        return await single_flight(idempotency_key, create)
+    except HTTPException:
+        raise
+    except PaymentGatewayError as e:
+        raise HTTPException(status_code=502, detail=f"Payment order creation failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Payment order creation failed: {str(e)}")
 
+# Extra writes made in the same transaction as every payment chunk
+PAYMENT_POSTING_HOOKS = [record_payment_analytics, record_payment_balances]
+
 @api_router.post("/payments", response_model=Payment)
-async def create_payment(payment_data: Payment, current_user: User = Depends(get_current_user_dep)):
+async def create_payment(payment_data: Payment, idempotency_key: Optional[IdempotentRequest] = Depends(idempotency_params), current_user: User = Depends(get_current_user_dep)):
     payment_data.created_by = current_user.user_id
     
-    # Update invoice paid amount
-    invoice = await db.invoices.find_one({"invoice_id": payment_data.invoice_id})
-    if invoice:
-        new_paid_amount = invoice["paid_amount"] + payment_data.amount
-        new_balance = invoice["total_amount"] - new_paid_amount
-        
-        # Update invoice status
-        status = "paid" if new_balance <= 0 else "partially_paid"
-        
-        await db.invoices.update_one(
-            {"invoice_id": payment_data.invoice_id},
-            {
-                "$set": {
-                    "paid_amount": new_paid_amount,
-                    "balance_amount": new_balance,
-                    "status": status
-                }
-            }
-        )
+    async def create(idempotency_hooks):
+        # Invoice totals are updated atomically with the payment insert
+        await post_payments(client, db, [payment_data], hooks=[*PAYMENT_POSTING_HOOKS, *idempotency_hooks])
+        await invalidate_dashboard(dashboard_cache, payment_data.company_id)
+        return payment_data
+    
+    return await idempotency.run(idempotency_key, current_user.user_id, create)
+
+class PaymentBatchResponse(BaseModel):
+    posted: int
+    invoices_updated: int
+
+@api_router.post("/payments/batch", response_model=PaymentBatchResponse)
+async def create_payments_batch(payments: List[Payment] = Depends(payment_batch_body), idempotency_key: Optional[IdempotentRequest] = Depends(idempotency_params), current_user: User = Depends(get_current_user_dep)):
+    for payment in payments:
+        payment.created_by = current_user.user_id
     
-    await db.payments.insert_one(payment_data.dict(by_alias=True))
-    return payment_data
+    async def create(idempotency_hooks):
+        report = await post_payments(client, db, payments, hooks=[*PAYMENT_POSTING_HOOKS, *idempotency_hooks])
+        for company_id in {payment.company_id for payment in payments}:
+            await invalidate_dashboard(dashboard_cache, company_id)
+        return report
+    
+    return await idempotency.run(idempotency_key, current_user.user_id, create)
 
 @api_router.get("/payments", response_model=List[Payment])
-async def get_payments(company_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+async def get_payments(response: Response, company_id: Optional[str] = None, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user_dep)):
     query = {}
     if company_id:
         query["company_id"] = company_id
-    payments = await db.payments.find(query).to_list(length=None)
-    return [Payment(**payment) for payment in payments]
+    payments = await paginate(read_db.payments, query, page, response, projection=model_projection(Payment))
+    return raw_response(payments, response)
+
+# ============ GST ENDPOINTS ============
+
+class PeriodRequest(BaseModel):
+    company_id: str
+    year: int
+    month: int
+
+def validate_period(period: PeriodRequest):
+    if not 1 <= period.month <= 12:
+        raise HTTPException(status_code=400, detail="month must be between 1 and 12")
+
+@api_router.post("/gst/returns/compute", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def compute_gst_return_endpoint(period: PeriodRequest, current_user: User = Depends(get_current_user_dep)):
+    validate_period(period)
+    return await job_queue.enqueue(
+        "gst.compute_return", period.dict(),
+        dedupe_key=f"gst.compute_return:{period.company_id}:{period.year}-{period.month:02d}"
+    )
+
+@api_router.post("/gst/rollups/rebuild", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_gst_rollups_endpoint(period: PeriodRequest, current_user: User = Depends(get_current_user_dep)):
+    validate_period(period)
+    return await job_queue.enqueue(
+        "gst.rebuild_rollups", period.dict(),
+        dedupe_key=f"gst.rebuild_rollups:{period.company_id}:{period.year}-{period.month:02d}"
+    )
+
+@api_router.get("/gst/returns", response_model=List[GSTReturn])
+async def get_gst_returns(company_id: str, year: Optional[int] = None, current_user: User = Depends(get_current_user_dep)):
+    query = {"company_id": company_id}
+    if year:
+        query["year"] = year
+    returns = await read_db.gst_returns.find(query, model_projection(GSTReturn)).sort([("year", -1), ("month", -1)]).to_list(length=None)
+    return raw_response(returns)
+
+# ============ RECEIVABLES ENDPOINTS ============
+
+@api_router.get("/receivables/ageing")
+async def get_receivables_ageing(company_id: str, as_of: Optional[datetime] = None, customer_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), current_user: User = Depends(get_current_user_dep)):
+    return raw_response(await ageing_report(read_db, company_id, as_of, customer_id, limit))
+
+@api_router.post("/receivables/balances/rebuild", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_customer_balances_endpoint(company_id: str, current_user: User = Depends(get_current_user_dep)):
+    return await job_queue.enqueue("receivables.rebuild_balances", {"company_id": company_id}, dedupe_key=f"receivables.rebuild_balances:{company_id}")
+
+# ============ ANALYTICS ENDPOINTS ============
+
+@api_router.get("/analytics/summary")
+async def get_analytics_summary(company_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, location_id: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+    start, end = analytics_window(date_from, date_to)
+    return raw_response(await analytics_summary(read_db, company_id, start, end, location_id))
+
+@api_router.get("/analytics/sales")
+async def get_sales_analytics(company_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, location_id: Optional[str] = None, interval: str = "day", current_user: User = Depends(get_current_user_dep)):
+    start, end = analytics_window(date_from, date_to)
+    return raw_response(await sales_series(read_db, company_id, start, end, interval, location_id))
+
+async def get_top(kind: str, company_id: str, date_from: Optional[datetime], date_to: Optional[datetime], location_id: Optional[str], metric: str, limit: int):
+    start, end = analytics_window(date_from, date_to)
+    return raw_response(await top_entities(read_db, kind, company_id, start, end, metric, limit, location_id))
+
+@api_router.get("/analytics/top-items")
+async def get_top_items(company_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, location_id: Optional[str] = None, metric: str = "revenue", limit: int = Query(10, ge=1, le=100), current_user: User = Depends(get_current_user_dep)):
+    return await get_top("items", company_id, date_from, date_to, location_id, metric, limit)
+
+@api_router.get("/analytics/top-customers")
+async def get_top_customers(company_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, location_id: Optional[str] = None, metric: str = "revenue", limit: int = Query(10, ge=1, le=100), current_user: User = Depends(get_current_user_dep)):
+    return await get_top("customers", company_id, date_from, date_to, location_id, metric, limit)
+
+@api_router.get("/analytics/top-suppliers")
+async def get_top_suppliers(company_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, location_id: Optional[str] = None, metric: str = "amount", limit: int = Query(10, ge=1, le=100), current_user: User = Depends(get_current_user_dep)):
+    return await get_top("suppliers", company_id, date_from, date_to, location_id, metric, limit)
+
+@api_router.post("/analytics/rebuild", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_analytics_endpoint(period: PeriodRequest, current_user: User = Depends(get_current_user_dep)):
+    validate_period(period)
+    return await job_queue.enqueue(
+        "analytics.rebuild", period.dict(),
+        dedupe_key=f"analytics.rebuild:{period.company_id}:{period.year}-{period.month:02d}"
+    )
+
+# ============ BACKGROUND JOB ENDPOINTS ============
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str, current_user: User = Depends(get_current_user_dep)):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 # ============ DASHBOARD & REPORTS ENDPOINTS ============
 
 @api_router.get("/dashboard/summary")
 async def get_dashboard_summary(company_id: str, current_user: User = Depends(get_current_user_dep)):
-    # Get key metrics
-    total_customers = await db.customers.count_documents({"company_id": company_id})
-    total_suppliers = await db.suppliers.count_documents({"company_id": company_id})
-    total_items = await db.items.count_documents({"company_id": company_id})
-    
-    # Pending orders
-    pending_sales_orders = await db.sales_orders.count_documents({
-        "company_id": company_id,
-        "status": {"$in": ["pending", "approved"]}
-    })
-    
-    pending_purchase_orders = await db.purchase_orders.count_documents({
-        "company_id": company_id,
-        "status": {"$in": ["pending", "approved"]}
-    })
-    
-    # Overdue invoices
-    current_date = datetime.now(timezone.utc)
-    overdue_invoices = await db.invoices.count_documents({
-        "company_id": company_id,
-        "due_date": {"$lt": current_date},
-        "status": {"$in": ["pending", "partially_paid"]}
-    })
-    
-    # Low stock items
-    low_stock_items = []
-    stock_records = await db.stock.find({"company_id": company_id}).to_list(length=None)
-    for stock in stock_records:
-        item = await db.items.find_one({"item_id": stock["item_id"]})
-        if item and stock["quantity"] <= item.get("min_stock_level", 0):
-            low_stock_items.append({
-                "item_id": stock["item_id"],
-                "item_name": item["name"],
-                "current_stock": stock["quantity"],
-                "min_level": item.get("min_stock_level", 0)
-            })
-    
-    return {
-        "total_customers": total_customers,
-        "total_suppliers": total_suppliers,
-        "total_items": total_items,
-        "pending_sales_orders": pending_sales_orders,
-        "pending_purchase_orders": pending_purchase_orders,
-        "overdue_invoices": overdue_invoices,
-        "low_stock_items": low_stock_items[:10]  # Limit to 10
-    }
+    return await get_dashboard_summary_cached(read_db, dashboard_cache, company_id)
+
+# ============ BULK IMPORT ENDPOINTS ============
+
+async def run_import(collection, model, file: UploadFile, company_id: Optional[str], format: Optional[str]):
+    defaults = {"company_id": company_id} if company_id else {}
+    prepare = partial(with_search_terms, collection.name)
+    report = await import_rows(collection, file, model, detect_format(file, format), defaults, prepare)
+    for imported_company_id in report.pop("company_ids"):
+        await invalidate_dashboard(dashboard_cache, imported_company_id)
+    return report
+
+@api_router.post("/import/items")
+async def import_items(file: UploadFile = File(...), company_id: Optional[str] = None, format: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+    return await run_import(db.items, Item, file, company_id, format)
+
+@api_router.post("/import/customers")
+async def import_customers(file: UploadFile = File(...), company_id: Optional[str] = None, format: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+    return await run_import(db.customers, Customer, file, company_id, format)
+
+@api_router.post("/import/suppliers")
+async def import_suppliers(file: UploadFile = File(...), company_id: Optional[str] = None, format: Optional[str] = None, current_user: User = Depends(get_current_user_dep)):
+    return await run_import(db.suppliers, Supplier, file, company_id, format)
+
+# ============ EXPORT ENDPOINTS ============
+
+def export_format_param(format: str = "ndjson") -> str:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format, use one of: {', '.join(EXPORT_FORMATS)}")
+    return format
+
+@api_router.get("/export/invoices")
+async def export_invoices(company_id: Optional[str] = None, customer_id: Optional[str] = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, export_format: str = Depends(export_format_param), current_user: User = Depends(get_current_user_dep)):
+    query = date_range("invoice_date", date_from, date_to)
+    if company_id:
+        query["company_id"] = company_id
+    if customer_id:
+        query["customer_id"] = customer_id
+    return stream_export(read_db.invoices, query, Invoice, export_format, "invoices")
+
+@api_router.get("/export/stock-movements")
+async def export_stock_movements(company_id: Optional[str] = None, item_id: Optional[str] = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, export_format: str = Depends(export_format_param), current_user: User = Depends(get_current_user_dep)):
+    query = date_range("movement_date", date_from, date_to)
+    if company_id:
+        query["company_id"] = company_id
+    if item_id:
+        query["item_id"] = item_id
+    return stream_export(read_db.stock_movements, query, StockMovement, export_format, "stock-movements")
+
+@api_router.get("/export/batches")
+async def export_batches(company_id: Optional[str] = None, item_id: Optional[str] = None, location_id: Optional[str] = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, export_format: str = Depends(export_format_param), current_user: User = Depends(get_current_user_dep)):
+    query = date_range("purchase_date", date_from, date_to)
+    if company_id:
+        query["company_id"] = company_id
+    if item_id:
+        query["item_id"] = item_id
+    if location_id:
+        query["location_id"] = location_id
+    return stream_export(read_db.batches, query, Batch, export_format, "batches")
 
 # Health check endpoint
 @api_router.get("/")
@@ -530,6 +789,11 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Prometheus scrape endpoint (outside /api, no auth)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -537,8 +801,12 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Per-route latency, DB command counts and response sizes
+app.add_middleware(MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -546,6 +814,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+    # Data migrations run once per database as a job, not in every worker's startup
+    if await pending_migrations(db):
+        await job_queue.enqueue(MIGRATION_JOB, dedupe_key=MIGRATION_JOB)
+
+background_tasks = []
+
+@app.on_event("startup")
+async def start_job_runner():
+    # Set RUN_JOBS_IN_PROCESS=false when dedicated `python worker.py` processes run the jobs
+    if RUN_JOBS_IN_PROCESS:
+        background_tasks.append(asyncio.create_task(
+            job_queue.run(concurrency=JOB_RUNNER_CONCURRENCY, schedules=SCHEDULES)
+        ))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    # Let a running job hand itself back to the queue before the client goes away
+    await asyncio.gather(*background_tasks, return_exceptions=True)
     client.close()
+    if payment_gateway:
+        payment_gateway.close()
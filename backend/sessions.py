@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from typing import Any, Dict, Set, Tuple
+import hashlib
+import logging
+import os
+import secrets
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_COLLECTION = "sessions"
+SESSION_CLAIM = "sid"
+# Access tokens are short-lived; clients renew them with their refresh token
+ACCESS_TOKEN_EXPIRE_MINUTES = float(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+# A refresh token keeps a login alive this long; renewing access tokens never extends it
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# How stale each worker's copy of the revocation list may get
+SESSION_REVOCATION_REFRESH_SECONDS = float(os.environ.get("SESSION_REVOCATION_REFRESH_SECONDS", "10"))
+
+def _token_hash(secret: str) -> str:
+    # Refresh tokens are random, so a fast hash is enough and only the hash is stored
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired refresh token")
+
+def _split(refresh_token: str) -> Tuple[str, str]:
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        raise _invalid_refresh_token()
+    return session_id, secret
+
+def _issue(session_id: str) -> Tuple[str, str]:
+    secret = secrets.token_urlsafe(32)
+    return f"{session_id}.{secret}", _token_hash(secret)
+
+async def create_session(db, user_id: str) -> Tuple[str, str]:
+    """Start a session at login; returns (session_id, refresh_token)."""
+    now = datetime.utcnow()
+    session_id = str(uuid.uuid4())
+    refresh_token, token_hash = _issue(session_id)
+    await db[SESSIONS_COLLECTION].insert_one({
+        "_id": session_id,
+        "user_id": user_id,
+        "token_hash": token_hash,
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "revoked_at": None,
+    })
+    return session_id, refresh_token
+
+async def rotate_session(db, refresh_token: str) -> Tuple[Dict[str, Any], str]:
+    """Swap a refresh token for a new one; returns (session, new_refresh_token).
+
+    Each refresh token works once. Presenting one that was already rotated out
+    means it was copied, so the whole session is revoked for every holder.
+    """
+    session_id, secret = _split(refresh_token)
+    now = datetime.utcnow()
+    new_token, new_hash = _issue(session_id)
+    session = await db[SESSIONS_COLLECTION].find_one_and_update(
+        {"_id": session_id, "token_hash": _token_hash(secret), "revoked_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"token_hash": new_hash, "last_used_at": now}},
+        projection={"user_id": 1, "expires_at": 1}
+    )
+    if session is not None:
+        return session, new_token
+
+    existing = await db[SESSIONS_COLLECTION].find_one({"_id": session_id}, {"revoked_at": 1, "expires_at": 1})
+    if existing and existing["revoked_at"] is None and existing["expires_at"] > now:
+        logger.warning("Refresh token reuse on session %s; revoking it", session_id)
+        await revoke_session(db, session_id, reason="token_reuse")
+    raise _invalid_refresh_token()
+
+async def revoke_session(db, session_id: str, reason: str = "logout") -> bool:
+    result = await db[SESSIONS_COLLECTION].update_one(
+        {"_id": session_id, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}}
+    )
+    revoked_sessions.add(session_id)
+    return result.modified_count == 1
+
+async def revoke_user_sessions(db, user_id: str, reason: str) -> int:
+    """End every open session of a user, e.g. on deactivation; returns how many were revoked."""
+    session_ids = await db[SESSIONS_COLLECTION].distinct("_id", {"user_id": user_id, "revoked_at": None})
+    if not session_ids:
+        return 0
+    result = await db[SESSIONS_COLLECTION].update_many(
+        {"_id": {"$in": session_ids}, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}}
+    )
+    for session_id in session_ids:
+        revoked_sessions.add(session_id)
+    return result.modified_count
+
+async def revoke_refresh_token(db, refresh_token: str) -> bool:
+    """Logout: ends the session the token belongs to, if the token is its current one."""
+    session_id, secret = _split(refresh_token)
+    session = await db[SESSIONS_COLLECTION].find_one({"_id": session_id, "token_hash": _token_hash(secret)}, {"_id": 1})
+    if session is None:
+        return False
+    return await revoke_session(db, session_id)
+
+class RevocationList:
+    """Ids of sessions revoked within the last access-token lifetime, kept in memory.
+
+    Older revocations need no entry: every access token issued for them has
+    expired. Each worker reloads the list from MongoDB at most every
+    SESSION_REVOCATION_REFRESH_SECONDS, so a logout on one worker takes that
+    long to reach the others.
+    """
+
+    def __init__(self, window: timedelta):
+        self.window = window
+        self.revoked: Set[str] = set()
+        self.loaded_at = 0.0
+
+    def add(self, session_id: str):
+        self.revoked.add(session_id)
+
+    async def reload(self, db):
+        # Claim the reload first so concurrent requests keep using the current list
+        self.loaded_at = time.monotonic()
+        since = datetime.utcnow() - self.window
+        self.revoked = set(await db[SESSIONS_COLLECTION].distinct("_id", {"revoked_at": {"$gte": since}}))
+
+    async def contains(self, db, session_id: str) -> bool:
+        if time.monotonic() - self.loaded_at > SESSION_REVOCATION_REFRESH_SECONDS:
+            await self.reload(db)
+        return session_id in self.revoked
+
+revoked_sessions = RevocationList(timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
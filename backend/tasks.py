@@ -0,0 +1,69 @@
+from typing import Any, Dict, List
+from analytics import rebuild_analytics
+from gst import compute_gst_return, rebuild_gst_rollups
+from jobs import JobQueue, PeriodicJob
+from ledger import check_consistency, take_snapshot
+from migrations import MIGRATION_JOB, run_migrations
+from receivables import rebuild_customer_balances
+from reorder import rebuild_reorder_alerts
+import os
+
+# Periodic stock snapshots and ledger consistency checks (0 disables)
+LEDGER_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get("LEDGER_SNAPSHOT_INTERVAL_SECONDS", "86400"))
+LEDGER_CHECK_INTERVAL_SECONDS = float(os.environ.get("LEDGER_CHECK_INTERVAL_SECONDS", "21600"))
+# Reorder alerts are kept current by postings; the periodic rebuild backfills and repairs them
+REORDER_REBUILD_INTERVAL_SECONDS = float(os.environ.get("REORDER_REBUILD_INTERVAL_SECONDS", "86400"))
+# Same for the cached per-customer outstanding balances
+BALANCE_REBUILD_INTERVAL_SECONDS = float(os.environ.get("BALANCE_REBUILD_INTERVAL_SECONDS", "86400"))
+
+SCHEDULES: List[PeriodicJob] = [
+    PeriodicJob("ledger.snapshot_all", "ledger.snapshot_all", LEDGER_SNAPSHOT_INTERVAL_SECONDS),
+    PeriodicJob("ledger.check_all", "ledger.consistency_check_all", LEDGER_CHECK_INTERVAL_SECONDS),
+    PeriodicJob("reorder.rebuild_all", "reorder.rebuild_all", REORDER_REBUILD_INTERVAL_SECONDS),
+    PeriodicJob("receivables.rebuild_all", "receivables.rebuild_balances_all", BALANCE_REBUILD_INTERVAL_SECONDS),
+]
+
+async def gst_return_job(db, company_id: str, year: int, month: int) -> Dict[str, Any]:
+    gst_return = await compute_gst_return(db, company_id, year, month)
+    return {"return_id": gst_return.return_id, "is_filed": gst_return.is_filed}
+
+async def gst_rollup_rebuild_job(db, company_id: str, year: int, month: int) -> Dict[str, Any]:
+    await rebuild_gst_rollups(db, company_id, year, month)
+    return {"company_id": company_id, "year": year, "month": month}
+
+async def stock_snapshot_job(db, company_id: str) -> Dict[str, Any]:
+    run = await take_snapshot(db, company_id)
+    return {"run_id": run["run_id"], "snapshot_at": run["snapshot_at"], "rows": run["rows"]}
+
+async def stock_consistency_job(db, company_id: str) -> Dict[str, Any]:
+    report = await check_consistency(db, company_id)
+    # Mismatch details stay in stock_consistency_reports
+    return {key: report[key] for key in ("checked_at", "items_checked", "keys_checked", "mismatches")}
+
+def build_job_queue(db) -> JobQueue:
+    queue = JobQueue(db, {
+        "gst.compute_return": gst_return_job,
+        "gst.rebuild_rollups": gst_rollup_rebuild_job,
+        "ledger.snapshot": stock_snapshot_job,
+        "ledger.consistency_check": stock_consistency_job,
+        "reorder.rebuild": rebuild_reorder_alerts,
+        "analytics.rebuild": rebuild_analytics,
+        "receivables.rebuild_balances": rebuild_customer_balances,
+        MIGRATION_JOB: run_migrations,
+    })
+
+    def fan_out(kind: str):
+        # One job per company so several workers can share a periodic run. Companies come
+        # from their own collection: one with invoices but no stock still needs its balances.
+        async def handler(db) -> Dict[str, Any]:
+            companies = await db.companies.distinct("company_id")
+            for company_id in companies:
+                await queue.enqueue(kind, {"company_id": company_id}, dedupe_key=f"{kind}:{company_id}")
+            return {"companies": len(companies)}
+        return handler
+
+    queue.register("ledger.snapshot_all", fan_out("ledger.snapshot"))
+    queue.register("ledger.consistency_check_all", fan_out("ledger.consistency_check"))
+    queue.register("reorder.rebuild_all", fan_out("reorder.rebuild"))
+    queue.register("receivables.rebuild_balances_all", fan_out("receivables.rebuild_balances"))
+    return queue
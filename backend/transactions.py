@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_supports_transactions: Optional[bool] = None
+
+async def supports_transactions(client) -> bool:
+    # Multi-document transactions need a replica set or a sharded cluster
+    global _supports_transactions
+    if _supports_transactions is None:
+        hello = await client.admin.command("hello")
+        _supports_transactions = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        if not _supports_transactions:
+            logger.warning("MongoDB is running standalone; multi-document writes will not be transactional")
+    return _supports_transactions
+
+async def run_in_transaction(client, callback: Callable[[Any], Awaitable[Any]]) -> Any:
+    """Run `callback(session)` in a transaction, retrying transient errors.
+
+    On a standalone server the callback runs once with `session=None`.
+    """
+    if not await supports_transactions(client):
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
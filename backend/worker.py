@@ -0,0 +1,51 @@
+"""Dedicated background job worker.
+
+    python worker.py
+
+Run one or more of these next to the web workers (started with
+RUN_JOBS_IN_PROCESS=false) so report generation and stock recomputation never
+compete with HTTP requests for the event loop.
+"""
+from pathlib import Path
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from database import build_client
+from indexes import ensure_indexes
+from tasks import SCHEDULES, build_job_queue
+import asyncio
+import logging
+import os
+import signal
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def main():
+    client = build_client(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    await ensure_indexes(db)
+
+    queue = build_job_queue(db)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = asyncio.create_task(queue.run(
+        concurrency=int(os.environ.get("JOB_RUNNER_CONCURRENCY", "4")),
+        schedules=SCHEDULES
+    ))
+    await stop.wait()
+    logger.info("Stopping job worker")
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+"""Throughput / latency benchmark for the FastAPI backend.
+
+Runs `server.app` in-process (no HTTP server, no network) against a local
+MongoDB, seeds realistic data volumes and drives the main workloads
+concurrently. Results are written as JSON so runs can be compared across commits:
+
+    python backend_benchmark.py --items 100000 --movements 1000000
+    python backend_benchmark.py --compare benchmark_results/<old>.json
+
+Needs a MongoDB reachable at --mongo-url (default mongodb://localhost:27017).
+A throwaway database is created and dropped afterwards unless --keep-db is given.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+SEED_CHUNK = 10000
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client that calls the ASGI app directly."""
+
+    def __init__(self, app):
+        self.app = app
+        self.token = None
+
+    async def request(self, method, path, params=None, json_body=None):
+        query = "&".join(f"{k}={v}" for k, v in (params or {}).items())
+        body = json.dumps(json_body).encode("utf-8") if json_body is not None else b""
+        headers = [(b"host", b"benchmark"), (b"content-type", b"application/json"),
+                   (b"content-length", str(len(body)).encode())]
+        if self.token:
+            headers.append((b"authorization", f"Bearer {self.token}".encode()))
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("benchmark", 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Nothing more to read; block until the app is done
+            await asyncio.Event().wait()
+
+        status = None
+        chunks = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    # Process-wide high-water mark (ru_maxrss is KiB on Linux); it never goes down
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.company_id = "bench-company"
+        self.location_id = "bench-location"
+        self.supplier_id = "bench-supplier"
+        self.item_ids = []
+        self.customer_ids = []
+        self.email = f"bench_{uuid.uuid4().hex[:8]}@benchmark.local"
+        self.password = "BenchPass123!"
+
+    # ---------- setup ----------
+
+    def import_server(self):
+        os.environ["MONGO_URL"] = self.args.mongo_url
+        os.environ["DB_NAME"] = self.args.db_name
+        os.environ.setdefault("PAYMENT_GATEWAY", "stub")
+        # The login workload repeats one user's login far beyond any real client
+        os.environ.setdefault("LOGIN_RATE_LIMIT_ATTEMPTS", "0")
+        os.environ.setdefault("LOGIN_RATE_LIMIT_PER_CLIENT", "0")
+        # Scheduled snapshots and rebuilds would otherwise run on the event loop being measured
+        os.environ.setdefault("RUN_JOBS_IN_PROCESS", "false")
+        sys.path.insert(0, str(BACKEND_DIR))
+        import server
+        return server
+
+    async def seed(self, db):
+        now = datetime.now(timezone.utc)
+        print(f"Seeding {self.args.items} items, {self.args.customers} customers, {self.args.movements} stock movements...")
+        started = time.perf_counter()
+
+        await db.locations.insert_one({"location_id": self.location_id, "company_id": self.company_id, "name": "Main",
+                                       "address": "-", "city": "-", "state": "-", "pincode": "000000", "phone": "0",
+                                       "is_warehouse": True, "is_active": True, "created_at": now})
+        await db.suppliers.insert_one({"supplier_id": self.supplier_id, "company_id": self.company_id, "name": "Bench Supplier",
+                                       "phone": "0", "address": "-", "city": "-", "state": "-", "pincode": "000000",
+                                       "payment_terms": "Net 30", "is_active": True, "created_at": now})
+
+        for start in range(0, self.args.items, SEED_CHUNK):
+            items, stock = [], []
+            for n in range(start, min(start + SEED_CHUNK, self.args.items)):
+                item_id = f"item-{n}"
+                self.item_ids.append(item_id)
+                items.append({"item_id": item_id, "company_id": self.company_id, "name": f"Medicine {n:06d}",
+                              "sku": f"SKU{n:06d}", "hsn_code": f"3004{n % 100:02d}", "category_id": "bench-category",
+                              "unit": "strip", "gst_rate": 12.0, "purchase_price": 10.0, "selling_price": 15.0,
+                              "min_stock_level": 10, "max_stock_level": 500, "is_batch_tracked": False,
+                              "is_active": True, "created_at": now, "updated_at": now})
+                stock.append({"stock_id": str(uuid.uuid4()), "company_id": self.company_id, "item_id": item_id,
+                              "location_id": self.location_id, "quantity": random.randint(0, 1000),
+                              "reserved_quantity": 0, "last_updated": now})
+            await db.items.insert_many(items, ordered=False)
+            await db.stock.insert_many(stock, ordered=False)
+
+        for start in range(0, self.args.customers, SEED_CHUNK):
+            customers = []
+            for n in range(start, min(start + SEED_CHUNK, self.args.customers)):
+                customer_id = f"customer-{n}"
+                self.customer_ids.append(customer_id)
+                customers.append({"customer_id": customer_id, "company_id": self.company_id, "name": f"Customer {n}",
+                                  "phone": f"9{n:09d}", "billing_address": "-", "city": "-", "state": "-",
+                                  "pincode": "000000", "credit_limit": 50000.0, "credit_days": 30,
+                                  "is_active": True, "created_at": now})
+            await db.customers.insert_many(customers, ordered=False)
+
+        for start in range(0, self.args.movements, SEED_CHUNK):
+            movements = []
+            for n in range(start, min(start + SEED_CHUNK, self.args.movements)):
+                inward = n % 3 != 0
+                movements.append({"movement_id": str(uuid.uuid4()), "company_id": self.company_id,
+                                  "item_id": self.item_ids[n % len(self.item_ids)], "location_id": self.location_id,
+                                  "movement_type": "purchase" if inward else "sale",
+                                  "quantity": 10 if inward else -5, "reference_id": f"REF-{n}",
+                                  "reference_type": "purchase_order" if inward else "invoice",
+                                  "movement_date": now - timedelta(minutes=n), "created_by": "benchmark",
+                                  "created_at": now})
+            await db.stock_movements.insert_many(movements, ordered=False)
+
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    # ---------- workloads ----------
+
+    def grn_payload(self):
+        lines = random.sample(self.item_ids, min(self.args.lines, len(self.item_ids)))
+        return {"company_id": self.company_id, "po_id": f"PO-BENCH-{uuid.uuid4().hex[:8]}", "supplier_id": self.supplier_id,
+                "location_id": self.location_id, "grn_number": f"GRN-{uuid.uuid4().hex[:8]}", "created_by": "benchmark",
+                "items": [{"item_id": item_id, "ordered_quantity": 50, "received_quantity": 50, "unit_price": 10.0}
+                          for item_id in lines]}
+
+    def invoice_payload(self):
+        lines = random.sample(self.item_ids, min(self.args.lines, len(self.item_ids)))
+        items = [{"item_id": item_id, "quantity": 1, "unit_price": 15.0, "gst_rate": 12.0, "cgst_amount": 0.9,
+                  "sgst_amount": 0.9, "igst_amount": 0.0, "total_amount": 16.8} for item_id in lines]
+        subtotal = 15.0 * len(items)
+        return {"company_id": self.company_id, "customer_id": random.choice(self.customer_ids),
+                "invoice_number": f"INV-{uuid.uuid4().hex[:8]}", "items": items, "subtotal": subtotal,
+                "total_cgst": 0.9 * len(items), "total_sgst": 0.9 * len(items), "total_igst": 0.0,
+                "total_gst": 1.8 * len(items), "total_amount": 16.8 * len(items), "balance_amount": 16.8 * len(items),
+                "due_date": (datetime.now(timezone.utc) + timedelta(days=30)).isoformat(), "created_by": "benchmark"}
+
+    def workloads(self):
+        company = {"company_id": self.company_id}
+        return {
+            "login": ("POST", "/api/auth/login", None, lambda: {"email": self.email, "password": self.password}),
+            "list_items": ("GET", "/api/items", dict(company, limit=100), None),
+            "list_customers": ("GET", "/api/customers", dict(company, limit=100), None),
+            "list_stock": ("GET", "/api/stock", dict(company, limit=100), None),
+            "list_stock_movements": ("GET", "/api/stock-movements", dict(company, limit=100), None),
+            "dashboard": ("GET", "/api/dashboard/summary", company, None),
+            "create_grn": ("POST", "/api/grn", None, self.grn_payload),
+            "create_invoice": ("POST", "/api/invoices", None, self.invoice_payload),
+        }
+
+    async def run_workload(self, client, name, method, path, params, payload_factory):
+        latencies, errors = [], 0
+        queue = asyncio.Queue()
+        for _ in range(self.args.requests):
+            queue.put_nowait(None)
+
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                body = payload_factory() if payload_factory else None
+                started = time.perf_counter()
+                status, _ = await client.request(method, path, params=params, json_body=body)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status is None or status >= 400:
+                    errors += 1
+
+        gc.collect()
+        rss_before = peak_rss_mb()
+        if self.args.trace_memory:
+            tracemalloc.start()
+        wall_started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+        wall = time.perf_counter() - wall_started
+        peak_mb = None
+        if self.args.trace_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+
+        result = {
+            "requests": len(latencies),
+            "errors": errors,
+            "concurrency": self.args.concurrency,
+            "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+            # How far this workload pushed the process peak; 0 when an earlier workload peaked higher
+            "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+            "process_peak_rss_mb": round(peak_rss_mb(), 1),
+            "peak_traced_mb": round(peak_mb, 2) if peak_mb is not None else None,
+        }
+        print(f"{name:<22} rps={result['rps']:>8}  p50={result['p50_ms']:>8}ms  p95={result['p95_ms']:>8}ms  "
+              f"p99={result['p99_ms']:>8}ms  errors={errors}")
+        return result
+
+    async def run(self):
+        server = self.import_server()
+        app, db, client = server.app, server.db, server.client
+        await app.router.startup()
+        try:
+            await self.seed(db)
+            api = ASGIClient(app)
+
+            status, body = await api.request("POST", "/api/auth/register", json_body={
+                "email": self.email, "name": "Benchmark", "phone": "0000000000", "role": "admin",
+                "company_id": self.company_id, "password": self.password})
+            if status != 200:
+                raise SystemExit(f"Could not register benchmark user: {status} {body[:200]!r}")
+            status, body = await api.request("POST", "/api/auth/login",
+                                             json_body={"email": self.email, "password": self.password})
+            if status != 200:
+                raise SystemExit(f"Could not log in benchmark user: {status} {body[:200]!r}")
+            api.token = json.loads(body)["access_token"]
+
+            selected = self.args.workloads.split(",") if self.args.workloads else None
+            results = {}
+            for name, (method, path, params, payload_factory) in self.workloads().items():
+                if selected and name not in selected:
+                    continue
+                results[name] = await self.run_workload(api, name, method, path, params, payload_factory)
+            return results
+        finally:
+            if not self.args.keep_db:
+                await client.drop_database(self.args.db_name)
+            await app.router.shutdown()
+
+
+def compare(current, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}):")
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        def delta(key):
+            return (result[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{name:<22} rps {delta('rps'):+7.1f}%  p95 {delta('p95_ms'):+7.1f}%  p99 {delta('p99_ms'):+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend API in-process against a local MongoDB")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=f"rcm_bench_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--movements", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=20, help="line items per GRN / invoice")
+    parser.add_argument("--workloads", help="comma separated subset of workloads to run")
+    parser.add_argument("--trace-memory", action="store_true", help="record peak Python allocations per workload (slower)")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--output", help="result file (default benchmark_results/<commit>-<timestamp>.json)")
+    parser.add_argument("--compare", help="previous result file to diff against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = asyncio.run(Benchmark(args).run())
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else ROOT_DIR / "benchmark_results" / f"{commit}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
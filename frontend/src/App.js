@@ -36,8 +36,46 @@ function App() {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
 
+  const clearSession = () => {
+    localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
+    localStorage.removeItem('user');
+    delete axios.defaults.headers.common['Authorization'];
+  };
+
   // Setup axios interceptor for auth token
   useEffect(() => {
+    // Access tokens are short-lived: on a 401, renew once with the refresh token and retry.
+    // Concurrent 401s share one refresh, since each refresh token can be used only once.
+    let refreshing = null;
+    const interceptor = axios.interceptors.response.use(null, async (error) => {
+      const original = error.config;
+      const refreshToken = localStorage.getItem('refreshToken');
+      if (error.response?.status !== 401 || !refreshToken || original?._retried || original?.url?.includes('/auth/')) {
+        return Promise.reject(error);
+      }
+      if (!refreshing) {
+        refreshing = axios.post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+          .then((response) => {
+            localStorage.setItem('token', response.data.access_token);
+            localStorage.setItem('refreshToken', response.data.refresh_token);
+            axios.defaults.headers.common['Authorization'] = `Bearer ${response.data.access_token}`;
+            return response.data.access_token;
+          })
+          .finally(() => { refreshing = null; });
+      }
+      try {
+        const token = await refreshing;
+        original._retried = true;
+        original.headers['Authorization'] = `Bearer ${token}`;
+        return axios(original);
+      } catch (refreshError) {
+        clearSession();
+        setUser(null);
+        return Promise.reject(error);
+      }
+    });
+
     const token = localStorage.getItem('token');
     if (token) {
       axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
@@ -46,29 +84,31 @@ function App() {
         .then(() => {
           setUser(JSON.parse(localStorage.getItem('user') || '{}'));
         })
-        .catch(() => {
-          localStorage.removeItem('token');
-          localStorage.removeItem('user');
-          delete axios.defaults.headers.common['Authorization'];
-        })
+        .catch(clearSession)
         .finally(() => setLoading(false));
     } else {
       setLoading(false);
     }
+
+    return () => axios.interceptors.response.eject(interceptor);
   }, []);
 
-  const login = (userData, token) => {
+  const login = (userData, token, refreshToken) => {
     setUser(userData);
     localStorage.setItem('token', token);
+    localStorage.setItem('refreshToken', refreshToken);
     localStorage.setItem('user', JSON.stringify(userData));
     axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      // Ends the session server-side; the local logout does not wait for it
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     setUser(null);
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
-    delete axios.defaults.headers.common['Authorization'];
+    clearSession();
   };
 
   if (loading) {
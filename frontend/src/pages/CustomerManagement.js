@@ -13,10 +13,15 @@ import { API } from '../App';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 
+const SEARCH_DEBOUNCE_MS = 250;
+
 const CustomerManagement = () => {
   const { user } = useAuth();
   const [customers, setCustomers] = useState([]);
   const [loading, setLoading] = useState(true);
+  // The API returns one page at a time; the cursor for the next one comes in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [showAddCustomer, setShowAddCustomer] = useState(false);
   
@@ -35,14 +40,24 @@ const CustomerManagement = () => {
     company_id: user?.company_id || 'demo-company'
   });
 
+  // Search runs on the server; wait for a pause in typing before asking
   useEffect(() => {
-    fetchCustomers();
-  }, []);
+    const timer = setTimeout(() => fetchCustomers(searchTerm), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
-  const fetchCustomers = async () => {
+  const fetchCustomers = async (search = searchTerm, after = null) => {
     try {
-      const response = await axios.get(`${API}/customers?company_id=${user?.company_id || 'demo-company'}`);
-      setCustomers(response.data);
+      const params = { company_id: user?.company_id || 'demo-company', sort: 'name' };
+      if (search.trim()) {
+        params.q = search.trim();
+      }
+      if (after) {
+        params.after = after;
+      }
+      const response = await axios.get(`${API}/customers`, { params });
+      setCustomers((previous) => (after ? [...previous, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to fetch customers');
     } finally {
@@ -50,6 +65,12 @@ const CustomerManagement = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    await fetchCustomers(searchTerm, nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleAddCustomer = async (e) => {
     e.preventDefault();
     try {
@@ -76,12 +97,6 @@ const CustomerManagement = () => {
     }
   };
 
-  const filteredCustomers = customers.filter(customer => 
-    customer.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    customer.phone.includes(searchTerm) ||
-    (customer.email && customer.email.toLowerCase().includes(searchTerm.toLowerCase()))
-  );
-
   return (
     <div className="space-y-6" data-testid="customer-management-page">
       <div className="flex items-center justify-between">
@@ -258,7 +273,7 @@ const CustomerManagement = () => {
           <div className="flex items-center space-x-2 mb-4">
             <Search className="w-4 h-4 text-gray-400" />
             <Input
-              placeholder="Search customers by name, phone, or email..."
+              placeholder="Search customers by name, phone, or GSTIN..."
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
               className="flex-1"
@@ -271,7 +286,7 @@ const CustomerManagement = () => {
               <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-emerald-600 mx-auto"></div>
               <p className="mt-2 text-gray-500">Loading customers...</p>
             </div>
-          ) : filteredCustomers.length === 0 ? (
+          ) : customers.length === 0 ? (
             <div className="text-center py-8">
               <Users className="w-12 h-12 text-gray-300 mx-auto mb-4" />
               <p className="text-gray-500">No customers found</p>
@@ -291,7 +306,7 @@ const CustomerManagement = () => {
                   </TableRow>
                 </TableHeader>
                 <TableBody>
-                  {filteredCustomers.map((customer, index) => (
+                  {customers.map((customer, index) => (
                     <TableRow key={customer.customer_id} data-testid={`customer-row-${index}`}>
                       <TableCell className="font-medium">
                         <div>
@@ -348,6 +363,13 @@ const CustomerManagement = () => {
                   ))}
                 </TableBody>
               </Table>
+              {nextCursor && (
+                <div className="flex justify-center pt-4">
+                  <Button variant="outline" onClick={loadMore} disabled={loadingMore} data-testid="load-more-customers-btn">
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
@@ -239,7 +239,7 @@ const Dashboard = () => {
                     <div className="w-2 h-2 bg-orange-500 rounded-full"></div>
                     <div>
                       <p className="text-sm font-medium text-orange-800">
-                        {dashboardData.low_stock_items.length} Low Stock Items
+                        {dashboardData.low_stock_count ?? dashboardData.low_stock_items.length} Low Stock Items
                       </p>
                       <p className="text-xs text-orange-600">Reorder required</p>
                     </div>
@@ -261,7 +261,7 @@ const Dashboard = () => {
                   ))}
                   {dashboardData.low_stock_items.length > 3 && (
                     <p className="text-xs text-gray-500">
-                      +{dashboardData.low_stock_items.length - 3} more items
+                      +{(dashboardData.low_stock_count ?? dashboardData.low_stock_items.length) - 3} more items
                     </p>
                   )}
                 </div>
@@ -16,11 +16,16 @@ import { API } from '../App';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 
+const SEARCH_DEBOUNCE_MS = 250;
+
 const ItemManagement = () => {
   const { user } = useAuth();
   const [items, setItems] = useState([]);
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
+  // The API returns one page at a time; the cursor for the next one comes in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [showAddItem, setShowAddItem] = useState(false);
   const [showAddCategory, setShowAddCategory] = useState(false);
@@ -48,14 +53,27 @@ const ItemManagement = () => {
   });
 
   useEffect(() => {
-    fetchItems();
     fetchCategories();
   }, []);
 
-  const fetchItems = async () => {
+  // Search runs on the server; wait for a pause in typing before asking
+  useEffect(() => {
+    const timer = setTimeout(() => fetchItems(searchTerm), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
+  const fetchItems = async (search = searchTerm, after = null) => {
     try {
-      const response = await axios.get(`${API}/items?company_id=${user?.company_id || 'demo-company'}`);
-      setItems(response.data);
+      const params = { company_id: user?.company_id || 'demo-company', sort: 'name' };
+      if (search.trim()) {
+        params.q = search.trim();
+      }
+      if (after) {
+        params.after = after;
+      }
+      const response = await axios.get(`${API}/items`, { params });
+      setItems((previous) => (after ? [...previous, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to fetch items');
     } finally {
@@ -63,6 +81,12 @@ const ItemManagement = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    await fetchItems(searchTerm, nextCursor);
+    setLoadingMore(false);
+  };
+
   const fetchCategories = async () => {
     try {
       const response = await axios.get(`${API}/categories?company_id=${user?.company_id || 'demo-company'}`);
@@ -116,11 +140,6 @@ const ItemManagement = () => {
     }
   };
 
-  const filteredItems = items.filter(item => 
-    item.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    item.sku.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
   const getCategoryName = (categoryId) => {
     const category = categories.find(cat => cat.category_id === categoryId);
     return category ? category.name : 'Unknown Category';
@@ -388,7 +407,7 @@ const ItemManagement = () => {
           <div className="flex items-center space-x-2 mb-4">
             <Search className="w-4 h-4 text-gray-400" />
             <Input
-              placeholder="Search items by name or SKU..."
+              placeholder="Search items by name, SKU, or HSN code..."
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
               className="flex-1"
@@ -401,7 +420,7 @@ const ItemManagement = () => {
               <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-emerald-600 mx-auto"></div>
               <p className="mt-2 text-gray-500">Loading items...</p>
             </div>
-          ) : filteredItems.length === 0 ? (
+          ) : items.length === 0 ? (
             <div className="text-center py-8">
               <Package className="w-12 h-12 text-gray-300 mx-auto mb-4" />
               <p className="text-gray-500">No items found</p>
@@ -425,7 +444,7 @@ const ItemManagement = () => {
                   </TableRow>
                 </TableHeader>
                 <TableBody>
-                  {filteredItems.map((item, index) => (
+                  {items.map((item, index) => (
                     <TableRow key={item.item_id} data-testid={`item-row-${index}`}>
                       <TableCell className="font-medium">
                         <div>
@@ -469,6 +488,13 @@ const ItemManagement = () => {
                   ))}
                 </TableBody>
               </Table>
+              {nextCursor && (
+                <div className="flex justify-center pt-4">
+                  <Button variant="outline" onClick={loadMore} disabled={loadingMore} data-testid="load-more-items-btn">
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
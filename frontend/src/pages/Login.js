@@ -40,7 +40,7 @@ const Login = () => {
 
     try {
       const response = await axios.post(`${API}/auth/login`, loginData);
-      login(response.data.user, response.data.access_token);
+      login(response.data.user, response.data.access_token, response.data.refresh_token);
       toast.success('Login successful!');
     } catch (err) {
       setError(err.response?.data?.detail || 'Login failed');
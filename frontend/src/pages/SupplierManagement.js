@@ -13,10 +13,15 @@ import { API } from '../App';
 import { useAuth } from '../App';
 import { toast } from 'sonner';
 
+const SEARCH_DEBOUNCE_MS = 250;
+
 const SupplierManagement = () => {
   const { user } = useAuth();
   const [suppliers, setSuppliers] = useState([]);
   const [loading, setLoading] = useState(true);
+  // The API returns one page at a time; the cursor for the next one comes in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [showAddSupplier, setShowAddSupplier] = useState(false);
   
@@ -33,14 +38,24 @@ const SupplierManagement = () => {
     company_id: user?.company_id || 'demo-company'
   });
 
+  // Search runs on the server; wait for a pause in typing before asking
   useEffect(() => {
-    fetchSuppliers();
-  }, []);
+    const timer = setTimeout(() => fetchSuppliers(searchTerm), SEARCH_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
-  const fetchSuppliers = async () => {
+  const fetchSuppliers = async (search = searchTerm, after = null) => {
     try {
-      const response = await axios.get(`${API}/suppliers?company_id=${user?.company_id || 'demo-company'}`);
-      setSuppliers(response.data);
+      const params = { company_id: user?.company_id || 'demo-company', sort: 'name' };
+      if (search.trim()) {
+        params.q = search.trim();
+      }
+      if (after) {
+        params.after = after;
+      }
+      const response = await axios.get(`${API}/suppliers`, { params });
+      setSuppliers((previous) => (after ? [...previous, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Failed to fetch suppliers');
     } finally {
@@ -48,6 +63,12 @@ const SupplierManagement = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    await fetchSuppliers(searchTerm, nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleAddSupplier = async (e) => {
     e.preventDefault();
     try {
@@ -72,12 +93,6 @@ const SupplierManagement = () => {
     }
   };
 
-  const filteredSuppliers = suppliers.filter(supplier => 
-    supplier.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    supplier.phone.includes(searchTerm) ||
-    (supplier.email && supplier.email.toLowerCase().includes(searchTerm.toLowerCase()))
-  );
-
   return (
     <div className="space-y-6" data-testid="supplier-management-page">
       <div className="flex items-center justify-between">
@@ -229,7 +244,7 @@ const SupplierManagement = () => {
           <div className="flex items-center space-x-2 mb-4">
             <Search className="w-4 h-4 text-gray-400" />
             <Input
-              placeholder="Search suppliers by name, phone, or email..."
+              placeholder="Search suppliers by name, phone, or GSTIN..."
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
               className="flex-1"
@@ -242,7 +257,7 @@ const SupplierManagement = () => {
               <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-emerald-600 mx-auto"></div>
               <p className="mt-2 text-gray-500">Loading suppliers...</p>
             </div>
-          ) : filteredSuppliers.length === 0 ? (
+          ) : suppliers.length === 0 ? (
             <div className="text-center py-8">
               <Truck className="w-12 h-12 text-gray-300 mx-auto mb-4" />
               <p className="text-gray-500">No suppliers found</p>
@@ -262,7 +277,7 @@ const SupplierManagement = () => {
                   </TableRow>
                 </TableHeader>
                 <TableBody>
-                  {filteredSuppliers.map((supplier, index) => (
+                  {suppliers.map((supplier, index) => (
                     <TableRow key={supplier.supplier_id} data-testid={`supplier-row-${index}`}>
                       <TableCell className="font-medium">
                         <div>
@@ -316,6 +331,13 @@ const SupplierManagement = () => {
                   ))}
                 </TableBody>
               </Table>
+              {nextCursor && (
+                <div className="flex justify-center pt-4">
+                  <Button variant="outline" onClick={loadMore} disabled={loadingMore} data-testid="load-more-suppliers-btn">
+                    {loadingMore ? 'Loading...' : 'Load more'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
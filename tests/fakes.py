@@ -0,0 +1,220 @@
+"""In-memory stand-in for the few Motor collection calls the unit tests exercise."""
+import copy
+from types import SimpleNamespace
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+OPERATORS = {
+    "$lt": lambda value, bound: value is not None and value < bound,
+    "$lte": lambda value, bound: value is not None and value <= bound,
+    "$gt": lambda value, bound: value is not None and value > bound,
+    "$gte": lambda value, bound: value is not None and value >= bound,
+    "$ne": lambda value, other: value != other,
+    "$in": lambda value, options: value in options,
+    "$nin": lambda value, options: value not in options,
+    "$exists": lambda value, wanted: (value is not None) == wanted,
+}
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and condition and all(key in OPERATORS for key in condition):
+            if not all(OPERATORS[op](value, bound) for op, bound in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+# Just enough aggregation expressions for the pipeline updates the backend issues
+EXPRESSIONS = {
+    "$add": lambda *values: sum(values),
+    "$subtract": lambda a, b: a - b,
+    "$ifNull": lambda value, default: default if value is None else value,
+    "$lte": lambda a, b: a <= b,
+    "$cond": lambda condition, then, otherwise: then if condition else otherwise,
+}
+
+def evaluate(expression, doc):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return doc.get(expression[1:])
+    if isinstance(expression, dict) and len(expression) == 1:
+        op, args = next(iter(expression.items()))
+        if op in EXPRESSIONS:
+            return EXPRESSIONS[op](*[evaluate(arg, doc) for arg in args])
+    return expression
+
+def apply_update(doc, update):
+    if isinstance(update, list):
+        for stage in update:
+            values = {field: evaluate(expression, doc) for field, expression in stage["$set"].items()}
+            doc.update(values)
+        return
+    for field, value in update.get("$set", {}).items():
+        doc[field] = value
+    for field, value in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + value
+    for field in update.get("$unset", {}):
+        doc.pop(field, None)
+
+def group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = spec["_id"]
+        key = {name: evaluate(ref, doc) for name, ref in key.items()} if isinstance(key, dict) else evaluate(key, doc)
+        row = groups.setdefault(repr(key), {"_id": key})
+        for field, accumulator in spec.items():
+            if field != "_id":
+                row[field] = row.get(field, 0) + evaluate(accumulator["$sum"], doc)
+    return list(groups.values())
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        taken, self.docs = self.docs[:length], self.docs[length:] if length else []
+        return taken
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.pipelines = []
+        self.next_id = 1
+
+    def _find(self, query):
+        return next((doc for doc in self.docs.values() if matches(doc, query)), None)
+
+    def _insert(self, doc):
+        if "_id" not in doc:
+            doc["_id"] = self.next_id
+            self.next_id += 1
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate _id")
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+        return doc["_id"]
+
+    async def insert_one(self, doc, session=None):
+        return SimpleNamespace(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered=True, session=None):
+        inserted, write_errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert(doc))
+            except DuplicateKeyError:
+                write_errors.append({"index": index, "code": 11000, "errmsg": "duplicate _id"})
+                if ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted)
+
+    def find(self, query=None, projection=None, session=None, sort=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self.docs.values() if matches(doc, query or {})])
+
+    async def find_one(self, query, projection=None, session=None, sort=None):
+        docs = await self.find(query).sort(sort or []).to_list(length=1)
+        return docs[0] if docs else None
+
+    async def find_one_and_update(self, query, update, projection=None, session=None):
+        doc = self._find(query)
+        if doc is None:
+            return None
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        return before
+
+    async def update_one(self, query, update, upsert=False, session=None):
+        doc = self._find(query)
+        if doc is None and upsert:
+            doc = self.docs[self._insert({field: value for field, value in query.items() if not isinstance(value, dict)})]
+            apply_update(doc, update)
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+        if doc is not None:
+            apply_update(doc, update)
+        return SimpleNamespace(matched_count=int(doc is not None), modified_count=int(doc is not None), upserted_id=None)
+
+    async def update_many(self, query, update, session=None):
+        docs = [doc for doc in self.docs.values() if matches(doc, query)]
+        for doc in docs:
+            apply_update(doc, update)
+        return SimpleNamespace(matched_count=len(docs), modified_count=len(docs))
+
+    async def distinct(self, field, query=None, session=None):
+        return list(dict.fromkeys(doc[field] for doc in self.docs.values() if field in doc and matches(doc, query or {})))
+
+    async def bulk_write(self, requests, ordered=True, session=None):
+        modified = 0
+        for request in requests:
+            assert isinstance(request, UpdateOne), "only UpdateOne is supported"
+            result = await self.update_one(request._filter, request._doc, upsert=request._upsert)
+            modified += result.modified_count
+        return SimpleNamespace(modified_count=modified)
+
+    async def delete_one(self, query, session=None):
+        doc = self._find(query)
+        if doc is not None:
+            del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    async def delete_many(self, query, session=None):
+        doomed = [key for key, doc in self.docs.items() if matches(doc, query)]
+        for key in doomed:
+            del self.docs[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    def aggregate(self, pipeline, **options):
+        # $match/$group pipelines are run; anything else is only recorded for tests to inspect
+        self.pipelines.append(pipeline)
+        if not all(set(stage) <= {"$match", "$group"} for stage in pipeline):
+            return FakeCursor([])
+        docs = [copy.deepcopy(doc) for doc in self.docs.values()]
+        for stage in pipeline:
+            if "$match" in stage:
+                docs = [doc for doc in docs if matches(doc, stage["$match"])]
+            else:
+                docs = group(docs, stage["$group"])
+        return FakeCursor(docs)
+
+    def rows(self):
+        return [{k: v for k, v in doc.items() if k != "_id"} for doc in self.docs.values()]
+
+class FakeAdmin:
+    async def command(self, name):
+        # A standalone server: run_in_transaction calls back once with session=None
+        return {}
+
+class FakeClient:
+    def __init__(self):
+        self.admin = FakeAdmin()
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+        self.client = FakeClient()
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from allocation import Deduction, hold_back_batched_stock, plan_fefo, plan_fifo
+
+def stock(stock_id, quantity, item_id="item-1", location_id="loc-1"):
+    return {"stock_id": stock_id, "item_id": item_id, "location_id": location_id, "quantity": quantity}
+
+def batch(batch_id, quantity, expiry_date, item_id="item-1", location_id="loc-1"):
+    return {"_id": batch_id, "batch_id": batch_id, "item_id": item_id, "location_id": location_id,
+            "quantity_available": quantity, "expiry_date": expiry_date}
+
+def test_fifo_takes_rows_in_order():
+    rows = [stock("s1", 3), stock("s2", 10)]
+    remaining = {"item-1": 5}
+    available = {"s1": 3, "s2": 10}
+    plan = plan_fifo(rows, remaining, available)
+    assert plan == [Deduction("s1", "item-1", "loc-1", 3), Deduction("s2", "item-1", "loc-1", 2)]
+    assert remaining == {"item-1": 0}
+    assert available == {"s1": 0, "s2": 8}
+
+def test_fifo_leaves_shortfall_in_remaining():
+    remaining = {"item-1": 7, "item-2": 1}
+    plan = plan_fifo([stock("s1", 4)], remaining, {"s1": 4})
+    assert plan == [Deduction("s1", "item-1", "loc-1", 4)]
+    assert remaining == {"item-1": 3, "item-2": 1}
+
+def test_fefo_consumes_earliest_expiry_first_and_undated_last():
+    batches = [
+        batch("b-undated", 10, None),
+        batch("b-late", 10, datetime(2027, 6, 1)),
+        batch("b-early", 4, datetime(2026, 12, 1)),
+    ]
+    remaining = {"item-1": 16}
+    available = {"s1": 30}
+    plan = plan_fefo(batches, [stock("s1", 30)], remaining, available)
+    assert plan == [
+        Deduction("s1", "item-1", "loc-1", 4, "b-early"),
+        Deduction("s1", "item-1", "loc-1", 10, "b-late"),
+        Deduction("s1", "item-1", "loc-1", 2, "b-undated"),
+    ]
+    assert remaining == {"item-1": 0}
+    assert available == {"s1": 14}
+
+def test_fefo_only_draws_from_the_batch_location():
+    batches = [batch("b1", 5, datetime(2026, 12, 1), location_id="loc-2")]
+    rows = [stock("s1", 5, location_id="loc-1"), stock("s2", 2, location_id="loc-2")]
+    remaining = {"item-1": 5}
+    plan = plan_fefo(batches, rows, remaining, {"s1": 5, "s2": 2})
+    assert plan == [Deduction("s2", "item-1", "loc-2", 2, "b1")]
+    assert remaining == {"item-1": 3}
+
+def test_fifo_fallback_cannot_sell_stock_held_by_batches():
+    # An expired batch is not planned by FEFO, but its units are still on the shelf
+    batches = [batch("b-expired", 6, datetime(2020, 1, 1))]
+    rows = [stock("s1", 10)]
+    available = {"s1": 10}
+    hold_back_batched_stock(batches, [], rows, available)
+    assert available == {"s1": 4}
+    remaining = {"item-1": 8}
+    plan = plan_fifo(rows, remaining, available)
+    assert plan == [Deduction("s1", "item-1", "loc-1", 4)]
+    assert remaining == {"item-1": 4}
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+from allocation import Deduction
+from analytics import (
+    PAYMENT_DAILY, PURCHASE_SUPPLIER_DAILY, SALES_CUSTOMER_DAILY, SALES_ITEM_DAILY, UNALLOCATED_LOCATION,
+    rebuild_analytics, record_grn_analytics, record_invoice_analytics, record_payment_analytics
+)
+from models import GRN, GRNItem, Invoice, InvoiceItem, Payment, PaymentMode
+from tests.fakes import FakeDatabase
+
+DAY = datetime(2026, 4, 10, 6, 0)
+
+def make_invoice(quantity=4, unit_price=50.0, status="pending", invoice_date=DAY):
+    line = InvoiceItem(item_id="gauze", quantity=quantity, unit_price=unit_price, gst_rate=12.0,
+                       cgst_amount=6.0, sgst_amount=6.0, igst_amount=0.0, total_amount=quantity * unit_price + 12.0)
+    return Invoice(company_id="c1", customer_id="cust-1", invoice_number="INV-1", invoice_date=invoice_date,
+                   items=[line], subtotal=quantity * unit_price, total_cgst=6.0, total_sgst=6.0, total_igst=0.0,
+                   total_gst=12.0, total_amount=line.total_amount, balance_amount=line.total_amount,
+                   status=status, created_by="u1")
+
+def make_payment(amount, mode=PaymentMode.UPI):
+    return Payment(company_id="c1", invoice_id="inv-1", customer_id="cust-1", amount=amount,
+                   payment_mode=mode, payment_date=DAY, created_by="u1")
+
+def seeded_db():
+    db = FakeDatabase()
+    db.items.docs = {1: {"_id": 1, "item_id": "gauze", "purchase_price": 20.0}}
+    db.batches.docs = {1: {"_id": 1, "batch_id": "b1", "purchase_price": 30.0}}
+    return db
+
+def by_location(collection):
+    return {row["location_id"]: row for row in collection.rows()}
+
+def test_invoice_revenue_and_cost_split_across_locations():
+    db = seeded_db()
+    deductions = [Deduction("s1", "gauze", "loc-1", 3, "b1"), Deduction("s2", "gauze", "loc-2", 1)]
+    asyncio.run(record_invoice_analytics(db, make_invoice(), deductions))
+    items = by_location(db[SALES_ITEM_DAILY])
+    assert items["loc-1"]["revenue"] == 150.0 and items["loc-1"]["cost"] == 90.0
+    assert items["loc-2"]["revenue"] == 50.0 and items["loc-2"]["cost"] == 20.0
+    assert items["loc-1"]["day"] == datetime(2026, 4, 10)
+    customers = by_location(db[SALES_CUSTOMER_DAILY])
+    assert customers["loc-1"]["invoices"] == 1 and customers["loc-2"]["invoices"] == 1
+    assert customers["loc-1"]["tax"] == 9.0
+
+def test_unallocated_lines_are_costed_at_the_item_price():
+    db = seeded_db()
+    asyncio.run(record_invoice_analytics(db, make_invoice(quantity=2)))
+    (row,) = db[SALES_ITEM_DAILY].rows()
+    assert row["location_id"] == UNALLOCATED_LOCATION
+    assert row["cost"] == 40.0
+
+def test_postings_accumulate_and_stamp_updated_at():
+    db = seeded_db()
+    asyncio.run(record_payment_analytics(db, [make_payment(100.0), make_payment(50.0), make_payment(10.0, PaymentMode.CASH)]))
+    asyncio.run(record_payment_analytics(db, [make_payment(25.0)]))
+    rows = {row["payment_mode"]: row for row in db[PAYMENT_DAILY].rows()}
+    assert rows["upi"]["amount"] == 175.0 and rows["upi"]["payments"] == 3
+    assert rows["cash"]["amount"] == 10.0
+    assert all(isinstance(row["updated_at"], datetime) for row in rows.values())
+
+def test_grn_value_per_supplier_and_location():
+    db = FakeDatabase()
+    grn = GRN(company_id="c1", po_id="po-1", supplier_id="sup-1", location_id="loc-1", grn_number="GRN-1",
+              grn_date=DAY, created_by="u1",
+              items=[GRNItem(item_id="gauze", ordered_quantity=10, received_quantity=8, unit_price=5.0)])
+    asyncio.run(record_grn_analytics(db, grn))
+    (row,) = db[PURCHASE_SUPPLIER_DAILY].rows()
+    assert (row["amount"], row["quantity"], row["grns"]) == (40.0, 8, 1)
+
+def test_rebuild_replaces_totals_and_drops_only_stale_keys():
+    db = seeded_db()
+    invoice = make_invoice()
+    db.invoices.docs = {invoice.id: invoice.dict(by_alias=True)}
+    cancelled = make_invoice(status="cancelled")
+    db.invoices.docs[cancelled.id] = cancelled.dict(by_alias=True)
+    db.stock_movements.docs = {1: {"_id": 1, "reference_id": invoice.invoice_id, "reference_type": "invoice",
+                                   "item_id": "gauze", "location_id": "loc-1", "quantity": -4, "batch_id": None}}
+    old = datetime(2026, 1, 1)
+    sales = db[SALES_ITEM_DAILY]
+    sales.docs = {
+        # Same key as the rebuilt row, already counted once by the posting hook
+        "live": {"_id": "live", "company_id": "c1", "day": datetime(2026, 4, 10), "location_id": "loc-1",
+                 "item_id": "gauze", "revenue": 200.0, "updated_at": old},
+        "stale": {"_id": "stale", "company_id": "c1", "day": datetime(2026, 4, 2), "location_id": "loc-9",
+                  "item_id": "gone", "revenue": 1.0, "updated_at": old},
+        "other-month": {"_id": "other-month", "company_id": "c1", "day": datetime(2026, 5, 1), "location_id": "loc-1",
+                        "item_id": "gauze", "revenue": 1.0, "updated_at": old},
+    }
+
+    result = asyncio.run(rebuild_analytics(db, "c1", 2026, 4))
+    assert (result["invoices"], result["removed"]) == (1, 1)
+    assert sorted(sales.docs) == ["live", "other-month"]
+    live = sales.docs["live"]
+    assert live["revenue"] == 200.0 and live["cost"] == 80.0
+    assert live["updated_at"] > old
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from auth import create_access_token, get_current_user, user_cache, user_changed, user_changes, user_token_claims
+from models import User, UserRole
+from sessions import SESSIONS_COLLECTION, create_session, revoked_sessions
+from tests.fakes import FakeDatabase
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    user_cache.clear()
+    user_changes.changed = {}
+    user_changes.loaded_at = 0.0
+
+def add_user(db, **fields):
+    user = User(email="a@example.com", name="A", phone="1", role=UserRole.STAFF, company_id="c1", **fields)
+    doc = user.dict(by_alias=True)
+    doc["updated_at"] = datetime.utcnow() - timedelta(minutes=5)
+    asyncio.run(db.users.insert_one(doc))
+    return User(**doc)
+
+def current_user(db, user, session_id=None):
+    token = create_access_token(user_token_claims(user, session_id))
+    return asyncio.run(get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token), db))
+
+def test_a_change_made_elsewhere_replaces_the_cached_user():
+    db = FakeDatabase()
+    user = add_user(db)
+    assert current_user(db, user).role == UserRole.STAFF
+
+    # Another worker promotes the user; this one notices on its next reload
+    doc = db.users.docs[user.id]
+    doc.update(role=UserRole.MANAGER.value, updated_at=datetime.utcnow())
+    user_changes.loaded_at = 0.0
+    assert current_user(db, user).role == UserRole.MANAGER
+
+def test_deactivation_drops_the_cache_and_ends_sessions():
+    db = FakeDatabase()
+    user = add_user(db)
+    session_id, _ = asyncio.run(create_session(db, user.user_id))
+    assert current_user(db, user, session_id).is_active
+
+    doc = db.users.docs[user.id]
+    doc.update(is_active=False, updated_at=datetime.utcnow())
+    asyncio.run(user_changed(db, User(**doc)))
+
+    assert db[SESSIONS_COLLECTION].docs[session_id]["revoked_reason"] == "inactive_user"
+    assert session_id in revoked_sessions.revoked
+    with pytest.raises(HTTPException) as error:
+        current_user(db, user)
+    assert error.value.status_code == 401
@@ -0,0 +1,72 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+import bulk_import
+from bulk_import import detect_format, import_rows, iter_rows, validate_chunk
+from tests.fakes import FakeCollection
+
+class Product(BaseModel):
+    id: str = Field(..., alias="_id")
+    company_id: str
+    name: str
+    price: float = 0.0
+
+def upload(content, filename="items.csv", content_type="text/csv"):
+    return SimpleNamespace(file=io.BytesIO(content.encode("utf-8")), filename=filename, content_type=content_type)
+
+def test_format_comes_from_the_request_then_the_file_name():
+    assert detect_format(upload("", "items.ndjson"), None) == "ndjson"
+    assert detect_format(upload("", "items.bin", "application/x-ndjson"), None) == "ndjson"
+    assert detect_format(upload("", "items.txt"), None) == "csv"
+    assert detect_format(upload("", "items.txt"), "ndjson") == "ndjson"
+    with pytest.raises(HTTPException) as error:
+        detect_format(upload(""), "xlsx")
+    assert error.value.status_code == 400
+
+def test_csv_rows_are_numbered_from_the_header_and_drop_empty_cells():
+    rows = list(iter_rows(upload("_id,name,price\na,Gauze,\nb,Saline,12.5\n"), "csv"))
+    assert rows == [(2, {"_id": "a", "name": "Gauze"}), (3, {"_id": "b", "name": "Saline", "price": "12.5"})]
+
+def test_ndjson_skips_blank_lines_and_reports_bad_json():
+    rows = list(iter_rows(upload('{"_id": "a"}\n\nnot json\n', "items.ndjson"), "ndjson"))
+    assert rows[0] == (1, {"_id": "a"})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], ValueError)
+
+def test_validation_applies_defaults_and_collects_errors():
+    rows = [(2, {"_id": "a", "name": "Gauze"}), (3, {"_id": "b"}), (4, ["not", "an", "object"]), (5, ValueError("bad"))]
+    docs, row_numbers, errors = validate_chunk(rows, Product, {"company_id": "c1"})
+    assert docs == [{"_id": "a", "company_id": "c1", "name": "Gauze", "price": 0.0}]
+    assert row_numbers == [2]
+    assert [e["row"] for e in errors] == [3, 4, 5]
+    assert errors[0]["error"].startswith("name:")
+
+def test_import_spans_chunks_and_reports_rejected_rows(monkeypatch):
+    monkeypatch.setattr(bulk_import, "IMPORT_CHUNK_SIZE", 2)
+    collection = FakeCollection()
+    collection.docs["dup"] = {"_id": "dup"}
+    content = "_id,name,price\na,Gauze,1\nb,,2\nc,Saline,3\ndup,Swab,4\nd,Mask,x\ne,Tape,5\n"
+    report = asyncio.run(import_rows(collection, upload(content), Product, "csv", {"company_id": "c1"}))
+    assert report["total_rows"] == 6
+    assert report["inserted"] == 3
+    assert report["failed"] == 3
+    # Validation and write errors are merged in row order
+    assert [e["row"] for e in report["errors"]] == [3, 5, 6]
+    assert report["company_ids"] == ["c1"]
+    assert sorted(collection.docs) == ["a", "c", "dup", "e"]
+
+def test_error_report_is_truncated(monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_REPORTED_ERRORS", 2)
+    content = "_id,price\na,1\nb,2\nc,3\n"
+    report = asyncio.run(import_rows(FakeCollection(), upload(content), Product, "csv", {"company_id": "c1"}))
+    assert report["failed"] == 3
+    assert len(report["errors"]) == 2
+    assert report["errors_truncated"] is True
+
+def test_empty_upload_inserts_nothing():
+    report = asyncio.run(import_rows(FakeCollection(), upload("_id,name\n"), Product, "csv", {"company_id": "c1"}))
+    assert report == {"total_rows": 0, "inserted": 0, "failed": 0, "errors": [], "errors_truncated": False, "company_ids": []}
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from gst import (
+    ROLLUP_COLLECTION, UNKNOWN_HSN, month_bounds, month_instants, rebuild_gst_rollups, record_invoice_gst, rollup_day
+)
+from tests.fakes import FakeDatabase
+
+def line(item_id, quantity=1, unit_price=100.0, gst_rate=12.0):
+    tax = quantity * unit_price * gst_rate / 200
+    return SimpleNamespace(item_id=item_id, quantity=quantity, unit_price=unit_price, gst_rate=gst_rate,
+                           cgst_amount=tax, sgst_amount=tax, igst_amount=0.0,
+                           total_amount=quantity * unit_price + 2 * tax)
+
+def invoice(*lines, status="pending", invoice_date=datetime(2026, 3, 10, 6, 0)):
+    return SimpleNamespace(company_id="c1", status=status, invoice_date=invoice_date, items=list(lines))
+
+def test_days_follow_the_indian_calendar():
+    # 20:00 UTC on the 31st is already 01:30 IST on the 1st
+    assert rollup_day(datetime(2026, 3, 31, 20, 0)) == datetime(2026, 4, 1)
+    assert rollup_day(datetime(2026, 3, 31, 18, 29, tzinfo=timezone.utc)) == datetime(2026, 3, 31)
+    assert rollup_day(datetime(2026, 4, 1, 0, 0, tzinfo=timezone.utc)) == datetime(2026, 4, 1)
+
+def test_month_bounds_wrap_the_year():
+    assert month_bounds(2026, 12) == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+    # Stored dates are UTC, so the IST month starts at 18:30 UTC the day before
+    assert month_instants(2026, 4) == (datetime(2026, 3, 31, 18, 30), datetime(2026, 4, 30, 18, 30))
+
+def test_posting_accumulates_per_day_hsn_and_rate():
+    db = FakeDatabase()
+    db.items.docs = {1: {"_id": 1, "item_id": "gauze", "hsn_code": "3005"}}
+    asyncio.run(record_invoice_gst(db, invoice(line("gauze", 2), line("gauze", 1, gst_rate=5.0))))
+    asyncio.run(record_invoice_gst(db, invoice(line("gauze", 3))))
+    rows = {(row["hsn_code"], row["gst_rate"]): row for row in db[ROLLUP_COLLECTION].rows()}
+    assert set(rows) == {("3005", 12.0), ("3005", 5.0)}
+    assert rows[("3005", 12.0)]["quantity"] == 5
+    assert rows[("3005", 12.0)]["taxable_value"] == 500.0
+    assert rows[("3005", 12.0)]["line_count"] == 2
+    assert rows[("3005", 12.0)]["day"] == datetime(2026, 3, 10)
+
+def test_lines_without_an_hsn_code_use_the_sentinel():
+    db = FakeDatabase()
+    db.items.docs = {1: {"_id": 1, "item_id": "no-hsn", "hsn_code": None}}
+    asyncio.run(record_invoice_gst(db, invoice(line("no-hsn"), line("deleted-item"))))
+    rows = db[ROLLUP_COLLECTION].rows()
+    assert [row["hsn_code"] for row in rows] == [UNKNOWN_HSN]
+    assert rows[0]["line_count"] == 2
+
+def test_cancelled_invoices_are_not_counted_but_drafts_are():
+    db = FakeDatabase()
+    asyncio.run(record_invoice_gst(db, invoice(line("gauze"), status="cancelled")))
+    assert db[ROLLUP_COLLECTION].rows() == []
+    asyncio.run(record_invoice_gst(db, invoice(line("gauze"), status="draft")))
+    assert len(db[ROLLUP_COLLECTION].rows()) == 1
+
+def test_rebuild_merges_then_drops_only_stale_keys():
+    db = FakeDatabase()
+    rollups = db[ROLLUP_COLLECTION]
+    old = datetime(2026, 1, 1)
+    rollups.docs = {
+        1: {"_id": 1, "company_id": "c1", "day": datetime(2026, 4, 3), "hsn_code": "3005", "updated_at": old},
+        2: {"_id": 2, "company_id": "c1", "day": datetime(2026, 5, 1), "hsn_code": "3005", "updated_at": old},
+        3: {"_id": 3, "company_id": "c2", "day": datetime(2026, 4, 3), "hsn_code": "3005", "updated_at": old},
+        4: {"_id": 4, "company_id": "c1", "day": datetime(2026, 4, 4), "hsn_code": "3005", "updated_at": datetime(2999, 1, 1)},
+    }
+    asyncio.run(rebuild_gst_rollups(db, "c1", 2026, 4))
+
+    (pipeline,) = db.invoices.pipelines
+    assert pipeline[0]["$match"]["invoice_date"] == {"$gte": datetime(2026, 3, 31, 18, 30), "$lt": datetime(2026, 4, 30, 18, 30)}
+    assert pipeline[0]["$match"]["status"] == {"$nin": ["cancelled"]}
+    project, merge = pipeline[-2]["$project"], pipeline[-1]["$merge"]
+    assert project["hsn_code"] == {"$ifNull": ["$_id.hsn_code", UNKNOWN_HSN]}
+    assert merge["whenMatched"] == "replace"
+    # Only the month's rows the merge did not rewrite are removed
+    assert sorted(rollups.docs) == [2, 3, 4]
@@ -0,0 +1,96 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from idempotency import COMMITTED, DONE, REPLAYED_HEADER, IdempotencyStore, IdempotentRequest
+from tests.fakes import FakeCollection
+
+class Posting:
+    """A handler that commits through its hooks, as the document-creating endpoints do."""
+
+    def __init__(self, fail_before_commit=False, fail_after_commit=False):
+        self.calls = 0
+        self.fail_before_commit = fail_before_commit
+        self.fail_after_commit = fail_after_commit
+
+    async def __call__(self, hooks):
+        self.calls += 1
+        if self.fail_before_commit:
+            raise RuntimeError("posting failed")
+        for hook in hooks:
+            await hook(None, {"invoice_id": "inv-1"}, session=None)
+        if self.fail_after_commit:
+            raise RuntimeError("response failed")
+        return {"invoice_id": "inv-1", "attempt": self.calls}
+
+def run(store, request, handler, user_id="user-1"):
+    return asyncio.run(store.run(request, user_id, handler))
+
+def test_retry_replays_the_stored_response():
+    collection = FakeCollection()
+    handler = Posting()
+    request = IdempotentRequest("key-1", "fingerprint-a")
+    first = run(IdempotencyStore(collection), request, handler)
+    assert orjson.loads(first.body) == {"invoice_id": "inv-1", "attempt": 1}
+    assert REPLAYED_HEADER not in first.headers
+    assert collection.docs["user-1:key-1"]["state"] == DONE
+
+    # A fresh store has an empty cache, so the replay comes from the collection
+    replay = run(IdempotencyStore(collection), request, handler)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.body == first.body
+    assert handler.calls == 1
+
+def test_keys_are_scoped_per_user():
+    collection = FakeCollection()
+    handler = Posting()
+    request = IdempotentRequest("key-1", "fingerprint-a")
+    run(IdempotencyStore(collection), request, handler, user_id="user-1")
+    run(IdempotencyStore(collection), request, handler, user_id="user-2")
+    assert handler.calls == 2
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_reused_key_with_a_different_body_is_rejected(cached):
+    collection = FakeCollection()
+    store = IdempotencyStore(collection)
+    handler = Posting()
+    run(store, IdempotentRequest("key-1", "fingerprint-a"), handler)
+    if not cached:
+        store = IdempotencyStore(collection)
+    with pytest.raises(HTTPException) as error:
+        run(store, IdempotentRequest("key-1", "fingerprint-b"), handler)
+    assert error.value.status_code == 422
+    assert handler.calls == 1
+
+def test_failure_before_commit_releases_the_key():
+    collection = FakeCollection()
+    store = IdempotencyStore(collection)
+    request = IdempotentRequest("key-1", "fingerprint-a")
+    with pytest.raises(RuntimeError):
+        run(store, request, Posting(fail_before_commit=True))
+    assert collection.docs == {}
+    retry = run(store, request, Posting())
+    assert REPLAYED_HEADER not in retry.headers
+
+def test_failure_after_commit_keeps_the_key():
+    collection = FakeCollection()
+    store = IdempotencyStore(collection)
+    request = IdempotentRequest("key-1", "fingerprint-a")
+    with pytest.raises(RuntimeError):
+        run(store, request, Posting(fail_after_commit=True))
+    assert collection.docs["user-1:key-1"]["state"] == COMMITTED
+    retry = Posting()
+    with pytest.raises(HTTPException) as error:
+        run(store, request, retry)
+    assert error.value.status_code == 409
+    assert retry.calls == 0
+
+def test_without_a_key_the_handler_runs_every_time():
+    collection = FakeCollection()
+    handler = Posting()
+    run(IdempotencyStore(collection), None, handler)
+    run(IdempotencyStore(collection), None, handler)
+    assert handler.calls == 2
+    assert collection.docs == {}
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import ledger
+from ledger import check_consistency, stock_at, take_snapshot
+from tests.fakes import FakeDatabase
+
+def add_movement(db, item_id, location_id, quantity, movement_date):
+    db.stock_movements.docs[len(db.stock_movements.docs) + 1] = {
+        "_id": len(db.stock_movements.docs) + 1, "company_id": "c1", "item_id": item_id,
+        "location_id": location_id, "quantity": quantity, "movement_date": movement_date,
+    }
+
+def snapshot_rows(db, run):
+    return {(row["item_id"], row["location_id"]): row["quantity"]
+            for row in db.stock_snapshots.docs.values() if row["run_id"] == run["run_id"]}
+
+def test_snapshots_chain_from_the_previous_one():
+    db = FakeDatabase()
+    add_movement(db, "gauze", "loc-1", 10, datetime(2026, 3, 1))
+    add_movement(db, "gauze", "loc-2", 5, datetime(2026, 3, 1))
+    first = asyncio.run(take_snapshot(db, "c1", datetime(2026, 3, 2)))
+    assert snapshot_rows(db, first) == {("gauze", "loc-1"): 10, ("gauze", "loc-2"): 5}
+
+    add_movement(db, "gauze", "loc-1", -4, datetime(2026, 3, 3))
+    add_movement(db, "swab", "loc-1", 7, datetime(2026, 3, 3))
+    second = asyncio.run(take_snapshot(db, "c1", datetime(2026, 3, 4)))
+    assert second["previous_run_id"] == first["run_id"]
+    assert second["rows"] == 3
+    assert snapshot_rows(db, second) == {("gauze", "loc-1"): 6, ("gauze", "loc-2"): 5, ("swab", "loc-1"): 7}
+
+def test_snapshot_leaves_out_movements_that_may_still_be_committing():
+    db = FakeDatabase()
+    now = datetime.utcnow()
+    add_movement(db, "gauze", "loc-1", 10, now - timedelta(hours=1))
+    # Dated just now, possibly in a transaction that has not committed yet
+    add_movement(db, "gauze", "loc-1", 3, now - timedelta(seconds=5))
+    run = asyncio.run(take_snapshot(db, "c1", now))
+    assert run["snapshot_at"] <= now - timedelta(seconds=ledger.SNAPSHOT_SAFETY_MARGIN_SECONDS)
+    assert snapshot_rows(db, run) == {("gauze", "loc-1"): 10}
+
+    # The recent movement is still counted, from the movements after the snapshot
+    result = asyncio.run(stock_at(db, "c1", "gauze", "loc-1", datetime.utcnow()))
+    assert result["quantity"] == 13
+    assert result["movement_quantity"] == 3
+
+def test_stock_at_sums_every_location_and_honours_the_time():
+    db = FakeDatabase()
+    add_movement(db, "gauze", "loc-1", 10, datetime(2026, 3, 1))
+    add_movement(db, "gauze", "loc-2", 5, datetime(2026, 3, 1))
+    asyncio.run(take_snapshot(db, "c1", datetime(2026, 3, 2)))
+    add_movement(db, "gauze", "loc-1", -2, datetime(2026, 3, 5))
+    assert asyncio.run(stock_at(db, "c1", "gauze", None, datetime(2026, 3, 6)))["quantity"] == 13
+    assert asyncio.run(stock_at(db, "c1", "gauze", None, datetime(2026, 3, 4)))["quantity"] == 15
+    # Before any snapshot everything comes from the movements
+    before = asyncio.run(stock_at(db, "c1", "gauze", "loc-2", datetime(2026, 3, 1, 12)))
+    assert (before["quantity"], before["snapshot_at"]) == (5, None)
+
+def test_consistency_check_reports_drift():
+    db = FakeDatabase()
+    db.items.docs = {1: {"_id": 1, "company_id": "c1", "item_id": "gauze"}, 2: {"_id": 2, "company_id": "c1", "item_id": "swab"}}
+    add_movement(db, "gauze", "loc-1", 10, datetime(2026, 3, 1))
+    add_movement(db, "swab", "loc-1", 4, datetime(2026, 3, 1))
+    db.stock.docs = {
+        1: {"_id": 1, "company_id": "c1", "item_id": "gauze", "location_id": "loc-1", "quantity": 10},
+        2: {"_id": 2, "company_id": "c1", "item_id": "swab", "location_id": "loc-1", "quantity": 3},
+    }
+    report = asyncio.run(check_consistency(db, "c1"))
+    assert (report["items_checked"], report["keys_checked"], report["mismatches"]) == (2, 2, 1)
+    assert report["details"] == [{"item_id": "swab", "location_id": "loc-1", "stock_quantity": 3, "ledger_quantity": 4}]
+    assert len(db.stock_consistency_reports.docs) == 1
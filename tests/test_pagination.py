@@ -0,0 +1,72 @@
+import base64
+from datetime import datetime
+
+import pytest
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+from pagination import cursor_filter, decode_cursor, encode_cursor
+
+def forge(payload):
+    raw = json_util.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def test_id_cursor_round_trips():
+    doc = {"_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc, "_id")) == {"id": doc["_id"]}
+
+def test_sort_value_round_trips():
+    doc = {"_id": ObjectId(), "expiry_date": datetime(2026, 3, 1, 12, 30)}
+    position = decode_cursor(encode_cursor(doc, "expiry_date"), "expiry_date")
+    assert position == {"id": doc["_id"], "v": doc["expiry_date"]}
+
+def test_missing_sort_value_round_trips_as_null():
+    doc = {"_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc, "name"), "name") == {"id": doc["_id"], "v": None}
+
+def test_cursor_filter_breaks_ties_on_id():
+    doc = {"_id": ObjectId(), "name": "Paracetamol"}
+    assert cursor_filter(encode_cursor(doc, "name"), "name", ASCENDING) == {"$or": [
+        {"name": {"$gt": "Paracetamol"}},
+        {"name": "Paracetamol", "_id": {"$gt": doc["_id"]}},
+    ]}
+    assert cursor_filter(encode_cursor(doc, "_id"), "_id", DESCENDING) == {"_id": {"$lt": doc["_id"]}}
+
+@pytest.mark.parametrize("cursor, sort_field", [
+    ("not a cursor!", "_id"),
+    (forge([ObjectId()]), "_id"),
+    (forge({"v": "x"}), "name"),
+    (forge({"id": {"$ne": None}}), "_id"),
+    (forge({"id": "5f0c0c0c0c0c0c0c0c0c0c0c"}), "_id"),
+    (forge({"id": ObjectId(), "v": {"$gt": ""}}), "name"),
+    (forge({"id": ObjectId(), "v": {"$regex": ".*"}}), "name"),
+    (forge({"id": ObjectId(), "v": ["a", "b"]}), "name"),
+    (forge({"id": ObjectId(), "v": 5}), "name"),
+    (forge({"id": ObjectId(), "v": True}), "quantity"),
+    (forge({"id": ObjectId(), "v": "2026-01-01"}), "expiry_date"),
+    (forge({"id": ObjectId(), "v": "x", "$where": "1"}), "name"),
+])
+def test_forged_cursors_are_rejected(cursor, sort_field):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, sort_field)
+    assert error.value.status_code == 400
+
+def test_null_sort_value_continues_with_the_non_null_rows():
+    doc = {"_id": ObjectId()}
+    assert cursor_filter(encode_cursor(doc, "expiry_date"), "expiry_date", ASCENDING) == {"$or": [
+        {"expiry_date": {"$ne": None}},
+        {"expiry_date": None, "_id": {"$gt": doc["_id"]}},
+    ]}
+    # Descending order ends with the nulls, so only the tie-break is left
+    assert cursor_filter(encode_cursor(doc, "expiry_date"), "expiry_date", DESCENDING) == {
+        "expiry_date": None, "_id": {"$lt": doc["_id"]},
+    }
+
+def test_descending_pages_reach_the_null_rows():
+    doc = {"_id": ObjectId(), "expiry_date": datetime(2026, 3, 1)}
+    assert cursor_filter(encode_cursor(doc, "expiry_date"), "expiry_date", DESCENDING) == {"$or": [
+        {"expiry_date": {"$lt": doc["expiry_date"]}},
+        {"expiry_date": doc["expiry_date"], "_id": {"$lt": doc["_id"]}},
+        {"expiry_date": None},
+    ]}
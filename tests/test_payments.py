@@ -0,0 +1,103 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import Request
+
+import payments
+from models import Payment, PaymentMode
+from payments import apply_payments, invoice_payment_update, payment_batch_body, post_payments
+from tests.fakes import FakeDatabase
+
+def make_payment(invoice_id, amount, customer_id="cust-1"):
+    return Payment(company_id="c1", invoice_id=invoice_id, customer_id=customer_id, amount=amount,
+                   payment_mode=PaymentMode.UPI, created_by="u1")
+
+def seeded_db():
+    db = FakeDatabase()
+    db.invoices.docs = {
+        "a": {"_id": "a", "invoice_id": "inv-a", "total_amount": 100.0, "paid_amount": 0.0, "balance_amount": 100.0, "status": "pending"},
+        "b": {"_id": "b", "invoice_id": "inv-b", "total_amount": 50.0, "balance_amount": 50.0, "status": "pending"},
+    }
+    return db
+
+def request(body: bytes, headers=None):
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    raw_headers = [(k.encode(), v.encode()) for k, v in (headers or {"content-length": str(len(body))}).items()]
+    return Request({"type": "http", "method": "POST", "path": "/api/payments/batch", "headers": raw_headers}, receive)
+
+def payment_json(count):
+    return orjson.dumps([{"company_id": "c1", "invoice_id": "inv-a", "customer_id": "cust-1", "amount": 1.0,
+                          "payment_mode": "upi", "created_by": "u1"}] * count)
+
+def test_payments_update_invoice_totals_server_side():
+    db = seeded_db()
+    updated = asyncio.run(apply_payments(db, [make_payment("inv-a", 30.0), make_payment("inv-a", 70.0), make_payment("inv-b", 20.0)]))
+    assert updated == 2
+    assert db.invoices.docs["a"]["paid_amount"] == 100.0
+    assert db.invoices.docs["a"]["balance_amount"] == 0.0
+    assert db.invoices.docs["a"]["status"] == "paid"
+    # A missing paid_amount counts as zero
+    assert db.invoices.docs["b"]["paid_amount"] == 20.0
+    assert db.invoices.docs["b"]["status"] == "partially_paid"
+    assert len(db.payments.docs) == 3
+
+def test_invoice_update_is_a_pipeline():
+    stages = invoice_payment_update(10.0)
+    assert [list(stage) for stage in stages] == [["$set"]] * 3
+
+def test_hooks_see_the_whole_batch():
+    db = seeded_db()
+    seen = []
+
+    async def hook(db, posted, session=None):
+        seen.append(len(posted))
+
+    report = asyncio.run(post_payments(db.client, db, [make_payment("inv-a", 1.0) for _ in range(3)], hooks=[hook]))
+    assert report == {"posted": 3, "invoices_updated": 1}
+    assert seen == [3]
+
+def test_empty_batch_posts_nothing():
+    db = seeded_db()
+    assert asyncio.run(post_payments(db.client, db, [])) == {"posted": 0, "invoices_updated": 0}
+    assert db.payments.docs == {}
+
+def test_batch_body_is_parsed_into_payments():
+    parsed = asyncio.run(payment_batch_body(request(payment_json(3))))
+    assert len(parsed) == 3
+    assert all(isinstance(payment, Payment) for payment in parsed)
+
+@pytest.mark.parametrize("limit, byte_limit, headers", [
+    # Declared length over the byte cap: refused before the body is read
+    (10, 100, None),
+    # Undeclared (chunked) length over the byte cap
+    (10, 100, {}),
+    # Small enough in bytes but too many payments: refused before validation
+    (2, 10 ** 6, None),
+])
+def test_oversized_batches_are_refused(monkeypatch, limit, byte_limit, headers):
+    monkeypatch.setattr(payments, "MAX_PAYMENT_BATCH", limit)
+    monkeypatch.setattr(payments, "MAX_PAYMENT_BATCH_BYTES", byte_limit)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(payment_batch_body(request(payment_json(3), headers)))
+    assert error.value.status_code == 413
+
+@pytest.mark.parametrize("body", [b"not json", b'{"amount": 1}'])
+def test_batch_body_must_be_an_array(body):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(payment_batch_body(request(body)))
+    assert error.value.status_code == 400
+
+def test_invalid_payments_are_a_validation_error():
+    with pytest.raises(RequestValidationError):
+        asyncio.run(payment_batch_body(request(b'[{"amount": "lots"}]')))
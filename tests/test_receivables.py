@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from models import Invoice, InvoiceItem, Payment, PaymentMode
+from receivables import (
+    AGEING_LABELS, BALANCES_COLLECTION, _bucket_label_expression, credit_check, rebuild_customer_balances,
+    record_invoice_balance, record_payment_balances
+)
+from tests.fakes import FakeDatabase
+
+def make_invoice(amount, customer_id="cust-1"):
+    line = InvoiceItem(item_id="gauze", quantity=1, unit_price=amount, gst_rate=0.0, cgst_amount=0.0,
+                       sgst_amount=0.0, igst_amount=0.0, total_amount=amount)
+    return Invoice(company_id="c1", customer_id=customer_id, invoice_number="INV-1", items=[line], subtotal=amount,
+                   total_cgst=0.0, total_sgst=0.0, total_igst=0.0, total_gst=0.0, total_amount=amount,
+                   balance_amount=amount, status="pending", created_by="u1")
+
+def make_payment(amount, customer_id="cust-1"):
+    return Payment(company_id="c1", invoice_id="inv-1", customer_id=customer_id, amount=amount,
+                   payment_mode=PaymentMode.CASH, created_by="u1")
+
+def balances(db):
+    return {row["customer_id"]: row for row in db[BALANCES_COLLECTION].rows()}
+
+def test_hooks_keep_a_running_outstanding_per_customer():
+    db = FakeDatabase()
+    asyncio.run(record_invoice_balance(db, make_invoice(100.0)))
+    asyncio.run(record_invoice_balance(db, make_invoice(50.0)))
+    asyncio.run(record_invoice_balance(db, make_invoice(70.0, customer_id="cust-2")))
+    asyncio.run(record_payment_balances(db, [make_payment(30.0), make_payment(20.0), make_payment(70.0, "cust-2")]))
+
+    rows = balances(db)
+    assert rows["cust-1"]["outstanding"] == 100.0
+    assert rows["cust-1"]["invoices"] == 2
+    assert rows["cust-2"]["outstanding"] == 0.0
+
+def add_customer(db, credit_limit, outstanding=None):
+    db.customers.docs[1] = {"_id": 1, "customer_id": "cust-1", "company_id": "c1", "name": "Clinic", "credit_limit": credit_limit}
+    if outstanding is not None:
+        db[BALANCES_COLLECTION].docs[1] = {"_id": 1, "company_id": "c1", "customer_id": "cust-1", "outstanding": outstanding}
+
+def test_credit_check_against_the_limit():
+    db = FakeDatabase()
+    add_customer(db, credit_limit=1000.0, outstanding=800.0)
+    within = asyncio.run(credit_check(db, "cust-1", amount=200.0))
+    assert within["approved"] and within["available"] == 200.0
+    over = asyncio.run(credit_check(db, "cust-1", amount=200.01))
+    assert not over["approved"]
+
+def test_credit_check_without_a_limit_or_a_balance():
+    db = FakeDatabase()
+    add_customer(db, credit_limit=0)
+    result = asyncio.run(credit_check(db, "cust-1", amount=10 ** 6))
+    assert result["approved"]
+    assert result["outstanding"] == 0.0
+    assert result["available"] is None
+
+def test_credit_check_unknown_customer():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(credit_check(FakeDatabase(), "missing"))
+    assert error.value.status_code == 404
+
+def test_rebuild_merges_then_removes_only_stale_balances():
+    db = FakeDatabase()
+    old = datetime.utcnow() - timedelta(hours=1)
+    db[BALANCES_COLLECTION].docs = {
+        1: {"_id": 1, "company_id": "c1", "customer_id": "gone", "outstanding": 5.0, "updated_at": old},
+        2: {"_id": 2, "company_id": "c2", "customer_id": "other", "outstanding": 5.0, "updated_at": old},
+    }
+    result = asyncio.run(rebuild_customer_balances(db, "c1"))
+
+    # The fake only records the $merge pipeline; rows it writes would carry updated_at=started
+    pipeline = db.invoices.pipelines[-1]
+    assert pipeline[-1]["$merge"]["on"] == ["company_id", "customer_id"]
+    started = pipeline[2]["$project"]["updated_at"]["$literal"]
+    assert started > old
+    assert result == {"company_id": "c1", "removed": 1}
+    assert [row["customer_id"] for row in db[BALANCES_COLLECTION].rows()] == ["other"]
+
+def test_bucket_labels_follow_the_ageing_boundaries():
+    expression = _bucket_label_expression()["$switch"]
+    cases = [(branch["case"]["$lt"][1], branch["then"]) for branch in expression["branches"]]
+    assert cases == [(0, "current"), (31, "0-30"), (61, "31-60"), (91, "61-90")]
+    assert expression["default"] == AGEING_LABELS[91] == "90+"
@@ -0,0 +1,48 @@
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from sessions import SESSIONS_COLLECTION, create_session, revoked_sessions, rotate_session
+from tests.fakes import FakeDatabase
+
+def test_rotation_issues_a_new_token_for_the_same_session():
+    db = FakeDatabase()
+    session_id, token = asyncio.run(create_session(db, "user-1"))
+    session, new_token = asyncio.run(rotate_session(db, token))
+    assert session["user_id"] == "user-1"
+    assert new_token != token
+    assert new_token.startswith(f"{session_id}.")
+    # Only the hash of the current secret is stored
+    stored = db[SESSIONS_COLLECTION].docs[session_id]["token_hash"]
+    assert stored == hashlib.sha256(new_token.partition(".")[2].encode("utf-8")).hexdigest()
+
+def test_reusing_a_rotated_token_revokes_the_session():
+    db = FakeDatabase()
+    session_id, stolen = asyncio.run(create_session(db, "user-1"))
+    _, current = asyncio.run(rotate_session(db, stolen))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(rotate_session(db, stolen))
+    assert error.value.status_code == 401
+    session = db[SESSIONS_COLLECTION].docs[session_id]
+    assert session["revoked_at"] is not None
+    assert session["revoked_reason"] == "token_reuse"
+    assert session_id in revoked_sessions.revoked
+
+    # The legitimate holder is logged out too
+    with pytest.raises(HTTPException):
+        asyncio.run(rotate_session(db, current))
+
+@pytest.mark.parametrize("token", ["", "no-separator", ".secret", "session."])
+def test_malformed_tokens_are_rejected(token):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(rotate_session(FakeDatabase(), token))
+    assert error.value.status_code == 401
+
+def test_unknown_session_is_not_revoked():
+    db = FakeDatabase()
+    with pytest.raises(HTTPException):
+        asyncio.run(rotate_session(db, "missing.secret"))
+    assert db[SESSIONS_COLLECTION].docs == {}